@@ -0,0 +1,165 @@
+"""MongoDB client lifecycle, read routing and connection-pool metrics.
+
+The Motor client is created by the app lifespan (``Mongo.connect``) rather
+than at import time. Handlers use ``DatabaseProxy`` objects bound to a read
+preference; they resolve to the live client on each access, so a module can
+hold a ``db`` reference before the client exists.
+"""
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from pymongo import ReadPreference, monitoring
+
+
+async def is_replicated(client) -> bool:
+    """True for replica sets and sharded clusters (transactions, change streams)."""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        return False
+    return bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Per-server connection pool counters for capacity planning.
+
+    pymongo calls these hooks from its own threads, hence the lock.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: {
+            "open": 0,
+            "checkedOut": 0,
+            "peakCheckedOut": 0,
+            "checkouts": 0,
+            "checkoutFailures": 0,
+            "checkoutTimeouts": 0,
+            "poolCleared": 0,
+        })
+
+    def _bump(self, address, field: str, delta: int = 1):
+        with self._lock:
+            server = self._servers["%s:%s" % address]
+            server[field] += delta
+            if field == "checkedOut" and server["checkedOut"] > server["peakCheckedOut"]:
+                server["peakCheckedOut"] = server["checkedOut"]
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, "poolCleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, "open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, "checkoutFailures")
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self._bump(event.address, "checkoutTimeouts")
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, "checkouts")
+        self._bump(event.address, "checkedOut")
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, "checkedOut", -1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            servers = {address: dict(counters) for address, counters in self._servers.items()}
+        for counters in servers.values():
+            counters["utilization"] = round(counters["checkedOut"] / self.max_pool_size, 3)
+            counters["peakUtilization"] = round(counters["peakCheckedOut"] / self.max_pool_size, 3)
+        return {"maxPoolSize": self.max_pool_size, "servers": servers}
+
+
+class Mongo:
+    def __init__(
+        self,
+        url: str,
+        db_name: str,
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        wait_queue_timeout_ms: Optional[int] = None,
+        max_idle_time_ms: Optional[int] = None,
+        connect_timeout_ms: Optional[int] = None,
+        server_selection_timeout_ms: Optional[int] = None,
+        compressors: Optional[str] = None,
+    ):
+        self.url = url
+        self.db_name = db_name
+        self.options = {
+            "maxPoolSize": max_pool_size,
+            "minPoolSize": min_pool_size,
+            "waitQueueTimeoutMS": wait_queue_timeout_ms,
+            "maxIdleTimeMS": max_idle_time_ms,
+            "connectTimeoutMS": connect_timeout_ms,
+            "serverSelectionTimeoutMS": server_selection_timeout_ms,
+            "compressors": compressors or None,
+        }
+        self.pool_metrics = PoolMetrics(max_pool_size)
+        self.client = None
+
+    def connect(self):
+        if self.client is None:
+            if not self.url or not self.db_name:
+                raise RuntimeError("MONGO_URL and DB_NAME must be set")
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            options = {k: v for k, v in self.options.items() if v is not None}
+            self.client = AsyncIOMotorClient(self.url, event_listeners=[self.pool_metrics], **options)
+        return self.client
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def database(self, read_preference=ReadPreference.PRIMARY) -> "DatabaseProxy":
+        return DatabaseProxy(self, read_preference)
+
+
+class DatabaseProxy:
+    """Stands in for an ``AsyncIOMotorDatabase`` with a fixed read preference."""
+
+    __slots__ = ("_mongo", "_read_preference", "_client", "_db")
+
+    def __init__(self, mongo: Mongo, read_preference):
+        self._mongo = mongo
+        self._read_preference = read_preference
+        self._client = None
+        self._db = None
+
+    def _resolve(self):
+        client = self._mongo.client
+        if client is None:
+            raise RuntimeError("MongoDB client is not connected; call Mongo.connect() (done by the app lifespan)")
+        if client is not self._client:
+            self._client = client
+            self._db = client.get_database(self._mongo.db_name, read_preference=self._read_preference)
+        return self._db
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
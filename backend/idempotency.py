@@ -0,0 +1,258 @@
+"""``Idempotency-Key`` support for write endpoints.
+
+A client that retries a write sends the same key. The first request claims
+the key in ``idempotency_keys`` and runs; its response is stored with a
+fingerprint of the request. A retry then gets the stored response back
+(marked ``Idempotent-Replayed: true``) without running the handler again.
+A duplicate arriving while the first request is still running gets 409, and
+reusing a key for a different request gets 422.
+
+Completed keys are also kept in an in-process cache, so a retry that lands
+on the same worker costs no database round trip. Only responses below 500
+are stored (401, 409 and 429 excepted); failed requests release the key so
+the retry runs for real.
+"""
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from cache import TTLCache
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+MAX_KEY_LENGTH = 255
+# Larger responses aren't worth keeping; their keys are released instead
+MAX_STORED_BODY = 256 * 1024
+UNSTORED_STATUSES = {401, 409, 429}
+
+
+class Fingerprint:
+    """SHA-256 over method, path and body, streamed.
+
+    Multipart boundaries are random per attempt, so they are left out of the
+    hash; otherwise a retried upload would never match.
+    """
+
+    def __init__(self, method: str, path: str, query: bytes, content_type: str):
+        self._hash = hashlib.sha256(f"{method} {path}?".encode() + query + b"\n")
+        boundary = re.search(r"boundary=\"?([^\";]+)", content_type) if content_type.startswith("multipart/") else None
+        self._boundary = boundary.group(1).encode() if boundary else None
+        self._tail = b""
+
+    def update(self, chunk: bytes):
+        if self._boundary is None:
+            self._hash.update(chunk)
+            return
+        data = (self._tail + chunk).replace(self._boundary, b"")
+        # A boundary split across chunks starts within the last len - 1 bytes
+        keep = len(self._boundary) - 1
+        self._tail = data[-keep:] if keep else b""
+        self._hash.update(data[: len(data) - len(self._tail)])
+
+    def hexdigest(self) -> str:
+        self._hash.update(self._tail)
+        self._tail = b""
+        return self._hash.hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, db, ttl: timedelta, lease: timedelta, cache_size: int = 10_000):
+        self.db = db
+        self.ttl = ttl
+        self.lease = lease
+        # Completed records only; they never change until they expire
+        self.cache = TTLCache(ttl=min(ttl.total_seconds(), 600), maxsize=cache_size)
+        self.counters = {"claimed": 0, "replayed": 0, "conflicts": 0, "mismatches": 0, "released": 0}
+
+    @property
+    def collection(self):
+        return self.db[IDEMPOTENCY_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index("expiresAt", expireAfterSeconds=0)
+
+    async def claim(self, key: str) -> Optional[dict]:
+        """Claim ``key`` for this request; return None, or the record that holds it."""
+        record = self.cache.get(key)
+        if record is not None:
+            return record
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                "id": key,
+                "state": "processing",
+                "lockedUntil": now + self.lease,
+                "expiresAt": now + self.ttl,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        # The holder may have crashed: take over once its lease ran out
+        taken = await self.collection.find_one_and_update(
+            {"id": key, "state": "processing", "lockedUntil": {"$lt": now}},
+            {"$set": {"lockedUntil": now + self.lease}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is not None:
+            return None
+        record = await self.collection.find_one({"id": key}, {"_id": 0})
+        if record is None:
+            # Released or expired in between
+            return await self.claim(key)
+        if record["state"] == "done":
+            self.cache.set(key, record)
+        return record
+
+    async def complete(self, key: str, fingerprint: str, response: dict):
+        record = {"id": key, "state": "done", "fingerprint": fingerprint, "response": response}
+        await self.collection.update_one(
+            {"id": key},
+            {"$set": {**record, "expiresAt": datetime.now(timezone.utc) + self.ttl}, "$unset": {"lockedUntil": ""}},
+        )
+        self.cache.set(key, record)
+
+    async def release(self, key: str):
+        await self.collection.delete_one({"id": key, "state": "processing"})
+
+    def stats(self) -> dict:
+        return {**self.counters, "cache": self.cache.stats()}
+
+
+def _compile(path: str) -> re.Pattern:
+    return re.compile("^" + re.sub(r"\{[^/]+\}", "[^/]+", path) + "/?$")
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware honouring ``Idempotency-Key`` on the given ``(method, path)`` routes.
+
+    Keys are scoped to the caller (``resolve_user``, else client IP) and route,
+    so two users can't collide or read each other's responses.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: IdempotencyStore,
+        routes: List[Tuple[str, str]],
+        resolve_user: Optional[Callable[[str], Optional[str]]] = None,
+    ):
+        self.app = app
+        self.store = store
+        self.resolve_user = resolve_user
+        self._routes = [(method, _compile(path)) for method, path in routes]
+
+    def match(self, method: str, path: str) -> bool:
+        return any(method == m and pattern.match(path) for m, pattern in self._routes)
+
+    def caller(self, headers: Dict[bytes, bytes], scope) -> str:
+        token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")[2]
+        user_id = self.resolve_user(token) if token and self.resolve_user else None
+        if user_id:
+            return f"u:{user_id}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.match(scope["method"], scope["path"]):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key", b"").decode("latin-1").strip()
+        if not key:
+            return await self.app(scope, receive, send)
+        if len(key) > MAX_KEY_LENGTH:
+            return await self._reply(send, 400, {"detail": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"})
+
+        record_key = f"{self.caller(headers, scope)}|{scope['method']} {scope['path']}|{key}"
+        fingerprint = Fingerprint(
+            scope["method"], scope["path"], scope.get("query_string", b""),
+            headers.get(b"content-type", b"").decode("latin-1"),
+        )
+        record = await self.store.claim(record_key)
+        if record is not None:
+            return await self._answer_duplicate(record, fingerprint, receive, send)
+
+        self.store.counters["claimed"] += 1
+        body_complete = False
+        response = {"status": 0, "headers": [], "body": b""}
+        chunks: List[bytes] = []
+
+        async def hashing_receive():
+            nonlocal body_complete
+            message = await receive()
+            if message["type"] == "http.request":
+                fingerprint.update(message.get("body", b""))
+                body_complete = not message.get("more_body", False)
+            return message
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [[k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body" and response["status"] is not None:
+                chunks.append(message.get("body", b""))
+                if sum(map(len, chunks)) > MAX_STORED_BODY:
+                    response["status"] = None  # too big to keep
+                    chunks.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, hashing_receive, capturing_send)
+        except BaseException:
+            await self.store.release(record_key)
+            self.store.counters["released"] += 1
+            raise
+
+        status = response["status"]
+        # A handler that answered without reading the whole body leaves no usable fingerprint
+        if not body_complete or status is None or status >= 500 or status in UNSTORED_STATUSES:
+            await self.store.release(record_key)
+            self.store.counters["released"] += 1
+            return
+        response["body"] = b"".join(chunks)
+        await self.store.complete(record_key, fingerprint.hexdigest(), response)
+
+    async def _answer_duplicate(self, record: dict, fingerprint: Fingerprint, receive, send):
+        if record["state"] != "done":
+            self.store.counters["conflicts"] += 1
+            return await self._reply(
+                send, 409, {"detail": "A request with this Idempotency-Key is still being processed"},
+                [(b"retry-after", b"1")],
+            )
+        # Hash the retried body without keeping it
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            fingerprint.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        if fingerprint.hexdigest() != record["fingerprint"]:
+            self.store.counters["mismatches"] += 1
+            return await self._reply(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+
+        self.store.counters["replayed"] += 1
+        stored = record["response"]
+        await send({
+            "type": "http.response.start",
+            "status": stored["status"],
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in stored["headers"]]
+            + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": bytes(stored["body"])})
+
+    async def _reply(self, send, status: int, payload: dict, extra_headers: Optional[list] = None):
+        body = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ] + (extra_headers or []),
+        })
+        await send({"type": "http.response.body", "body": body})
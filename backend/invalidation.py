@@ -0,0 +1,221 @@
+"""Cross-worker cache invalidation.
+
+Every API worker runs one ``InvalidationListener``. On replica sets it tails a
+change stream over the cached collections; on a standalone mongod it polls
+each collection for documents whose ``updatedAt`` moved past a watermark.
+Either way each change is handed to the handler registered for its
+collection, which evicts the matching entries from that worker's caches.
+Polling cannot see deletes, so code that deletes cached documents leaves a
+trace in another collection (e.g. the archive) that is polled on its own
+timestamp field.
+
+The change-stream resume token (or the polling watermarks) is persisted, so
+a reconnect or restart picks up where it left off instead of flushing every
+cache. Handlers receive the changed document's projected fields, or ``None``
+when the document is unknown (deletes, lost history) and the cache for that
+collection must be flushed.
+"""
+import asyncio
+import logging
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import is_replicated
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "cache_invalidation_state"
+# Resume token no longer in the oplog / change stream can't continue
+UNRESUMABLE_CODES = {280, 286}
+POLL_PAGE_SIZE = 1000
+
+Handler = Callable[[Optional[dict]], None]
+
+
+class InvalidationListener:
+    def __init__(
+        self,
+        db,
+        handlers: Dict[str, Handler],
+        fields: List[str],
+        mode: str = "auto",
+        poll_interval: float = 2.0,
+        persist_interval: float = 1.0,
+        clock: Callable = lambda: datetime.now(timezone.utc),
+        name: Optional[str] = None,
+        poll_fields: Optional[Dict[str, str]] = None,
+    ):
+        self.db = db
+        self.handlers = handlers
+        self.fields = ["id"] + [f for f in fields if f != "id"]
+        # Timestamp polled per collection; "updatedAt" unless listed
+        self.poll_fields = poll_fields or {}
+        self.mode = mode  # "auto", "changestream", "poll" or "off"
+        self.poll_interval = poll_interval
+        self.persist_interval = persist_interval
+        self.clock = clock
+        # Workers on one host may share a token: any recent position in the
+        # same stream is fine, replaying a few events only re-evicts
+        self.name = name or f"cache-invalidation:{socket.gethostname()}"
+        self._task: Optional[asyncio.Task] = None
+        self._active_mode: Optional[str] = None
+        self._last_persist = 0.0
+        self.events = 0
+        self.flushes = 0
+        self.errors = 0
+
+    async def start(self):
+        if self.mode == "off" or self._task is not None:
+            return
+        mode = self.mode
+        if mode == "auto":
+            mode = "changestream" if await is_replicated(self.db.client) else "poll"
+        self._active_mode = mode
+        if mode == "poll":
+            for collection in self.handlers:
+                await self.db[collection].create_index([(self._poll_field(collection), 1), ("id", 1)])
+        self._task = asyncio.create_task(self._run(), name="cache-invalidation")
+        logger.info("Cache invalidation listener started (%s)", mode)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self._active_mode or "off",
+            "running": self._task is not None and not self._task.done(),
+            "events": self.events,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
+
+    def _poll_field(self, collection: str) -> str:
+        return self.poll_fields.get(collection, "updatedAt")
+
+    def _dispatch(self, collection: str, doc: Optional[dict]):
+        handler = self.handlers.get(collection)
+        if handler is None:
+            return
+        self.events += 1
+        if doc is None:
+            self.flushes += 1
+        handler(doc)
+
+    def _flush_all(self):
+        for collection in self.handlers:
+            self._dispatch(collection, None)
+
+    async def _load_state(self) -> dict:
+        return await self.db[STATE_COLLECTION].find_one({"_id": self.name}) or {}
+
+    async def _save_state(self, update: dict, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_persist < self.persist_interval:
+            return
+        self._last_persist = now
+        await self.db[STATE_COLLECTION].update_one(
+            {"_id": self.name},
+            {"$set": {**update, "savedAt": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                if self._active_mode == "changestream":
+                    await self._watch()
+                else:
+                    await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning("Cache invalidation listener error: %s", e)
+            except Exception:
+                # A bad document or handler must not end invalidation for good
+                logger.exception("Cache invalidation listener failed")
+            else:
+                continue
+            self.errors += 1
+            # Events may have been missed while disconnected
+            self._flush_all()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _watch(self):
+        state = await self._load_state()
+        pipeline = [
+            {"$match": {
+                "ns.coll": {"$in": list(self.handlers)},
+                "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+            }},
+            # Keep only what handlers need; _id (the resume token) stays
+            {"$project": {"ns": 1, "operationType": 1, **{f"fullDocument.{f}": 1 for f in self.fields}}},
+        ]
+        kwargs = {"resume_after": state["resumeToken"]} if state.get("resumeToken") else {}
+        try:
+            async with self.db.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000, **kwargs) as stream:
+                while stream.alive:
+                    change = await stream.try_next()
+                    if change is not None:
+                        self._dispatch(change["ns"]["coll"], change.get("fullDocument"))
+                    # The post-batch token advances even when nothing matched,
+                    # so a quiet stream doesn't fall off the oplog
+                    await self._save_state({"resumeToken": stream.resume_token})
+        except OperationFailure as e:
+            if e.code not in UNRESUMABLE_CODES:
+                raise
+            logger.warning("Change stream history lost, flushing caches")
+            self._flush_all()
+            await self._save_state({"resumeToken": None}, force=True)
+
+    async def _poll(self):
+        state = await self._load_state()
+        watermarks = state.get("watermarks") or {}
+        start = self.clock()
+        # Ids already dispatched at each watermark's exact timestamp
+        seen = {collection: set() for collection in self.handlers}
+        while True:
+            changed = False
+            for collection in self.handlers:
+                field = self._poll_field(collection)
+                projection = {"_id": 0, field: 1, **{f: 1 for f in self.fields}}
+                watermark = watermarks.get(collection, start)
+                # $gte so a write sharing the watermark's timestamp isn't
+                # missed; later pages continue after (timestamp, id) so any
+                # number of documents sharing one timestamp are all read
+                query = {field: {"$gte": watermark}}
+                while True:
+                    docs = await self.db[collection].find(query, projection).sort(
+                        [(field, 1), ("id", 1)]
+                    ).limit(POLL_PAGE_SIZE).to_list(POLL_PAGE_SIZE)
+                    for doc in docs:
+                        if doc[field] == watermark and doc["id"] in seen[collection]:
+                            continue
+                        self._dispatch(collection, doc)
+                        if doc[field] != watermark:
+                            watermark = doc[field]
+                            seen[collection] = set()
+                            watermarks[collection] = watermark
+                            changed = True
+                        seen[collection].add(doc["id"])
+                    if len(docs) < POLL_PAGE_SIZE:
+                        break
+                    last = docs[-1]
+                    query = {"$or": [
+                        {field: {"$gt": last[field]}},
+                        {field: last[field], "id": {"$gt": last["id"]}},
+                    ]}
+            if changed:
+                await self._save_state({"watermarks": watermarks}, force=True)
+            await asyncio.sleep(self.poll_interval)
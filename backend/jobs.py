@@ -0,0 +1,309 @@
+"""Transactional outbox and background job runner.
+
+Handlers write their primary document and one or more outbox jobs together
+(inside a transaction when the deployment supports it), and a pool of asyncio
+workers claims jobs with a lease, runs the registered handler and retries
+failures with exponential backoff. The runner can live inside the API process
+or run on its own via ``python worker.py``.
+"""
+import asyncio
+import logging
+import random
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+from database import is_replicated
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "outbox"
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+
+def new_job(job_type: str, payload: dict, delay_seconds: float = 0) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "type": job_type,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "runAt": now + timedelta(seconds=delay_seconds),
+        "leaseOwner": None,
+        "leaseExpiresAt": None,
+        "lastError": None,
+        "createdAt": now,
+    }
+
+
+async def ensure_outbox_indexes(db):
+    await db[OUTBOX_COLLECTION].create_index([("status", 1), ("runAt", 1)])
+    await db[OUTBOX_COLLECTION].create_index("leaseExpiresAt", sparse=True)
+    await db[OUTBOX_COLLECTION].create_index("id", unique=True)
+    # Finished jobs are kept for a week for debugging, then expire
+    await db[OUTBOX_COLLECTION].create_index("completedAt", expireAfterSeconds=7 * 24 * 3600)
+
+
+class Outbox:
+    """Writes primary documents and their follow-up jobs in one unit."""
+
+    def __init__(self, db):
+        self.db = db
+        self._transactions_supported: Optional[bool] = None
+
+    async def _supports_transactions(self) -> bool:
+        if self._transactions_supported is None:
+            self._transactions_supported = await is_replicated(self.db.client)
+        return self._transactions_supported
+
+    async def write(self, primary: Callable[..., Awaitable], jobs: List[dict]):
+        """Run ``primary(session)`` and insert ``jobs`` atomically.
+
+        On a standalone mongod there are no multi-document transactions, so the
+        jobs are inserted straight after the primary write; workers are
+        idempotent, which makes the at-least-once fallback safe.
+        """
+        if await self._supports_transactions():
+            try:
+                async with await self.db.client.start_session() as session:
+                    async with session.start_transaction():
+                        result = await primary(session)
+                        if jobs:
+                            await self.db[OUTBOX_COLLECTION].insert_many(jobs, session=session)
+                        return result
+            except OperationFailure as e:
+                # IllegalOperation: the server refused transactions after all
+                if e.code != 20:
+                    raise
+                self._transactions_supported = False
+
+        result = await primary(None)
+        if jobs:
+            await self.db[OUTBOX_COLLECTION].insert_many(jobs)
+        return result
+
+    async def enqueue(self, job_type: str, payload: dict, delay_seconds: float = 0) -> dict:
+        job = new_job(job_type, payload, delay_seconds)
+        await self.db[OUTBOX_COLLECTION].insert_one(job)
+        return job
+
+
+class JobRunner:
+    """Pool of asyncio workers that claim outbox jobs with leases."""
+
+    def __init__(
+        self,
+        db,
+        concurrency: int = 4,
+        lease_seconds: float = 60,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        poll_interval: float = 1.0,
+    ):
+        self.db = db
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._completed_at: deque = deque(maxlen=1000)
+        self._counters = {"succeeded": 0, "failed": 0, "dead": 0, "claimed": 0}
+        self._last_lag_seconds = 0.0
+
+    def handler(self, job_type: str):
+        def register(fn: JobHandler) -> JobHandler:
+            self.handlers[job_type] = fn
+            return fn
+        return register
+
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(i), name=f"job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info("Job runner %s started with %d workers", self.owner, self.concurrency)
+
+    async def stop(self, timeout: float = 10.0):
+        self.request_stop()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+
+    def request_stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Wake idle workers early, e.g. right after enqueueing in-process."""
+        self._wakeup.set()
+
+    async def run_forever(self):
+        self.start()
+        await self._stopping.wait()
+        await self.stop()
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        outbox = self.db[OUTBOX_COLLECTION]
+        # A lease that ran out means the worker died mid-job; that attempt
+        # counts, so a job that keeps killing its worker ends up dead too
+        abandoned = await outbox.update_many(
+            {
+                "type": {"$in": list(self.handlers)},
+                "status": "running",
+                "leaseExpiresAt": {"$lte": now},
+                "attempts": {"$gte": self.max_attempts},
+            },
+            {"$set": {"status": "dead", "lastError": "lease expired on the last attempt", "leaseOwner": None}},
+        )
+        self._counters["dead"] += abandoned.modified_count
+        job = await outbox.find_one_and_update(
+            {
+                "type": {"$in": list(self.handlers)},
+                "$or": [
+                    {"status": "pending", "runAt": {"$lte": now}},
+                    {"status": "running", "leaseExpiresAt": {"$lte": now}, "attempts": {"$lt": self.max_attempts}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "leaseOwner": self.owner,
+                    "leaseExpiresAt": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("runAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job:
+            self._counters["claimed"] += 1
+            run_at = job["runAt"]
+            if run_at.tzinfo is None:
+                run_at = run_at.replace(tzinfo=timezone.utc)
+            self._last_lag_seconds = max(0.0, (now - run_at).total_seconds())
+        return job
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base ** attempts)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _renew_lease(self, lease: dict):
+        """Keep extending the lease while the handler runs, so slow jobs aren't claimed twice."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                result = await self.db[OUTBOX_COLLECTION].update_one(
+                    {**lease, "status": "running"},
+                    {"$set": {"leaseExpiresAt": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}},
+                )
+            except Exception as e:
+                # Try again next tick; the lease still has two thirds left
+                logger.warning("Could not renew the lease of job %s: %s", lease["id"], e)
+                continue
+            if result.matched_count == 0:
+                logger.warning("Job %s lost its lease while running", lease["id"])
+                return
+
+    async def run_job(self, job: dict):
+        handler = self.handlers[job["type"]]
+        outbox = self.db[OUTBOX_COLLECTION]
+        lease = {"id": job["id"], "leaseOwner": self.owner}
+        renewal = asyncio.create_task(self._renew_lease(lease))
+        try:
+            await handler(job["payload"])
+        except Exception as e:
+            logger.warning("Job %s (%s) failed on attempt %d: %s", job["id"], job["type"], job["attempts"], e)
+            if job["attempts"] >= self.max_attempts:
+                self._counters["dead"] += 1
+                await outbox.update_one(lease, {"$set": {"status": "dead", "lastError": str(e), "leaseOwner": None}})
+            else:
+                self._counters["failed"] += 1
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=self._backoff(job["attempts"]))
+                await outbox.update_one(
+                    lease,
+                    {"$set": {"status": "pending", "runAt": retry_at, "lastError": str(e), "leaseOwner": None, "leaseExpiresAt": None}},
+                )
+            return
+        finally:
+            renewal.cancel()
+
+        self._counters["succeeded"] += 1
+        self._completed_at.append(time.monotonic())
+        await outbox.update_one(
+            lease,
+            {"$set": {"status": "done", "completedAt": datetime.now(timezone.utc), "leaseOwner": None, "leaseExpiresAt": None}},
+        )
+
+    async def _worker_loop(self, index: int):
+        while not self._stopping.is_set():
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logger.error("Job worker %d could not claim: %s", index, e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                # e.g. the status write failed; the lease runs out and the job is claimed again
+                logger.error("Job worker %d could not finish job %s: %s", index, job["id"], e)
+
+    def throughput(self, window_seconds: float = 60.0) -> float:
+        cutoff = time.monotonic() - window_seconds
+        return sum(1 for t in self._completed_at if t >= cutoff) / window_seconds
+
+    async def stats(self) -> dict:
+        outbox = self.db[OUTBOX_COLLECTION]
+        now = datetime.now(timezone.utc)
+        pending = await outbox.count_documents({"status": "pending", "runAt": {"$lte": now}})
+        oldest = await outbox.find_one(
+            {"status": "pending", "runAt": {"$lte": now}}, {"_id": 0, "runAt": 1}, sort=[("runAt", 1)]
+        )
+        oldest_age = 0.0
+        if oldest:
+            run_at = oldest["runAt"]
+            if run_at.tzinfo is None:
+                run_at = run_at.replace(tzinfo=timezone.utc)
+            oldest_age = (now - run_at).total_seconds()
+        return {
+            "owner": self.owner,
+            "running": self.running,
+            "workers": self.concurrency,
+            **self._counters,
+            "throughputPerSecond": round(self.throughput(), 3),
+            "lastClaimLagSeconds": round(self._last_lag_seconds, 3),
+            "pendingDue": pending,
+            "oldestPendingAgeSeconds": round(oldest_age, 3),
+            "deadTotal": await outbox.count_documents({"status": "dead"}),
+        }
@@ -0,0 +1,206 @@
+"""Content-addressed bookkeeping for uploaded media.
+
+Every upload is hashed (SHA-256) before it leaves the process. ``media_assets``
+maps the hash to the stored URL and thumbnail, so re-uploading the same bytes
+returns the existing asset instead of pushing them to storage again.
+
+Profiles reference assets by URL; ``refCount`` tracks how many profile
+fields point at an asset and is adjusted in the same write as the profile.
+Assets nobody references past a grace period are removed in batches by
+``claim_garbage`` (see the ``media.collect_garbage`` job).
+"""
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, List, Optional, Set
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+MEDIA_ASSETS_COLLECTION = "media_assets"
+HASH_CHUNK_SIZE = 1024 * 1024
+# What uploads may contain, by content type sniffed from the bytes
+IMAGE_CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp", "AVIF": "image/avif"}
+# ISO base media "ftyp" brands; HEIC and AVIF share the container but aren't videos
+VIDEO_BRANDS = {
+    **dict.fromkeys([b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1", b"M4V ", b"dash"], "video/mp4"),
+    b"qt  ": "video/quicktime",
+}
+
+
+def hash_stream(stream: BinaryIO, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """SHA-256 of a file object read in chunks; rewinds it for the upload."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def sniff_content_type(stream: BinaryIO) -> Optional[str]:
+    """Content type of an uploaded image or video, judged from its bytes; None for anything else.
+
+    Client-declared types are not trusted: they pick the stored file's
+    extension, and with local storage the file is served from the API origin.
+    """
+    stream.seek(0)
+    header = stream.read(16)
+    stream.seek(0)
+    if header[4:8] == b"ftyp" and header[8:12] in VIDEO_BRANDS:
+        return VIDEO_BRANDS[header[8:12]]
+    if header.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        # Only parses the header; the thumbnail job decodes the pixels later
+        with Image.open(stream) as image:
+            return IMAGE_CONTENT_TYPES.get(image.format)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    finally:
+        stream.seek(0)
+
+
+def media_urls(profile: Optional[dict]) -> Set[str]:
+    """URLs a profile document references (photo and gallery)."""
+    if not profile:
+        return set()
+    urls = {item.get("url") for item in profile.get("mediaGallery") or []}
+    urls.add(profile.get("profilePhotoUrl"))
+    return {url for url in urls if url}
+
+
+class MediaAssets:
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db[MEDIA_ASSETS_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("hash", unique=True)
+        await self.collection.create_index("url")
+        await self.collection.create_index("publicId")
+        await self.collection.create_index([("refCount", 1), ("lastUsedAt", 1)])
+
+    async def get(self, public_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"publicId": public_id}, {"_id": 0})
+
+    async def find(self, content_hash: str) -> Optional[dict]:
+        # Touch the asset so a re-upload restarts its grace period
+        asset = await self.collection.find_one_and_update(
+            {"hash": content_hash, "deleting": {"$ne": True}},
+            {"$set": {"lastUsedAt": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if asset is not None:
+            asset.pop("_id", None)
+        return asset
+
+    async def register(self, content_hash: str, asset: dict) -> tuple:
+        """Record a freshly stored asset.
+
+        Returns ``(asset, created)``; when a concurrent upload of the same
+        bytes won the race, the existing asset is returned and the caller
+        should delete its own copy.
+        """
+        now = datetime.now(timezone.utc)
+        doc = {
+            "id": str(uuid.uuid4()),
+            "hash": content_hash,
+            **asset,
+            "refCount": 0,
+            "createdAt": now,
+            "lastUsedAt": now,
+        }
+        try:
+            await self.collection.insert_one(dict(doc))
+        except DuplicateKeyError:
+            existing = await self.find(content_hash)
+            if existing is not None:
+                return existing, False
+            raise
+        doc.pop("_id", None)
+        return doc, True
+
+    async def update_refs(self, before: Iterable[str], after: Iterable[str], session=None):
+        """Move reference counts from the URLs a document used to the ones it uses now."""
+        before, after = set(before), set(after)
+        now = datetime.now(timezone.utc)
+        added, removed = after - before, before - after
+        # URLs not backed by an asset (seed data, external links) match nothing
+        if added:
+            # Pulls an asset back from garbage collection if it was just claimed
+            await self.collection.update_many(
+                {"url": {"$in": list(added)}},
+                {"$inc": {"refCount": 1}, "$set": {"lastUsedAt": now}, "$unset": {"deleting": ""}},
+                session=session,
+            )
+        if removed:
+            await self.collection.update_many(
+                {"url": {"$in": list(removed)}},
+                {"$inc": {"refCount": -1}, "$set": {"lastUsedAt": now}},
+                session=session,
+            )
+
+    async def claim_garbage(self, unused_since: datetime, limit: int) -> List[dict]:
+        """Mark up to ``limit`` unreferenced assets for deletion and return them.
+
+        Claimed assets are no longer returned by ``find``; the caller deletes
+        the stored objects, then calls ``remove``.
+        """
+        claimed = []
+        for _ in range(limit):
+            asset = await self.collection.find_one_and_update(
+                {"refCount": {"$lte": 0}, "lastUsedAt": {"$lt": unused_since}, "deleting": {"$ne": True}},
+                {"$set": {"deleting": True}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if asset is None:
+                break
+            asset.pop("_id", None)
+            claimed.append(asset)
+        return claimed
+
+    async def still_garbage(self, asset_id: str) -> bool:
+        """Whether a claimed asset is still unreferenced; check right before deleting its objects."""
+        asset = await self.collection.find_one(
+            {"id": asset_id, "deleting": True, "refCount": {"$lte": 0}}, {"_id": 0, "id": 1}
+        )
+        return asset is not None
+
+    async def remove(self, asset_ids: List[str]):
+        await self.collection.delete_many({"id": {"$in": asset_ids}, "deleting": True, "refCount": {"$lte": 0}})
+
+    async def release(self, asset_ids: List[str]):
+        """Return claimed assets whose deletion failed to the pool."""
+        await self.collection.update_many({"id": {"$in": asset_ids}}, {"$unset": {"deleting": ""}})
+
+    async def set_variants(self, public_id: str, variants: dict, variant_keys: List[str], thumbnail_url: str):
+        await self.collection.update_one(
+            {"publicId": public_id},
+            {"$set": {"variants": variants, "variantKeys": variant_keys, "thumbnailUrl": thumbnail_url}},
+        )
+
+    async def attach_variants(self, items: List[dict]):
+        """Fill in variants (and the matching thumbnail) for gallery items that lack them."""
+        urls = [item["url"] for item in items if not item.get("variants")]
+        if not urls:
+            return
+        assets = await self.collection.find(
+            {"url": {"$in": urls}, "variants": {"$exists": True}},
+            {"_id": 0, "url": 1, "variants": 1, "thumbnailUrl": 1},
+        ).to_list(len(urls))
+        by_url = {asset["url"]: asset for asset in assets}
+        for item in items:
+            asset = by_url.get(item["url"])
+            if asset and not item.get("variants"):
+                item["variants"] = asset["variants"]
+                item["thumbnailUrl"] = asset["thumbnailUrl"]
+
+    async def reset_refs(self):
+        await self.collection.update_many({}, {"$set": {"refCount": 0}})
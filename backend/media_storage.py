@@ -0,0 +1,265 @@
+"""Where uploaded media bytes live.
+
+``CloudinaryStorage`` is the hosted backend the app started with;
+``LocalStorage`` writes files under a directory served by the API itself
+(development, tests, or a volume behind a CDN). Both expose the same async
+interface, so upload handling, thumbnail generation and garbage collection
+don't care which one is configured. Object keys are generated by the
+server; for Cloudinary they are public ids.
+
+``ResilientStorage`` puts any backend behind a ``resilience.Guard``
+(timeouts, bounded concurrency, retries, circuit breaker), and
+``FaultyStorage`` injects latency, errors and hangs for tests.
+"""
+import asyncio
+import io
+import mimetypes
+import random
+import shutil
+import urllib.request
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+
+from resilience import Guard
+
+CLOUDINARY_FOLDER = "orange_marketplace"
+# Not every Python's mimetypes table knows the newer image formats
+EXTENSIONS = {"image/webp": ".webp", "image/avif": ".avif"}
+
+
+def media_type_of(content_type: str) -> str:
+    return "video" if (content_type or "").startswith("video/") else "image"
+
+
+class CloudinaryStorage:
+    # Cloudinary can render the grid thumbnail itself from the URL
+    transforms_thumbnails = True
+
+    def __init__(self, get_cloudinary: Callable):
+        self._get_cloudinary = get_cloudinary
+
+    async def upload(self, file: BinaryIO, key: str, content_type: str = "") -> dict:
+        # Resource type is auto-detected (image | video)
+        result = await asyncio.to_thread(
+            self._get_cloudinary().uploader.upload,
+            file,
+            resource_type="auto",
+            folder=CLOUDINARY_FOLDER,
+            public_id=key
+        )
+        return {"url": result["secure_url"], "key": result["public_id"], "type": result["resource_type"]}
+
+    async def put(self, key: str, data: bytes, content_type: str) -> dict:
+        result = await asyncio.to_thread(
+            self._get_cloudinary().uploader.upload,
+            io.BytesIO(data),
+            resource_type="image",
+            public_id=key
+        )
+        return {"url": result["secure_url"], "key": result["public_id"], "type": "image"}
+
+    async def read(self, key: str, url: str) -> bytes:
+        def download():
+            with urllib.request.urlopen(url, timeout=60) as response:
+                return response.read()
+
+        return await asyncio.to_thread(download)
+
+    async def delete(self, key: str, media_type: str):
+        await asyncio.to_thread(
+            self._get_cloudinary().uploader.destroy,
+            key,
+            resource_type=media_type,
+            invalidate=True
+        )
+
+    def is_transient(self, exc: BaseException) -> bool:
+        from cloudinary import exceptions
+
+        # Rejections of the request itself won't change on retry
+        return not isinstance(exc, (
+            exceptions.BadRequest,
+            exceptions.NotFound,
+            exceptions.NotAllowed,
+            exceptions.AlreadyExists,
+            exceptions.AuthorizationRequired,
+        ))
+
+    def thumbnail_url(self, key: str, media_type: str) -> str:
+        image = self._get_cloudinary().CloudinaryImage(key)
+        if media_type == "video":
+            return image.build_url(
+                resource_type="video",
+                format="jpg",
+                transformation=[{
+                    "start_offset": "2",
+                    "width": 400,
+                    "height": 400,
+                    "crop": "fill"
+                }]
+            )
+        return image.build_url(width=400, height=400, crop="fill")
+
+    async def warm_thumbnail(self, key: str, media_type: str):
+        """Have Cloudinary render the thumbnail derivative ahead of the first view."""
+        eager = {"width": 400, "height": 400, "crop": "fill"}
+        if media_type == "video":
+            eager.update({"start_offset": "2", "format": "jpg"})
+        await asyncio.to_thread(
+            self._get_cloudinary().uploader.explicit,
+            key,
+            type="upload",
+            resource_type=media_type,
+            eager=[eager]
+        )
+
+
+class LocalStorage:
+    transforms_thumbnails = False
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def _stored(self, key: str, media_type: str) -> dict:
+        return {"url": f"{self.base_url}/{key}", "key": key, "type": media_type}
+
+    async def upload(self, file: BinaryIO, key: str, content_type: str = "") -> dict:
+        # Files are served from the API origin; an .html or .svg would be stored XSS
+        if not (content_type or "").startswith(("image/", "video/")) or content_type == "image/svg+xml":
+            raise ValueError(f"Refusing to store {content_type or 'untyped'} content")
+        key += EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ""
+
+        def write():
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as out:
+                shutil.copyfileobj(file, out)
+
+        await asyncio.to_thread(write)
+        return self._stored(key, media_type_of(content_type))
+
+    async def put(self, key: str, data: bytes, content_type: str) -> dict:
+        key += EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ""
+
+        def write():
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+        await asyncio.to_thread(write)
+        return self._stored(key, "image")
+
+    async def read(self, key: str, url: str) -> bytes:
+        return await asyncio.to_thread(self._path(key).read_bytes)
+
+    async def delete(self, key: str, media_type: str):
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+    def is_transient(self, exc: BaseException) -> bool:
+        return not isinstance(exc, (FileNotFoundError, IsADirectoryError, ValueError))
+
+    def thumbnail_url(self, key: str, media_type: str) -> str:
+        # Replaced by a generated variant once the thumbnail job has run
+        return self._stored(key, media_type)["url"] if media_type == "image" else ""
+
+
+class FaultyStorage:
+    """Wraps a backend and injects faults: errors, extra latency and hangs.
+
+    Meant for tests and load drills (``MEDIA_STORAGE=stub`` wraps local storage).
+    """
+
+    def __init__(
+        self,
+        inner,
+        failure_rate: float = 0.0,
+        latency: float = 0.0,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 3600.0,
+        seed: Optional[int] = None,
+    ):
+        self.inner = inner
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.transforms_thumbnails = inner.transforms_thumbnails
+        self._random = random.Random(seed)
+        self.calls = 0
+        # Fail this many upcoming calls outright
+        self.fail_next = 0
+
+    async def _inject(self):
+        self.calls += 1
+        if self.fail_next:
+            self.fail_next -= 1
+            raise ConnectionError("injected storage failure")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        roll = self._random.random()
+        if roll < self.hang_rate:
+            await asyncio.sleep(self.hang_seconds)
+        elif roll < self.hang_rate + self.failure_rate:
+            raise ConnectionError("injected storage failure")
+
+    async def upload(self, file: BinaryIO, key: str, content_type: str = "") -> dict:
+        await self._inject()
+        return await self.inner.upload(file, key, content_type)
+
+    async def put(self, key: str, data: bytes, content_type: str) -> dict:
+        await self._inject()
+        return await self.inner.put(key, data, content_type)
+
+    async def read(self, key: str, url: str) -> bytes:
+        await self._inject()
+        return await self.inner.read(key, url)
+
+    async def delete(self, key: str, media_type: str):
+        await self._inject()
+        await self.inner.delete(key, media_type)
+
+    def is_transient(self, exc: BaseException) -> bool:
+        return self.inner.is_transient(exc)
+
+    def thumbnail_url(self, key: str, media_type: str) -> str:
+        return self.inner.thumbnail_url(key, media_type)
+
+
+class ResilientStorage:
+    """Runs every remote call of ``inner`` through a ``Guard``."""
+
+    def __init__(self, inner, guard: Guard):
+        self.inner = inner
+        self.guard = guard
+        guard.is_transient = inner.is_transient
+        self.transforms_thumbnails = inner.transforms_thumbnails
+
+    async def upload(self, file: BinaryIO, key: str, content_type: str = "") -> dict:
+        # Same key on every attempt, so a retry overwrites rather than duplicates
+        return await self.guard.call(
+            lambda: self.inner.upload(file, key, content_type),
+            before_retry=lambda: file.seek(0),
+            retry_timeouts=False,
+        )
+
+    async def put(self, key: str, data: bytes, content_type: str) -> dict:
+        return await self.guard.call(lambda: self.inner.put(key, data, content_type))
+
+    async def read(self, key: str, url: str) -> bytes:
+        return await self.guard.call(lambda: self.inner.read(key, url))
+
+    async def delete(self, key: str, media_type: str):
+        await self.guard.call(lambda: self.inner.delete(key, media_type))
+
+    async def warm_thumbnail(self, key: str, media_type: str):
+        await self.guard.call(lambda: self.inner.warm_thumbnail(key, media_type))
+
+    def thumbnail_url(self, key: str, media_type: str) -> str:
+        return self.inner.thumbnail_url(key, media_type)
+
+    def stats(self) -> dict:
+        return self.guard.stats()
@@ -0,0 +1,254 @@
+"""Chat message storage.
+
+Two layouts are supported:
+
+* ``documents`` - one document per message in ``messages`` (the original
+  layout).
+* ``buckets`` - messages are ``$push``-ed into per-thread bucket documents in
+  ``message_buckets``. A bucket holds at most ``bucket_size`` messages and
+  spans at most ``bucket_span`` of time. Reading a thread then fetches only
+  its newest few buckets instead of thousands of small documents.
+
+``dual`` writes both layouts but keeps reading documents; it is the mode to
+run while ``migrate_to_buckets`` backfills existing threads.
+"""
+import math
+import uuid
+from datetime import timedelta
+from typing import AsyncIterator, List
+
+from storage_format import as_datetime
+
+BUCKETS_COLLECTION = "message_buckets"
+STORAGE_MODES = ("documents", "dual", "buckets")
+
+
+class DocumentMessageStore:
+    def __init__(self, db):
+        self.db = db
+
+    async def ensure_indexes(self):
+        await self.db.messages.create_index([("requestId", 1), ("createdAt", -1)])
+        await self.db.messages.create_index("senderUserId")
+
+    async def append(self, message: dict):
+        await self.db.messages.insert_one(dict(message))
+
+    async def latest(self, request_id: str, limit: int) -> List[dict]:
+        newest = await self.db.messages.find({"requestId": request_id}, {"_id": 0}).sort(
+            "createdAt", -1
+        ).limit(limit).to_list(limit)
+        newest.reverse()
+        return newest
+
+    async def stream(self, request_ids: List[str], batch_size: int = 1000) -> AsyncIterator[dict]:
+        """Every message of several threads, grouped by thread, oldest first in each."""
+        # Walks the (requestId, createdAt desc) index backwards
+        cursor = self.db.messages.find({"requestId": {"$in": request_ids}}, {"_id": 0}).sort(
+            [("requestId", -1), ("createdAt", 1)]
+        ).batch_size(batch_size)
+        async for message in cursor:
+            yield message
+
+    async def rename_sender(self, user_id: str, name: str):
+        await self.db.messages.update_many({"senderUserId": user_id}, {"$set": {"senderName": name}})
+
+
+class BucketMessageStore:
+    def __init__(self, db, bucket_size: int = 200, bucket_span: timedelta = timedelta(days=1)):
+        self.db = db
+        self.bucket_size = bucket_size
+        self.bucket_span = bucket_span
+
+    async def ensure_indexes(self):
+        buckets = self.db[BUCKETS_COLLECTION]
+        await buckets.create_index([("requestId", 1), ("firstAt", -1)])
+        await buckets.create_index("messages.senderUserId")
+
+    async def append(self, message: dict):
+        # Fill the thread's open bucket, or start a new one once it is full or
+        # older than the span. Concurrent first writes may open two buckets;
+        # reads merge buckets by time so that is harmless.
+        created_at = message["createdAt"]
+        # Compare in the same type the timestamps are stored in (string or date)
+        window_start = as_datetime(created_at) - self.bucket_span
+        if isinstance(created_at, str):
+            window_start = window_start.isoformat()
+        await self.db[BUCKETS_COLLECTION].update_one(
+            {
+                "requestId": message["requestId"],
+                "count": {"$lt": self.bucket_size},
+                "firstAt": {"$gte": window_start},
+            },
+            {
+                "$push": {"messages": message},
+                "$inc": {"count": 1},
+                "$set": {"lastAt": created_at},
+                "$setOnInsert": {"id": str(uuid.uuid4()), "firstAt": created_at},
+            },
+            upsert=True,
+        )
+
+    async def latest(self, request_id: str, limit: int) -> List[dict]:
+        # Buckets close on size or on age, so a quiet thread has many small
+        # ones: read newest first until enough messages are collected. Keep
+        # going while a bucket still reaches past the oldest message kept, in
+        # case two buckets were opened concurrently and overlap in time.
+        cursor = self.db[BUCKETS_COLLECTION].find(
+            {"requestId": request_id}, {"_id": 0, "messages": 1, "lastAt": 1}
+        ).sort("firstAt", -1).batch_size(max(2, math.ceil(limit / self.bucket_size) + 1))
+
+        messages = []
+        cutoff = None
+        async for bucket in cursor:
+            if cutoff is not None and as_datetime(bucket["lastAt"]) < cutoff:
+                break
+            messages.extend(bucket["messages"])
+            if len(messages) >= limit:
+                messages.sort(key=lambda m: as_datetime(m["createdAt"]))
+                cutoff = as_datetime(messages[-limit]["createdAt"])
+        messages.sort(key=lambda m: as_datetime(m["createdAt"]))
+        return messages[-limit:]
+
+    async def stream(self, request_ids: List[str], batch_size: int = 1000) -> AsyncIterator[dict]:
+        # One bucket holds up to bucket_size messages, so fetch fewer per batch
+        cursor = self.db[BUCKETS_COLLECTION].find(
+            {"requestId": {"$in": request_ids}}, {"_id": 0, "messages": 1}
+        ).sort([("requestId", -1), ("firstAt", 1)]).batch_size(max(1, batch_size // self.bucket_size))
+        async for bucket in cursor:
+            for message in bucket["messages"]:
+                yield message
+
+    async def rename_sender(self, user_id: str, name: str):
+        await self.db[BUCKETS_COLLECTION].update_many(
+            {"messages.senderUserId": user_id},
+            {"$set": {"messages.$[m].senderName": name}},
+            array_filters=[{"m.senderUserId": user_id}],
+        )
+
+
+class DualMessageStore:
+    """Writes both layouts, reads documents; used while migrating."""
+
+    def __init__(self, documents: DocumentMessageStore, buckets: BucketMessageStore):
+        self.documents = documents
+        self.buckets = buckets
+
+    async def ensure_indexes(self):
+        await self.documents.ensure_indexes()
+        await self.buckets.ensure_indexes()
+
+    async def append(self, message: dict):
+        await self.documents.append(message)
+        await self.buckets.append(message)
+
+    async def latest(self, request_id: str, limit: int) -> List[dict]:
+        return await self.documents.latest(request_id, limit)
+
+    def stream(self, request_ids: List[str], batch_size: int = 1000) -> AsyncIterator[dict]:
+        return self.documents.stream(request_ids, batch_size)
+
+    async def rename_sender(self, user_id: str, name: str):
+        await self.documents.rename_sender(user_id, name)
+        await self.buckets.rename_sender(user_id, name)
+
+
+def create_message_store(db, mode: str, bucket_size: int = 200, bucket_span: timedelta = timedelta(days=1)):
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown message storage mode {mode!r}; expected one of {', '.join(STORAGE_MODES)}")
+    documents = DocumentMessageStore(db)
+    buckets = BucketMessageStore(db, bucket_size, bucket_span)
+    if mode == "documents":
+        return documents
+    if mode == "buckets":
+        return buckets
+    return DualMessageStore(documents, buckets)
+
+
+def build_buckets(request_id: str, messages: List[dict], bucket_size: int, bucket_span: timedelta) -> List[dict]:
+    """Group one thread's messages (oldest first) the same way ``append`` would."""
+    buckets = []
+    current = None
+    for message in messages:
+        created_at = message["createdAt"]
+        if (
+            current is None
+            or current["count"] >= bucket_size
+            or as_datetime(created_at) - as_datetime(current["firstAt"]) > bucket_span
+        ):
+            current = {
+                "id": str(uuid.uuid4()),
+                "requestId": request_id,
+                "firstAt": created_at,
+                "lastAt": created_at,
+                "count": 0,
+                "messages": [],
+            }
+            buckets.append(current)
+        current["messages"].append(message)
+        current["count"] += 1
+        current["lastAt"] = created_at
+    return buckets
+
+
+async def migrate_to_buckets(db, bucket_size: int = 200, bucket_span: timedelta = timedelta(days=1), max_retries: int = 3) -> dict:
+    """Rebuild ``message_buckets`` from ``messages``, one thread at a time.
+
+    Run it while the API is in ``dual`` mode so threads stay complete: a
+    thread that changed while it was being rebuilt is redone, up to
+    ``max_retries`` times, and reported in ``failed`` if it never settled.
+    Safe to re-run; each thread is replaced as a whole.
+    """
+    buckets = db[BUCKETS_COLLECTION]
+    threads = await db.messages.aggregate([{"$group": {"_id": "$requestId"}}]).to_list(None)
+    migrated = 0
+    failed = []
+    for thread in threads:
+        request_id = thread["_id"]
+        for _ in range(max_retries):
+            messages = await db.messages.find({"requestId": request_id}, {"_id": 0}).sort("createdAt", 1).to_list(None)
+            await buckets.delete_many({"requestId": request_id})
+            rebuilt = build_buckets(request_id, messages, bucket_size, bucket_span)
+            # The thread may have emptied meanwhile (e.g. archived); insert_many rejects []
+            if rebuilt:
+                await buckets.insert_many(rebuilt)
+            # A dual-mode write racing the rebuild shows up as a count mismatch
+            # on either side (missing from the snapshot, or appended twice)
+            source_count = await db.messages.count_documents({"requestId": request_id})
+            bucket_count = sum(
+                b["count"] for b in await buckets.find({"requestId": request_id}, {"count": 1}).to_list(None)
+            )
+            if source_count == bucket_count == len(messages):
+                migrated += 1
+                break
+        else:
+            failed.append(request_id)
+    return {"threads": migrated, "failed": failed}
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    from database import Mongo
+    from settings import get_settings
+
+    async def main():
+        settings = get_settings()
+        mongo = Mongo(settings.mongo_url, settings.db_name)
+        mongo.connect()
+        try:
+            result = await migrate_to_buckets(
+                mongo.database(),
+                settings.message_bucket_size,
+                timedelta(hours=settings.message_bucket_span_hours),
+            )
+            print(f"Migrated {result['threads']} threads to {BUCKETS_COLLECTION}")
+            if result["failed"]:
+                print(f"{len(result['failed'])} threads kept changing and need a re-run: {', '.join(result['failed'])}")
+                return 1
+            return 0
+        finally:
+            mongo.close()
+
+    sys.exit(asyncio.run(main()))
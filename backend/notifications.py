@@ -0,0 +1,367 @@
+"""Notification digests for new requests, status changes and messages.
+
+Events are appended to the recipient's open digest in
+``notification_digests`` (one upsert per recipient; at most ``max_events``
+are kept, the rest only counted). Opening a digest schedules a
+``notifications.deliver`` outbox job for the end of the coalescing window.
+That job sends every due digest in batches through a transport and schedules
+a follow-up while a backlog remains.
+
+A digest the transport could not send (an error, or a refused recipient)
+goes to ``retry`` with a backoff ``sendAt`` and is claimed again like an
+open one; after ``max_attempts`` sends it is marked ``failed``. Retries
+don't reuse ``open``, because new events may already have opened the
+recipient's next digest.
+
+Back-pressure: while more than ``high_water`` digests are due, new digests
+get a proportionally longer window, so a slow transport produces fewer,
+larger digests rather than an ever-growing queue.
+"""
+import asyncio
+import logging
+import smtplib
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_COLLECTION = "notification_digests"
+DELIVER_JOB = "notifications.deliver"
+# Sent digests are kept for a week for debugging, then expire
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+MAX_BACKOFF_FACTOR = 4
+# Delay before resending a digest: doubles per attempt, capped
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+# How often a process that only records events re-reads the backlog
+BACKLOG_REFRESH_SECONDS = 30
+
+
+def notification_event(recipient_user_id: str, kind: str, request_id: str, text: str) -> dict:
+    return {
+        "recipientUserId": recipient_user_id,
+        "kind": kind,  # "request.created", "request.status" or "message"
+        "requestId": request_id,
+        "text": text,
+        "at": datetime.now(timezone.utc),
+    }
+
+
+def render_digest(digest: dict, to: str, sender: str, app_url: str = "") -> EmailMessage:
+    count = digest["eventCount"]
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = to
+    message["Subject"] = f"You have {count} new update{'s' if count != 1 else ''} on Orange"
+    lines = []
+    for event in digest["events"]:
+        line = f"- {event['text']}"
+        if app_url:
+            line += f"\n  {app_url.rstrip('/')}/chat/{event['requestId']}"
+        lines.append(line)
+    if count > len(digest["events"]):
+        lines.append(f"...and {count - len(digest['events'])} more")
+    message.set_content("\n".join(lines) + "\n")
+    return message
+
+
+class LogTransport:
+    """Logs digests instead of sending them; used when no SMTP server is configured."""
+
+    name = "log"
+
+    async def send(self, messages: List[EmailMessage]) -> List[bool]:
+        for message in messages:
+            logger.info("Notification digest for %s: %s", message["To"], message["Subject"])
+        return [True] * len(messages)
+
+
+class SmtpTransport:
+    """Sends a whole batch over one SMTP connection, in a worker thread.
+
+    Connection and authentication errors raise (the delivery job retries the
+    batch); a message the server refuses is reported as failed.
+    """
+
+    name = "smtp"
+
+    def __init__(self, host: str, port: int = 25, username: str = "", password: str = "",
+                 starttls: bool = False, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    async def send(self, messages: List[EmailMessage]) -> List[bool]:
+        return await asyncio.to_thread(self._send_all, messages)
+
+    def _send_all(self, messages: List[EmailMessage]) -> List[bool]:
+        results = []
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                try:
+                    smtp.send_message(message)
+                    results.append(True)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    logger.warning("Notification to %s refused: %s", message["To"], e)
+                    results.append(False)
+        return results
+
+
+class Notifier:
+    def __init__(
+        self,
+        db,
+        outbox,
+        transport,
+        sender: str,
+        window: timedelta,
+        batch_size: int = 100,
+        max_batches: int = 10,
+        high_water: int = 1000,
+        max_events: int = 20,
+        lease: timedelta = timedelta(minutes=5),
+        app_url: str = "",
+        max_attempts: int = 5,
+    ):
+        self.db = db
+        self.outbox = outbox
+        self.transport = transport
+        self.sender = sender
+        self.window = window
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.high_water = high_water
+        self.max_events = max_events
+        self.lease = lease
+        self.app_url = app_url
+        self.max_attempts = max_attempts
+        # Due digests, as last seen by this process
+        self.backlog = 0
+        self._backlog_checked_at = 0.0
+        self._sent_at: deque = deque(maxlen=10_000)
+        self.counters = {
+            "events": 0,
+            "digestsOpened": 0,
+            "sent": 0,
+            "eventsSent": 0,
+            "failed": 0,
+            "retried": 0,
+            "transportErrors": 0,
+            "dropped": 0,
+            "batches": 0,
+            "recordErrors": 0,
+        }
+        self._last_batch_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.transport is not None
+
+    @property
+    def collection(self):
+        return self.db[DIGESTS_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        # One open digest per recipient
+        await self.collection.create_index(
+            "recipientUserId", unique=True, partialFilterExpression={"status": "open"}, name="open_digest_per_recipient"
+        )
+        await self.collection.create_index([("status", 1), ("sendAt", 1)])
+        await self.collection.create_index("claimedBy", sparse=True)
+        await self.collection.create_index("sentAt", expireAfterSeconds=SENT_RETENTION_SECONDS)
+
+    def current_window(self) -> timedelta:
+        factor = min(MAX_BACKOFF_FACTOR, 1 + self.backlog // self.high_water) if self.high_water else 1
+        return self.window * factor
+
+    async def record(self, *events: dict):
+        """Add events to their recipients' digests.
+
+        Never raises: losing a notification must not fail the write behind it.
+        """
+        if not self.enabled or not events:
+            return
+        try:
+            await self._record(events)
+        except Exception as e:
+            self.counters["recordErrors"] += 1
+            logger.error("Could not record %d notification events: %s", len(events), e)
+
+    async def _record(self, events):
+        by_recipient: Dict[str, List[dict]] = {}
+        for event in events:
+            by_recipient.setdefault(event["recipientUserId"], []).append(event)
+        now = datetime.now(timezone.utc)
+        if time.monotonic() - self._backlog_checked_at > BACKLOG_REFRESH_SECONDS:
+            await self.due_count(now)
+        send_at = now + self.current_window()
+
+        def upsert(recipient: str) -> UpdateOne:
+            recipient_events = [{k: v for k, v in e.items() if k != "recipientUserId"} for e in by_recipient[recipient]]
+            return UpdateOne(
+                {"recipientUserId": recipient, "status": "open"},
+                {
+                    "$setOnInsert": {"id": str(uuid.uuid4()), "createdAt": now, "sendAt": send_at},
+                    "$push": {"events": {"$each": recipient_events, "$slice": self.max_events}},
+                    "$inc": {"eventCount": len(recipient_events)},
+                },
+                upsert=True,
+            )
+
+        recipients = list(by_recipient)
+        try:
+            result = await self.collection.bulk_write([upsert(r) for r in recipients], ordered=False)
+            opened = result.upserted_count
+        except BulkWriteError as e:
+            # A concurrent request opened the same recipient's digest first; now they match it
+            duplicates = [err["index"] for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+            if len(duplicates) != len(e.details.get("writeErrors", [])):
+                raise
+            opened = e.details.get("nUpserted", 0)
+            await self.collection.bulk_write([upsert(recipients[i]) for i in duplicates], ordered=False)
+
+        self.counters["events"] += len(events)
+        if opened:
+            self.counters["digestsOpened"] += opened
+            # One delivery run sends every digest due by then, so one job covers this batch
+            await self.outbox.enqueue(DELIVER_JOB, {}, delay_seconds=(send_at - now).total_seconds())
+
+    def _due(self, now: datetime) -> dict:
+        return {
+            "$or": [
+                {"status": {"$in": ["open", "retry"]}, "sendAt": {"$lte": now}},
+                # A delivery run that died mid-batch
+                {"status": "sending", "claimedUntil": {"$lte": now}},
+            ]
+        }
+
+    async def _claim(self, now: datetime) -> List[dict]:
+        # Digests whose delivery run died on their last attempt
+        abandoned = await self.collection.update_many(
+            {"status": "sending", "claimedUntil": {"$lte": now}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "sentAt": now}, "$unset": {"claimedBy": "", "claimedUntil": ""}},
+        )
+        self.counters["failed"] += abandoned.modified_count
+        due = self._due(now)
+        ids = [d["id"] async for d in self.collection.find(due, {"_id": 0, "id": 1}).sort("sendAt", 1).limit(self.batch_size)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        await self.collection.update_many(
+            {"id": {"$in": ids}, **due},
+            {
+                "$set": {"status": "sending", "claimedBy": token, "claimedUntil": now + self.lease},
+                "$inc": {"attempts": 1},
+            },
+        )
+        return await self.collection.find({"claimedBy": token}, {"_id": 0}).to_list(len(ids))
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+    async def _send(self, digests: List[dict]) -> bool:
+        """Send one claimed batch; returns False when the transport itself failed."""
+        started = time.monotonic()
+        users = await self.db.users.find(
+            {"id": {"$in": [d["recipientUserId"] for d in digests]}}, {"_id": 0, "id": 1, "email": 1}
+        ).to_list(len(digests))
+        emails = {u["id"]: u["email"] for u in users}
+        deliverable = [d for d in digests if d["recipientUserId"] in emails]
+        messages = [render_digest(d, emails[d["recipientUserId"]], self.sender, self.app_url) for d in deliverable]
+        transport_ok = True
+        try:
+            results = await self.transport.send(messages) if messages else []
+        except Exception as e:
+            self.counters["transportErrors"] += 1
+            logger.warning("Notification transport failed for a batch of %d: %s", len(messages), e)
+            results = [False] * len(messages)
+            transport_ok = False
+
+        now = datetime.now(timezone.utc)
+        outcome = {"sent": [], "failed": [], "dropped": [d["id"] for d in digests if d["recipientUserId"] not in emails]}
+        retries: Dict[float, List[str]] = {}
+        for digest, ok in zip(deliverable, results):
+            attempts = digest.get("attempts", 1)
+            if ok:
+                outcome["sent"].append(digest["id"])
+            elif attempts < self.max_attempts:
+                retries.setdefault(self.retry_delay(attempts), []).append(digest["id"])
+            else:
+                outcome["failed"].append(digest["id"])
+        unclaim = {"claimedBy": "", "claimedUntil": ""}
+        for status, ids in outcome.items():
+            if ids:
+                await self.collection.update_many(
+                    {"id": {"$in": ids}},
+                    {"$set": {"status": status, "sentAt": now}, "$unset": unclaim},
+                )
+                self.counters[status] += len(ids)
+        for delay, ids in retries.items():
+            await self.collection.update_many(
+                {"id": {"$in": ids}},
+                {"$set": {"status": "retry", "sendAt": now + timedelta(seconds=delay)}, "$unset": unclaim},
+            )
+            self.counters["retried"] += len(ids)
+        if retries:
+            # Retries aren't due yet, so the backlog check below won't see them
+            await self.outbox.enqueue(DELIVER_JOB, {}, delay_seconds=min(retries))
+        sent_ids = set(outcome["sent"])
+        self.counters["eventsSent"] += sum(d["eventCount"] for d in deliverable if d["id"] in sent_ids)
+        self.counters["batches"] += 1
+        sent_time = time.monotonic()
+        self._sent_at.extend([sent_time] * len(outcome["sent"]))
+        self._last_batch_seconds = sent_time - started
+        return transport_ok
+
+    async def deliver(self):
+        """Send due digests, a bounded number of batches per run."""
+        if not self.enabled:
+            return
+        now = datetime.now(timezone.utc)
+        for _ in range(self.max_batches):
+            digests = await self._claim(now)
+            if not digests:
+                break
+            if not await self._send(digests):
+                # The transport is down; the retries scheduled a later run
+                return
+        if await self.due_count(now):
+            await self.outbox.enqueue(DELIVER_JOB, {})
+
+    async def due_count(self, now: Optional[datetime] = None) -> int:
+        """Digests ready to send, including ones a dead delivery run left claimed."""
+        now = now or datetime.now(timezone.utc)
+        self.backlog = await self.collection.count_documents(self._due(now))
+        self._backlog_checked_at = time.monotonic()
+        return self.backlog
+
+    def throughput(self, window_seconds: float = 60.0) -> float:
+        cutoff = time.monotonic() - window_seconds
+        return sum(1 for t in self._sent_at if t >= cutoff) / window_seconds
+
+    async def stats(self) -> dict:
+        return {
+            "transport": self.transport.name if self.enabled else "off",
+            **self.counters,
+            "backlog": await self.due_count(),
+            "open": await self.collection.count_documents({"status": "open"}),
+            "retrying": await self.collection.count_documents({"status": "retry"}),
+            "windowSeconds": self.current_window().total_seconds(),
+            "throughputPerSecond": round(self.throughput(), 3),
+            "lastBatchSeconds": round(self._last_batch_seconds, 3),
+        }
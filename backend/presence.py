@@ -0,0 +1,215 @@
+"""Chat presence, typing indicators and read receipts.
+
+Presence and typing are ephemeral and never touch MongoDB: each open chat
+sends a heartbeat, and a participant counts as online (or typing) until
+their last heartbeat expires. ``InMemoryPresence`` keeps this per worker;
+``RedisPresence`` shares it between workers through any Redis-compatible
+server.
+
+Read receipts are durable but written lazily: ``ReadReceipts`` keeps the
+newest "last read" marker per participant in memory and flushes all of them
+to ``read_markers`` in one bulk write every ``flush_interval`` seconds.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from cache import TTLCache
+from storage_format import as_datetime
+
+logger = logging.getLogger(__name__)
+
+READ_MARKERS_COLLECTION = "read_markers"
+
+
+class InMemoryPresence:
+    """Per-process rooms: ``request id -> {user id: [online until, typing until]}``."""
+
+    def __init__(self, ttl: float = 15.0, typing_ttl: float = 5.0, max_rooms: int = 100_000):
+        self.ttl = ttl
+        self.typing_ttl = typing_ttl
+        self.max_rooms = max_rooms
+        self._rooms: Dict[str, Dict[str, list]] = {}
+
+    async def beat(self, request_id: str, user_id: str, typing: bool = False, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        room = self._rooms.get(request_id)
+        if room is None:
+            if len(self._rooms) >= self.max_rooms:
+                self._sweep(now)
+            room = self._rooms[request_id] = {}
+        room[user_id] = [now + self.ttl, now + self.typing_ttl if typing else 0.0]
+
+    async def members(self, request_id: str, now: Optional[float] = None) -> dict:
+        now = time.monotonic() if now is None else now
+        room = self._rooms.get(request_id, {})
+        for user_id in [u for u, (online_until, _) in room.items() if online_until <= now]:
+            del room[user_id]
+        if not room:
+            self._rooms.pop(request_id, None)
+        return {
+            "online": sorted(room),
+            "typing": sorted(u for u, (_, typing_until) in room.items() if typing_until > now),
+        }
+
+    def _sweep(self, now: float):
+        for request_id in [r for r, room in self._rooms.items() if all(v[0] <= now for v in room.values())]:
+            del self._rooms[request_id]
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "rooms": len(self._rooms)}
+
+
+class RedisPresence:
+    """Rooms shared between workers: two sorted sets per room scored by expiry.
+
+    ``redis`` is an optional dependency and only imported here, unless an
+    already-built asyncio ``client`` is passed in.
+    """
+
+    def __init__(self, url: str = "", ttl: float = 15.0, typing_ttl: float = 5.0, prefix: str = "presence:", client=None):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.redis = client
+        self.ttl = ttl
+        self.typing_ttl = typing_ttl
+        self.prefix = prefix
+
+    def _keys(self, request_id: str) -> Tuple[str, str]:
+        return f"{self.prefix}{request_id}:online", f"{self.prefix}{request_id}:typing"
+
+    async def beat(self, request_id: str, user_id: str, typing: bool = False, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        online, typing_key = self._keys(request_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(online, {user_id: now + self.ttl})
+        if typing:
+            pipe.zadd(typing_key, {user_id: now + self.typing_ttl})
+        else:
+            pipe.zrem(typing_key, user_id)
+        # Whole rooms disappear once nobody has been seen for a while
+        pipe.expire(online, int(self.ttl) + 1)
+        pipe.expire(typing_key, int(self.ttl) + 1)
+        await pipe.execute()
+
+    async def members(self, request_id: str, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        online, typing_key = self._keys(request_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(online, "-inf", now)
+        pipe.zrangebyscore(online, now, "+inf")
+        pipe.zrangebyscore(typing_key, now, "+inf")
+        _, online_ids, typing_ids = await pipe.execute()
+        return {
+            "online": sorted(u.decode() for u in online_ids),
+            "typing": sorted(u.decode() for u in typing_ids),
+        }
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class ReadReceipts:
+    """Last-read markers per ``(request id, user id)``, written in batches.
+
+    Markers only move forward; values are message ``createdAt`` timestamps
+    in the storage format, which order correctly either way.
+    """
+
+    def __init__(self, db, clock: Callable, flush_interval: float = 5.0, cache_ttl: float = 30.0):
+        self.db = db
+        self.clock = clock  # timestamps in the configured storage format
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, str], object] = {}
+        # request id -> {user id: marker}; other workers' marks show up within the TTL
+        self._markers = TTLCache(ttl=cache_ttl)
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.flushes = 0
+
+    @property
+    def collection(self):
+        return self.db[READ_MARKERS_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("requestId", 1), ("userId", 1)], unique=True)
+
+    def mark(self, request_id: str, user_id: str, last_read):
+        key = (request_id, user_id)
+        pending = self._pending.get(key)
+        if pending is None or last_read > pending:
+            self._pending[key] = last_read
+        markers = self._markers.get(request_id)
+        if markers is not None and (user_id not in markers or last_read > markers[user_id]):
+            markers[user_id] = last_read
+
+    async def markers(self, request_id: str) -> dict:
+        markers = self._markers.get(request_id)
+        if markers is None:
+            markers = {}
+            async for doc in self.collection.find({"requestId": request_id}, {"_id": 0, "userId": 1, "lastReadAt": 1}):
+                last_read = doc["lastReadAt"]
+                # pymongo hands back naive datetimes; marks from clients are aware
+                markers[doc["userId"]] = as_datetime(last_read) if isinstance(last_read, datetime) else last_read
+            for (pending_request, user_id), last_read in self._pending.items():
+                if pending_request == request_id and (user_id not in markers or last_read > markers[user_id]):
+                    markers[user_id] = last_read
+            self._markers.set(request_id, markers)
+        return markers
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        operations = [
+            UpdateOne(
+                {"requestId": request_id, "userId": user_id},
+                {"$max": {"lastReadAt": last_read}, "$set": {"updatedAt": self.clock()}},
+                upsert=True,
+            )
+            for (request_id, user_id), last_read in pending.items()
+        ]
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            # Put them back unless a newer mark arrived meanwhile
+            for key, last_read in pending.items():
+                if key not in self._pending or last_read > self._pending[key]:
+                    self._pending[key] = last_read
+            raise
+        self.flushed += len(operations)
+        self.flushes += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="read-receipts")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final read receipt flush failed; %d markers lost", len(self._pending))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Read receipt flush failed; retrying in %.0fs", self.flush_interval)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "flushed": self.flushed, "flushes": self.flushes}
@@ -0,0 +1,295 @@
+"""On-demand sampling profiler for request handlers.
+
+While active, a background thread wakes every ``interval`` seconds and
+records one stack for each request being profiled:
+
+* if the request's task is running on the event loop, the Python stack
+  under its coroutine (on-CPU time, e.g. bcrypt or Pydantic validation);
+* otherwise the chain of coroutines it is suspended in, ending in an
+  ``(await X)`` frame (time spent waiting on Mongo, storage, sleeps).
+
+Tasks a request spawns (``asyncio.gather``, ``create_task``) are profiled
+with it. Stacks are aggregated per route and exported as folded stacks
+(flamegraph.pl, speedscope) or speedscope JSON.
+
+Profiling is per worker. When inactive, the middleware costs one attribute
+check per request and nothing else is installed.
+"""
+import asyncio
+import contextvars
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+_current_request: contextvars.ContextVar = contextvars.ContextVar("profiled_request", default=None)
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+def _frame_key(frame) -> Frame:
+    code = frame.f_code
+    return (code.co_qualname if hasattr(code, "co_qualname") else code.co_name, code.co_filename, code.co_firstlineno)
+
+
+def _await_stack(coro) -> Tuple[Frame, ...]:
+    """Frames of a suspended coroutine chain, outermost first."""
+    stack: List[Frame] = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_key(frame))
+        awaiting = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        if awaiting is None:
+            break
+        if not (hasattr(awaiting, "cr_frame") or hasattr(awaiting, "gi_frame")):
+            # Awaiting a Future goes through its C iterator
+            name = type(awaiting).__name__
+            stack.append((f"(await {'Future' if name == 'FutureIter' else name})", "", 0))
+            break
+        coro = awaiting
+    return tuple(stack)
+
+
+def _running_stack(thread_frame, root_frame) -> Optional[Tuple[Frame, ...]]:
+    """Frames of the loop thread from the task's coroutine down, outermost first."""
+    stack: List[Frame] = []
+    frame = thread_frame
+    while frame is not None:
+        stack.append(_frame_key(frame))
+        if frame is root_frame:
+            return tuple(reversed(stack))
+        frame = frame.f_back
+    return None
+
+
+class _Request:
+    __slots__ = ("stacks", "cpu", "waiting", "token")
+
+    def __init__(self):
+        self.token = None
+        self.stacks: Counter = Counter()
+        self.cpu = 0
+        self.waiting = 0
+
+
+class Profiler:
+    def __init__(self, sample_rate: float = 0.0, interval: float = 0.005):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._window_rate = 0.0
+        self._window_until = 0.0
+        self._lock = threading.Lock()
+        self._tasks: Dict[asyncio.Task, _Request] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._previous_factory = None
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = time.time()
+        # (route, stack) -> samples; route -> counters
+        self.stacks: Counter = Counter()
+        self.routes: Dict[str, Counter] = {}
+
+    @property
+    def active(self) -> bool:
+        return self.sample_rate > 0 or time.monotonic() < self._window_until
+
+    def current_rate(self) -> float:
+        if time.monotonic() < self._window_until:
+            return max(self.sample_rate, self._window_rate)
+        return self.sample_rate
+
+    def start_window(self, seconds: float, rate: float = 1.0, interval: Optional[float] = None):
+        """Profile ``rate`` of all requests for the next ``seconds``."""
+        if interval is not None:
+            self.interval = interval
+        self._window_rate = rate
+        self._window_until = time.monotonic() + seconds
+        self._install()
+
+    def stop_window(self):
+        self._window_until = 0.0
+        if not self.active:
+            self._uninstall()
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.routes.clear()
+            self._started_at = time.time()
+
+    def _install(self):
+        """Hook task creation and start the sampler; must run on the event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._loop_thread = threading.get_ident()
+            self._previous_factory = loop.get_task_factory()
+            loop.set_task_factory(self._task_factory)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._sample_forever, name="profiler-sampler", daemon=True)
+            self._thread.start()
+
+    def _uninstall(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.set_task_factory(self._previous_factory)
+        self._loop = None
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        request = _current_request.get()
+        if request is not None:
+            self._track(task, request)
+        return task
+
+    def _track(self, task: asyncio.Task, request: _Request):
+        self._tasks[task] = request
+        task.add_done_callback(self._untrack)
+
+    def _untrack(self, task: asyncio.Task):
+        self._tasks.pop(task, None)
+
+    def _sample_forever(self):
+        while self.active:
+            time.sleep(self.interval)
+            try:
+                self._sample()
+            except Exception:
+                # Racing the event loop; drop this tick
+                pass
+
+    def _sample(self):
+        loop = self._loop
+        if loop is None or not self._tasks:
+            return
+        tasks = list(self._tasks.items())
+        running = asyncio.current_task(loop)
+        thread_frame = sys._current_frames().get(self._loop_thread)
+        with self._lock:
+            for task, request in tasks:
+                coro = task.get_coro()
+                if task is running and thread_frame is not None:
+                    stack = _running_stack(thread_frame, getattr(coro, "cr_frame", None))
+                    if stack is None:
+                        continue
+                    request.cpu += 1
+                else:
+                    stack = _await_stack(coro)
+                    request.waiting += 1
+                if stack:
+                    request.stacks[stack] += 1
+
+    def begin(self) -> Optional[_Request]:
+        """Called at the start of a request; returns a handle when it is sampled."""
+        if random.random() >= self.current_rate():
+            return None
+        self._install()
+        request = _Request()
+        request.token = _current_request.set(request)
+        self._track(asyncio.current_task(), request)
+        return request
+
+    def end(self, request: _Request, route: str, duration: float):
+        self._untrack(asyncio.current_task())
+        _current_request.reset(request.token)
+        with self._lock:
+            for stack, count in request.stacks.items():
+                self.stacks[(route, stack)] += count
+            summary = self.routes.setdefault(route, Counter())
+            summary["requests"] += 1
+            summary["cpuSamples"] += request.cpu
+            summary["awaitSamples"] += request.waiting
+            summary["wallMs"] += duration * 1000
+
+    # Export
+
+    def folded(self, route: Optional[str] = None) -> str:
+        """Brendan Gregg's folded format: ``route;frame;frame count`` per line."""
+        with self._lock:
+            items = list(self.stacks.items())
+        lines = []
+        for (label, stack), count in sorted(items):
+            if route is None or label == route:
+                frames = ";".join(name for name, _, _ in stack)
+                lines.append(f"{label};{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, route: Optional[str] = None) -> dict:
+        with self._lock:
+            items = list(self.stacks.items())
+        frames: List[dict] = []
+        frame_index: Dict[Frame, int] = {}
+        profiles: Dict[str, dict] = {}
+        interval_ms = self.interval * 1000
+        for (label, stack), count in sorted(items):
+            if route is not None and label != route:
+                continue
+            profile = profiles.setdefault(label, {
+                "type": "sampled",
+                "name": label,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": 0,
+                "samples": [],
+                "weights": [],
+            })
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    name, file, line = frame
+                    frames.append({"name": name, "file": file, "line": line} if file else {"name": name})
+                indexes.append(frame_index[frame])
+            profile["samples"].append(indexes)
+            profile["weights"].append(count * interval_ms)
+            profile["endValue"] += count * interval_ms
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"Orange API profile since {time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(self._started_at))}Z",
+            "exporter": "orange-profiler",
+            "shared": {"frames": frames},
+            "profiles": list(profiles.values()),
+        }
+
+    def summary(self) -> dict:
+        with self._lock:
+            routes = {label: dict(counts) for label, counts in self.routes.items()}
+        for counts in routes.values():
+            counts["wallMs"] = round(counts["wallMs"], 1)
+            counts["cpuMs"] = round(counts["cpuSamples"] * self.interval * 1000, 1)
+            counts["awaitMs"] = round(counts["awaitSamples"] * self.interval * 1000, 1)
+        return {
+            "active": self.active,
+            "sampleRate": self.current_rate(),
+            "intervalMs": self.interval * 1000,
+            "inFlight": len(self._tasks),
+            "routes": dict(sorted(routes.items(), key=lambda item: -item[1]["wallMs"])),
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware feeding sampled requests to a ``Profiler``."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.active:
+            return await self.app(scope, receive, send)
+        request = self.profiler.begin()
+        if request is None:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            label = f"{scope['method']} {route.path if route is not None else '(unmatched)'}"
+            self.profiler.end(request, label, time.perf_counter() - started)
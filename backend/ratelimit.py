@@ -0,0 +1,209 @@
+"""Token-bucket rate limiting middleware.
+
+Budgets are declared per route and keyed either by the authenticated user id
+or by the client IP. Buckets live in-process by default; pass a
+``RedisBackend`` to share them between workers.
+"""
+import json
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    method: str
+    path: str  # exact path, "{param}" segments match any single segment
+    per_minute: float
+    burst: int
+    scope: str = "ip"  # "ip" or "user"
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+
+class InMemoryBackend:
+    """Per-process buckets: ``key -> [tokens, last_refill]``."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}
+
+    async def consume(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        """Take one token; return 0 when allowed, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            self._buckets[key] = [burst - 1.0, now]
+            return 0.0
+
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1.0:
+            bucket[0] = tokens - 1.0
+            return 0.0
+        bucket[0] = tokens
+        return (1.0 - tokens) / rate
+
+    def _evict(self, now: float):
+        # Buckets idle for over a minute are full again for every budget we
+        # use, so dropping them changes nothing; fall back to clearing half.
+        idle = [k for k, (_, last) in self._buckets.items() if now - last > 60]
+        for k in idle:
+            del self._buckets[k]
+        if len(self._buckets) >= self.max_keys:
+            for k in list(self._buckets)[: self.max_keys // 2]:
+                del self._buckets[k]
+
+
+class RedisBackend:
+    """Buckets shared between workers through any Redis-compatible server.
+
+    The refill-and-take step runs as a Lua script so it stays atomic across
+    workers. ``redis`` is an optional dependency and only imported here, unless
+    an already-built asyncio ``client`` is passed in.
+    """
+
+    SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+  tokens = burst
+  ts = now
+end
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, url: str = "", prefix: str = "rl:", client=None):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.redis = client
+        self.prefix = prefix
+        self._script = self.redis.register_script(self.SCRIPT)
+
+    async def consume(self, key: str, rate: float, burst: int, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        wait = await self._script(keys=[self.prefix + key], args=[rate, burst, now])
+        return float(wait)
+
+
+def _compile(path: str) -> re.Pattern:
+    return re.compile("^" + re.sub(r"\{[^/]+\}", "[^/]+", path) + "/?$")
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing ``RouteLimit`` budgets.
+
+    ``resolve_user`` maps a bearer token to a user id (or None); it is called
+    only for user-scoped routes and should be cheap or cached.
+
+    With ``trust_forwarded_for`` the client IP is the X-Forwarded-For entry
+    appended by the outermost of ``proxy_hops`` trusted proxies, counted from
+    the right; entries further left are whatever the client sent.
+    """
+
+    def __init__(
+        self,
+        app,
+        limits: List[RouteLimit],
+        backend=None,
+        resolve_user: Optional[Callable[[str], Optional[str]]] = None,
+        trust_forwarded_for: bool = False,
+        proxy_hops: int = 1,
+        enabled: bool = True,
+    ):
+        self.app = app
+        self.backend = backend or InMemoryBackend()
+        self.resolve_user = resolve_user
+        self.trust_forwarded_for = trust_forwarded_for
+        self.proxy_hops = max(1, proxy_hops)
+        self.enabled = enabled
+        self._exact: Dict[Tuple[str, str], RouteLimit] = {}
+        self._patterns: Dict[str, List[Tuple[re.Pattern, RouteLimit]]] = {}
+        for limit in limits:
+            if "{" in limit.path:
+                self._patterns.setdefault(limit.method, []).append((_compile(limit.path), limit))
+            else:
+                self._exact[(limit.method, limit.path.rstrip("/"))] = limit
+
+    def match(self, method: str, path: str) -> Optional[RouteLimit]:
+        limit = self._exact.get((method, path.rstrip("/")))
+        if limit is not None:
+            return limit
+        for pattern, limit in self._patterns.get(method, ()):
+            if pattern.match(path):
+                return limit
+        return None
+
+    def client_ip(self, scope) -> str:
+        if self.trust_forwarded_for:
+            # Repeated headers form one list, in order
+            forwarded = [
+                entry.strip()
+                for name, value in scope["headers"] if name == b"x-forwarded-for"
+                for entry in value.split(b",")
+            ]
+            if len(forwarded) >= self.proxy_hops:
+                return forwarded[-self.proxy_hops].decode("latin-1")
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def bucket_key(self, scope, limit: RouteLimit) -> str:
+        if limit.scope == "user" and self.resolve_user is not None:
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    token = value.decode("latin-1").partition(" ")[2]
+                    user_id = self.resolve_user(token) if token else None
+                    if user_id:
+                        return f"{limit.name}|u:{user_id}"
+                    break
+        # Unauthenticated callers of user-scoped routes are limited per IP
+        return f"{limit.name}|ip:{self.client_ip(scope)}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        limit = self.match(scope["method"], scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        wait = await self.backend.consume(self.bucket_key(scope, limit), limit.rate, limit.burst)
+        if wait <= 0:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Too many requests, please slow down"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
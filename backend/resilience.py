@@ -0,0 +1,256 @@
+"""Timeouts, bounded concurrency, retries and circuit breaking for remote calls.
+
+``Guard`` wraps calls to one dependency (e.g. the media storage backend):
+
+* at most ``max_concurrency`` calls are in flight; a caller that can't get a
+  slot within ``queue_timeout`` is rejected instead of piling up;
+* each attempt gets ``timeout`` seconds. Blocking work running in a thread
+  can't be interrupted, so its slot stays taken until it really returns;
+* transient failures are retried with full-jitter exponential backoff, but
+  retries are drawn from a budget that refills with successful traffic, so
+  an outage doesn't multiply load on the dependency;
+* a ``CircuitBreaker`` opens once the failure rate over a sliding window
+  crosses a threshold, fast-failing callers until a probe call succeeds.
+
+Rejections raise ``Unavailable`` carrying a ``retry_after`` hint.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Unavailable(Exception):
+    """The dependency can't take the call right now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CallTimeout(TimeoutError):
+    pass
+
+
+class CircuitBreaker:
+    """Closed -> open on a high failure rate -> half-open probes -> closed."""
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self._outcomes: deque = deque()  # (time, ok)
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self.clock() - self._opened_at >= self.open_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.open_seconds - (self.clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may proceed; in half-open state only one probe at a time."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, ok: bool, is_probe: bool = False):
+        now = self.clock()
+        if self._opened_at is not None:
+            # Only the probe decides; calls admitted before the breaker opened
+            # may still finish late and must not close (or re-open) it
+            if not is_probe:
+                return
+            self._probing = False
+            if ok:
+                self._opened_at = None
+                self._outcomes.clear()
+            else:
+                self._opened_at = now
+            return
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._opened_at = now
+            self.opened += 1
+
+    def release_probe(self):
+        """A probe ended without a verdict (e.g. a permanent error); let another through."""
+        self._probing = False
+
+
+class RetryBudget:
+    """Each call earns ``ratio`` of a retry; each retry spends one (capped at ``max_tokens``)."""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Guard:
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        max_concurrency: int = 8,
+        queue_timeout: float = 2.0,
+        retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+        is_transient: Callable[[BaseException], bool] = lambda exc: True,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.is_transient = is_transient
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.counters = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "rejectedOpen": 0,
+            "rejectedBusy": 0,
+        }
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        before_retry: Optional[Callable[[], None]] = None,
+        retry_timeouts: bool = True,
+    ) -> T:
+        """Run ``fn`` (a zero-argument coroutine factory) under the guard.
+
+        Pass ``retry_timeouts=False`` when a timed-out attempt may still be
+        using shared state (e.g. reading the file being uploaded).
+        """
+        self.counters["calls"] += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(fn)
+            except Unavailable:
+                raise
+            except Exception as exc:
+                if not self.is_transient(exc):
+                    raise
+                if (
+                    attempt >= self.retries
+                    or (isinstance(exc, CallTimeout) and not retry_timeouts)
+                    or not self.budget.withdraw()
+                ):
+                    raise Unavailable(f"{self.name} is failing: {exc}", self._retry_hint()) from exc
+            attempt += 1
+            self.counters["retries"] += 1
+            await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+            if before_retry is not None:
+                before_retry()
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        probe = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            self.counters["rejectedOpen"] += 1
+            raise Unavailable(f"{self.name} circuit is open", self._retry_hint())
+        verdict = False
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.counters["rejectedBusy"] += 1
+                raise Unavailable(f"{self.name} is busy", self.queue_timeout)
+
+            self.in_flight += 1
+            task = asyncio.ensure_future(fn())
+
+            def done(_):
+                self.in_flight -= 1
+                self._slots.release()
+
+            # The slot is freed when the work actually finishes, not when we stop waiting
+            task.add_done_callback(done)
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), self.timeout)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                self.counters["failed"] += 1
+                verdict = True
+                self.breaker.record(False, is_probe=probe)
+                # Don't leave "exception never retrieved" noise behind
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                raise CallTimeout(f"{self.name} call timed out after {self.timeout}s")
+            except Exception as exc:
+                if self.is_transient(exc):
+                    self.counters["failed"] += 1
+                    verdict = True
+                    self.breaker.record(False, is_probe=probe)
+                # Otherwise the dependency answered; the request itself was bad
+                raise
+            self.counters["succeeded"] += 1
+            verdict = True
+            self.breaker.record(True, is_probe=probe)
+            return result
+        finally:
+            # Busy, a permanent error or cancellation: no verdict, so let another probe through
+            if probe and not verdict:
+                self.breaker.release_probe()
+
+    def _retry_hint(self) -> float:
+        return self.breaker.retry_after() or self.backoff_max
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "inFlight": self.in_flight,
+            "maxConcurrency": self.max_concurrency,
+            "breaker": self.breaker.state,
+            "breakerOpened": self.breaker.opened,
+            "retryTokens": round(self.budget.tokens, 2),
+        }
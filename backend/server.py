@@ -1,57 +1,268 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Header, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from starlette.staticfiles import StaticFiles
+from pymongo import ReadPreference
+import asyncio
 import logging
-from pathlib import Path
+import math
+import os
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
+from functools import lru_cache
 import uuid
+import json
+import base64
+import csv
+import io
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
+from contextlib import asynccontextmanager
 from jose import JWTError, jwt
-import cloudinary
-import cloudinary.uploader
+from pymongo.errors import BulkWriteError
+from settings import get_settings
+from jobs import Outbox, JobRunner, new_job, ensure_outbox_indexes
+from cache import TTLCache
+from message_store import create_message_store
+from storage_format import StorageFormat, IsoDateTime, as_datetime, as_iso
+from database import Mongo
+from invalidation import InvalidationListener
+from sessions import Denylist, RefreshTokens, RefreshTokenReused
+from media import MediaAssets, hash_stream, media_urls, sniff_content_type
+from media_storage import CloudinaryStorage, LocalStorage, FaultyStorage, ResilientStorage, media_type_of
+from resilience import Guard, CircuitBreaker, Unavailable
+from thumbnails import CONTENT_TYPES, ThumbnailGenerator, srcset, thumbnail_variant
+from notifications import LogTransport, Notifier, SmtpTransport, notification_event
+from presence import InMemoryPresence, RedisPresence, ReadReceipts
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+from profiler import Profiler, ProfilingMiddleware
+from ratelimit import RateLimitMiddleware, RouteLimit, InMemoryBackend, RedisBackend
+
+# Configuration is parsed once; importing this module must stay cheap and
+# free of side effects (no network, no heavy optional imports)
+settings = get_settings()
+
+# MongoDB connection: the client is created in the app lifespan. `db` reads
+# from the primary; `read_db` lets marketplace listings and exports go to
+# secondaries when the deployment has them.
+mongo = Mongo(
+    settings.mongo_url,
+    settings.db_name,
+    max_pool_size=settings.mongo_max_pool_size,
+    min_pool_size=settings.mongo_min_pool_size,
+    wait_queue_timeout_ms=settings.mongo_wait_queue_timeout_ms,
+    max_idle_time_ms=settings.mongo_max_idle_time_ms,
+    connect_timeout_ms=settings.mongo_connect_timeout_ms,
+    server_selection_timeout_ms=settings.mongo_server_selection_timeout_ms,
+    compressors=settings.mongo_compressors,
+)
+db = mongo.database(ReadPreference.PRIMARY)
+read_db = mongo.database(ReadPreference.SECONDARY_PREFERRED)
+
+# Background jobs: side effects are written to the outbox alongside the primary
+# write and executed by the job runner (in-process, or `python worker.py`)
+outbox = Outbox(db)
+job_runner = JobRunner(
+    db,
+    concurrency=settings.job_workers,
+    lease_seconds=settings.job_lease_seconds,
+    max_attempts=settings.job_max_attempts,
+)
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Ids and timestamps: uuid4 + ISO strings ("legacy") or UUIDv7 + BSON dates ("native")
+storage = StorageFormat(settings.storage_format)
 
-print("✅ ENV PATH:", ROOT_DIR / ".env")
-print("✅ JWT_SECRET LOADED:", os.environ.get("JWT_SECRET"))
-print("✅ CORS_ORIGINS LOADED:", os.environ.get("CORS_ORIGINS"))
-print("✅ DB_NAME LOADED:", os.environ.get("DB_NAME"))
+# Chat messages live either one per document or in per-thread buckets
+message_store = create_message_store(
+    db,
+    settings.message_storage,
+    bucket_size=settings.message_bucket_size,
+    bucket_span=timedelta(hours=settings.message_bucket_span_hours),
+)
+MESSAGE_PAGE_SIZE = 500
+
+# Who has a chat open or is typing lives outside Mongo (per worker, or shared
+# through Redis); last-read markers are flushed to Mongo in batches
+presence = (
+    RedisPresence(settings.presence_redis_url, ttl=settings.presence_ttl_seconds, typing_ttl=settings.typing_ttl_seconds)
+    if settings.presence_redis_url
+    else InMemoryPresence(ttl=settings.presence_ttl_seconds, typing_ttl=settings.typing_ttl_seconds)
+)
+read_receipts = ReadReceipts(db, clock=storage.now, flush_interval=settings.read_receipt_flush_seconds)
+
+# Uploads are deduplicated by content hash; unreferenced assets are collected
+# by the media.collect_garbage job once they have been unused for the grace period
+media_assets = MediaAssets(db)
+MEDIA_GC_BATCH_SIZE = 100
+
+# Notification digests: events are coalesced per recipient for a window and
+# delivered in bulk by the notifications.deliver job
+if settings.notification_transport == "smtp":
+    notification_transport = SmtpTransport(
+        settings.smtp_host,
+        settings.smtp_port,
+        username=settings.smtp_username,
+        password=settings.smtp_password,
+        starttls=settings.smtp_starttls,
+    )
+elif settings.notification_transport == "log":
+    notification_transport = LogTransport()
+else:
+    notification_transport = None
+notifier = Notifier(
+    db,
+    outbox,
+    notification_transport,
+    sender=settings.notification_sender,
+    window=timedelta(minutes=settings.notification_window_minutes),
+    batch_size=settings.notification_batch_size,
+    high_water=settings.notification_high_water,
+    app_url=settings.app_url,
+)
 
+# Maximum number of creators a single bulk collaboration request may target
+BULK_REQUEST_MAX = settings.bulk_request_max
+# Maximum number of requests a creator may accept/decline/archive in one call
+BULK_STATUS_MAX = settings.bulk_status_max
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Status transitions allowed by the bulk endpoint: target -> current statuses
+BULK_STATUS_TRANSITIONS = {
+    "accepted": ["pending"],
+    "declined": ["pending"],
+    "archived": ["declined", "completed"],
+}
 
-# JWT Configuration
-SECRET_KEY = os.environ.get('JWT_SECRET', 'orange-marketplace-secret-key-2024')
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_DAYS = 7
+REQUEST_STATUSES = ["pending", "accepted", "declined", "completed"]
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Maximum number of ids a profile multi-get may ask for
+PROFILE_BATCH_MAX = settings.profile_batch_max
 
-# Cloudinary Configuration
-cloudinary.config(
-    cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME', ''),
-    api_key=os.environ.get('CLOUDINARY_API_KEY', ''),
-    api_secret=os.environ.get('CLOUDINARY_API_SECRET', ''),
-    secure=True
-)
+# Request list totals are cached per owner and invalidated on writes; the TTL
+# bounds staleness for writes handled by other workers
+request_counts = TTLCache(ttl=settings.request_count_ttl_seconds)
 
-print("☁️ CLOUDINARY CLOUD NAME:", os.environ.get("CLOUDINARY_CLOUD_NAME"))
-print("☁️ CLOUDINARY API KEY:", os.environ.get("CLOUDINARY_API_KEY"))
-print("☁️ CLOUDINARY API SECRET:", os.environ.get("CLOUDINARY_API_SECRET"))
+# Per-worker caches for the hottest lookups. Writes evict locally; writes made
+# by other workers arrive through the invalidation listener (change streams,
+# or polling `updatedAt` on a standalone mongod)
+user_cache = TTLCache(ttl=settings.cache_ttl_seconds)
+profile_cache = TTLCache(ttl=settings.cache_ttl_seconds)  # ("creator"|"business", id)
+participants_cache = TTLCache(ttl=settings.cache_ttl_seconds)  # request id
 
+# JWT Configuration
+SECRET_KEY = settings.jwt_secret
+ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL = timedelta(minutes=settings.access_token_ttl_minutes)
+
+# Sessions: short-lived access tokens renewed with rotating refresh tokens.
+# Revoked sessions are mirrored in memory so checking a token never hits Mongo
+refresh_tokens = RefreshTokens(db, ttl=timedelta(days=settings.refresh_token_ttl_days))
+denylist = Denylist(db, token_ttl=ACCESS_TOKEN_TTL, clock=storage.now)
+
+# Rate limiting: per-route token buckets keyed by user id or client IP
+RATE_LIMITS = [
+    RouteLimit("POST", "/api/auth/login", per_minute=10, burst=5),
+    RouteLimit("POST", "/api/auth/signup", per_minute=5, burst=5),
+    RouteLimit("POST", "/api/auth/refresh", per_minute=30, burst=10),
+    RouteLimit("POST", "/api/upload", per_minute=30, burst=10, scope="user"),
+    RouteLimit("POST", "/api/messages/{request_id}", per_minute=60, burst=20, scope="user"),
+    RouteLimit("POST", "/api/messages/{request_id}/presence", per_minute=120, burst=30, scope="user"),
+    RouteLimit("GET", "/api/creators", per_minute=120, burst=60),
+    RouteLimit("GET", "/api/creators/batch", per_minute=120, burst=60),
+    RouteLimit("GET", "/api/requests/export", per_minute=6, burst=3, scope="user"),
+    RouteLimit("GET", "/api/requests/export/messages", per_minute=6, burst=3, scope="user"),
+]
+
+# Writes that mobile clients retry: a repeated Idempotency-Key replays the
+# stored response instead of creating a second request, message or upload
+IDEMPOTENT_ROUTES = [
+    ("POST", "/api/requests/"),
+    ("POST", "/api/requests/bulk"),
+    ("POST", "/api/messages/{request_id}"),
+    ("POST", "/api/upload"),
+]
+idempotency_store = IdempotencyStore(
+    db,
+    ttl=timedelta(hours=settings.idempotency_ttl_hours),
+    lease=timedelta(seconds=settings.idempotency_lease_seconds),
+)
+
+# Sampling profiler: off unless PROFILE_SAMPLE_RATE is set or an ops caller
+# opens a profiling window
+profiler = Profiler(sample_rate=settings.profile_sample_rate, interval=settings.profile_interval_ms / 1000)
+
+# Password hashing and Cloudinary are only needed by a few routes, so they are
+# imported and configured on first use rather than at worker boot
+@lru_cache(maxsize=1)
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache(maxsize=1)
+def get_cloudinary():
+    import cloudinary
+    import cloudinary.uploader
+    cloudinary.config(
+        cloud_name=settings.cloudinary_cloud_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+    return cloudinary
+
+# Uploaded bytes go to Cloudinary or to local files; thumbnails are either
+# Cloudinary URL transformations or responsive variants rendered locally
+if settings.media_storage in ("local", "stub"):
+    media_backend = LocalStorage(settings.media_local_dir, settings.media_base_url)
+    if settings.media_storage == "stub":
+        media_backend = FaultyStorage(
+            media_backend,
+            failure_rate=settings.media_stub_failure_rate,
+            latency=settings.media_stub_latency_ms / 1000
+        )
+else:
+    media_backend = CloudinaryStorage(get_cloudinary)
+# A slow or failing backend fails fast with 503s instead of tying up workers
+media_storage = ResilientStorage(media_backend, Guard(
+    "media storage",
+    timeout=settings.storage_timeout_seconds,
+    max_concurrency=settings.storage_max_concurrency,
+    retries=settings.storage_retries,
+    breaker=CircuitBreaker(
+        failure_rate=settings.storage_breaker_failure_rate,
+        min_calls=settings.storage_breaker_min_calls,
+        open_seconds=settings.storage_breaker_open_seconds
+    )
+))
+LOCAL_THUMBNAILS = settings.thumbnail_mode == "local" or not media_storage.transforms_thumbnails
+thumbnail_generator = ThumbnailGenerator(settings.thumbnail_workers)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mongo.connect()
+    await ensure_outbox_indexes(db)
+    await ensure_indexes()
+    await invalidation_listener.start()
+    # After the listener starts so no revocation falls between the two
+    await denylist.load()
+    if settings.cache_invalidation_mode == "off":
+        # Nothing tells this worker about other workers' logouts
+        denylist.start(settings.revocation_reload_seconds)
+    if settings.job_runner_mode == "inprocess":
+        job_runner.start()
+    read_receipts.start()
+    try:
+        yield
+    finally:
+        await job_runner.stop()
+        await read_receipts.stop()
+        await invalidation_listener.stop()
+        await denylist.stop()
+        thumbnail_generator.close()
+        mongo.close()
 
 # Create the main app
-app = FastAPI(title="Orange - Creator Marketplace API")
+app = FastAPI(title="Orange - Creator Marketplace API", lifespan=lifespan)
 
 # Create routers
 api_router = APIRouter(prefix="/api")
@@ -60,8 +271,10 @@ creator_router = APIRouter(prefix="/creator", tags=["Creator"])
 business_router = APIRouter(prefix="/business", tags=["Business"])
 request_router = APIRouter(prefix="/requests", tags=["Requests"])
 message_router = APIRouter(prefix="/messages", tags=["Messages"])
+ops_router = APIRouter(prefix="/ops", tags=["Ops"])
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # ============== MODELS ==============
 
@@ -82,14 +295,24 @@ class UserResponse(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str = "bearer"
+    expires_in: int  # seconds until access_token expires
     user: UserResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class MediaItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     type: str  # "image" or "video"
     url: str
     thumbnailUrl: str
+    # srcset per content type, e.g. {"image/webp": "<url> 160w, <url> 400w"}
+    variants: Dict[str, str] = {}
     createdAt: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class RateInfo(BaseModel):
@@ -125,8 +348,8 @@ class CreatorProfileResponse(BaseModel):
     isOpenToBarter: bool
     rates: RateInfo
     mediaGallery: List[MediaItem]
-    createdAt: str
-    updatedAt: str
+    createdAt: IsoDateTime
+    updatedAt: IsoDateTime
 
 class BusinessProfileCreate(BaseModel):
     brandName: str
@@ -151,8 +374,16 @@ class BusinessProfileResponse(BaseModel):
     instagramUrl: str
     profilePhotoUrl: str
     mediaGallery: List[MediaItem]
-    createdAt: str
-    updatedAt: str
+    createdAt: IsoDateTime
+    updatedAt: IsoDateTime
+
+class CreatorProfileBatchResponse(BaseModel):
+    profiles: List[CreatorProfileResponse]
+    missing: List[str]
+
+class BusinessProfileBatchResponse(BaseModel):
+    profiles: List[BusinessProfileResponse]
+    missing: List[str]
 
 class CollaborationRequestCreate(BaseModel):
     creatorId: str
@@ -172,13 +403,41 @@ class CollaborationRequestResponse(BaseModel):
     deliverables: str
     status: str
     timeline: str
-    createdAt: str
-    updatedAt: str
+    createdAt: IsoDateTime
+    updatedAt: IsoDateTime
     creatorName: Optional[str] = ""
     businessName: Optional[str] = ""
     creatorPhoto: Optional[str] = ""
     businessPhoto: Optional[str] = ""
 
+class BulkCollaborationRequestCreate(BaseModel):
+    creatorIds: List[str]
+    title: str
+    brief: str
+    offerAmount: Optional[float] = 0
+    deliverables: Optional[str] = ""
+    timeline: Optional[str] = ""
+
+class BulkRequestFailure(BaseModel):
+    creatorId: str
+    reason: str
+
+class BulkCollaborationRequestResponse(BaseModel):
+    created: List[CollaborationRequestResponse]
+    failed: List[BulkRequestFailure]
+
+class BulkStatusUpdate(BaseModel):
+    requestIds: List[str]
+    status: str  # "accepted", "declined" or "archived"
+
+class BulkStatusFailure(BaseModel):
+    requestId: str
+    reason: str
+
+class BulkStatusUpdateResponse(BaseModel):
+    updated: List[str]
+    failed: List[BulkStatusFailure]
+
 class MessageCreate(BaseModel):
     text: str
 
@@ -188,27 +447,66 @@ class MessageResponse(BaseModel):
     senderUserId: str
     senderName: str
     text: str
-    createdAt: str
+    createdAt: IsoDateTime
+
+class PresenceUpdate(BaseModel):
+    typing: bool = False
+    lastReadAt: Optional[str] = None  # createdAt of the newest message on screen
+
+class PresenceResponse(BaseModel):
+    online: List[str]  # user ids with the chat open
+    typing: List[str]
+    lastRead: Dict[str, IsoDateTime]  # user id -> createdAt of the last message read
 
 class UploadResponse(BaseModel):
     url: str
     thumbnailUrl: str
     type: str
+    variants: Dict[str, str] = {}
 
 # ============== AUTH UTILITIES ==============
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
-def create_access_token(data: dict) -> str:
+def create_access_token(data: dict, session_id: str) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    to_encode.update({"sid": session_id, "iat": now.timestamp(), "exp": now + ACCESS_TOKEN_TTL})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+async def issue_tokens(user: dict, session_id: Optional[str] = None, refresh_token: Optional[str] = None) -> TokenResponse:
+    # A new session on login/signup; refresh passes the session and the rotated token
+    if session_id is None:
+        session_id = uuid.uuid4().hex
+        refresh_token = await refresh_tokens.issue(user["id"], session_id)
+    return TokenResponse(
+        access_token=create_access_token({"sub": user["id"], "email": user["email"], "role": user["role"]}, session_id),
+        refresh_token=refresh_token,
+        expires_in=int(ACCESS_TOKEN_TTL.total_seconds()),
+        user=UserResponse(
+            id=user["id"],
+            email=user["email"],
+            role=user["role"],
+            hasCompletedOnboarding=user.get("hasCompletedOnboarding", False)
+        )
+    )
+
+async def revoke_session(session_id: str, user_id: str):
+    await refresh_tokens.revoke_session(session_id)
+    await denylist.revoke_session(session_id, user_id)
+
+@lru_cache(maxsize=10000)
+def rate_limit_user_id(token: str) -> Optional[str]:
+    # Only used to scope rate-limit buckets and idempotency keys; expiry is enforced by get_current_user
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False}).get("sub")
+    except JWTError:
+        return None
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
@@ -216,14 +514,25 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
+        # In-memory denylist mirror: no database round trip
+        if denylist.is_revoked(payload.get("sid"), user_id, payload.get("iat", 0)):
+            raise HTTPException(status_code=401, detail="Session has been revoked")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(user_id, user)
         return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def require_ops_key(x_ops_key: Optional[str] = Header(None)):
+    # Ops endpoints are disabled unless OPS_API_KEY is configured
+    if not settings.ops_api_key or x_ops_key != settings.ops_api_key:
+        raise HTTPException(status_code=404, detail="Not found")
+
 # ============== AUTH ROUTES ==============
 
 @auth_router.post("/signup", response_model=TokenResponse)
@@ -236,24 +545,19 @@ async def signup(user_data: UserCreate):
     if user_data.role not in ["creator", "business"]:
         raise HTTPException(status_code=400, detail="Role must be 'creator' or 'business'")
     
-    user_id = str(uuid.uuid4())
+    user_id = storage.new_id()
     user_doc = {
         "id": user_id,
         "email": user_data.email,
         "passwordHash": get_password_hash(user_data.password),
         "role": user_data.role,
         "hasCompletedOnboarding": False,
-        "createdAt": datetime.now(timezone.utc).isoformat()
+        "createdAt": storage.now()
     }
     
     await db.users.insert_one(user_doc)
     
-    token = create_access_token({"sub": user_id, "email": user_data.email, "role": user_data.role})
-    
-    return TokenResponse(
-        access_token=token,
-        user=UserResponse(id=user_id, email=user_data.email, role=user_data.role, hasCompletedOnboarding=False)
-    )
+    return await issue_tokens(user_doc)
 
 @auth_router.post("/login", response_model=TokenResponse)
 async def login(user_data: UserLogin):
@@ -264,17 +568,23 @@ async def login(user_data: UserLogin):
     if not verify_password(user_data.password, user["passwordHash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    token = create_access_token({"sub": user["id"], "email": user["email"], "role": user["role"]})
+    return await issue_tokens(user)
+
+@auth_router.post("/refresh", response_model=TokenResponse)
+async def refresh(body: RefreshRequest):
+    try:
+        rotated = await refresh_tokens.rotate(body.refresh_token)
+    except RefreshTokenReused as e:
+        # Someone replayed an old token: end the session for everyone holding it
+        await revoke_session(e.session_id, e.user_id)
+        raise HTTPException(status_code=401, detail="Refresh token has already been used")
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
     
-    return TokenResponse(
-        access_token=token,
-        user=UserResponse(
-            id=user["id"], 
-            email=user["email"], 
-            role=user["role"],
-            hasCompletedOnboarding=user.get("hasCompletedOnboarding", False)
-        )
-    )
+    user = await db.users.find_one({"id": rotated["userId"]}, {"_id": 0})
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return await issue_tokens(user, rotated["sessionId"], rotated["token"])
 
 @auth_router.get("/me", response_model=UserResponse)
 async def get_me(current_user: dict = Depends(get_current_user)):
@@ -286,9 +596,31 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     )
 
 @auth_router.post("/logout")
-async def logout():
+async def logout(
+    body: Optional[LogoutRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # Works with either token; an expired access token still names its session
+    session = None
+    if credentials:
+        try:
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+            if payload.get("sid"):
+                session = {"sessionId": payload["sid"], "userId": payload["sub"]}
+        except JWTError:
+            pass
+    if session is None and body and body.refresh_token:
+        session = await refresh_tokens.find_session(body.refresh_token)
+    if session:
+        await revoke_session(session["sessionId"], session["userId"])
     return {"message": "Logged out successfully"}
 
+@auth_router.post("/logout-all")
+async def logout_everywhere(current_user: dict = Depends(get_current_user)):
+    await refresh_tokens.revoke_user(current_user["id"])
+    await denylist.revoke_user(current_user["id"])
+    return {"message": "Logged out of all sessions"}
+
 # ============== UPLOAD ROUTES ==============
 
 @api_router.post("/upload", response_model=UploadResponse)
@@ -296,52 +628,354 @@ async def upload_file(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    try:
-        # Upload to Cloudinary (auto-detect image/video)
-        result = cloudinary.uploader.upload(
-            file.file,
-            resource_type="auto",
-            folder="orange_marketplace",
-            public_id=f"{current_user['id']}_{uuid.uuid4()}"
+    # Stored under the type the bytes show, never the one the client declared
+    content_type = await asyncio.to_thread(sniff_content_type, file.file)
+    if content_type is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Only JPEG, PNG, GIF, WebP or AVIF images and MP4, MOV or WebM videos can be uploaded"
         )
-
-        url = result["secure_url"]
-        resource_type = result["resource_type"]  # image | video
-
-        # Generate thumbnail
-        if resource_type == "video":
-            thumbnail_url = cloudinary.CloudinaryImage(
-                result["public_id"]
-            ).build_url(
-                resource_type="video",
-                format="jpg",
-                transformation=[{
-                    "start_offset": "2",
-                    "width": 400,
-                    "height": 400,
-                    "crop": "fill"
-                }]
-            )
+    if media_type_of(file.content_type or "") != media_type_of(content_type) or not (file.content_type or "").startswith(("image/", "video/")):
+        raise HTTPException(status_code=415, detail=f"File content is {content_type}, not {file.content_type}")
+    
+    try:
+        # Identical bytes already stored: hand back the existing asset
+        content_hash = await asyncio.to_thread(hash_stream, file.file)
+        asset = await media_assets.find(content_hash)
+        if asset is not None:
+            return {
+                "url": asset["url"],
+                "thumbnailUrl": asset["thumbnailUrl"],
+                "type": asset["type"],
+                "variants": asset.get("variants", {})
+            }
+
+        stored = await media_storage.upload(file.file, f"{current_user['id']}_{uuid.uuid4()}", content_type)
+        thumbnail_url = media_storage.thumbnail_url(stored["key"], stored["type"])
+
+        asset, created = await media_assets.register(content_hash, {
+            "url": stored["url"],
+            "thumbnailUrl": thumbnail_url,
+            "type": stored["type"],
+            "publicId": stored["key"]
+        })
+        if created:
+            # Render (or warm) thumbnails off the request path
+            await outbox.enqueue("media.thumbnail", {
+                "publicId": stored["key"],
+                "resourceType": stored["type"]
+            })
         else:
-            thumbnail_url = cloudinary.CloudinaryImage(
-                result["public_id"]
-            ).build_url(
-                width=400,
-                height=400,
-                crop="fill"
-            )
+            # A concurrent upload of the same bytes got there first
+            await outbox.enqueue("media.delete", {
+                "publicId": stored["key"],
+                "resourceType": stored["type"]
+            })
+        job_runner.notify()
 
         return {
-            "url": url,
-            "thumbnailUrl": thumbnail_url,
-            "type": resource_type
+            "url": asset["url"],
+            "thumbnailUrl": asset["thumbnailUrl"],
+            "type": asset["type"],
+            "variants": asset.get("variants", {})
         }
 
+    except Unavailable as e:
+        logging.warning(f"Upload rejected: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Media storage is temporarily unavailable, please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         logging.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+# ============== BACKGROUND JOBS ==============
+
+def profile_side_effects(current_user: dict, old_name: Optional[str], new_name: str) -> List[dict]:
+    jobs = []
+    if old_name is not None and old_name != new_name:
+        jobs.append(new_job("profile.renamed", {"userId": current_user["id"], "name": new_name}))
+    return jobs
+
+async def complete_onboarding(current_user: dict, session=None):
+    # Part of the profile write: the next /auth/me must not send the user back to onboarding
+    if not current_user.get("hasCompletedOnboarding"):
+        # updatedAt lets polling invalidation see the change
+        await db.users.update_one(
+            {"id": current_user["id"]},
+            {"$set": {"hasCompletedOnboarding": True, "updatedAt": storage.now()}},
+            session=session
+        )
+
+@job_runner.handler("notifications.deliver")
+async def deliver_notifications(payload: dict):
+    await notifier.deliver()
+
+@job_runner.handler("profile.renamed")
+async def fan_out_profile_rename(payload: dict):
+    # Messages carry a denormalized sender name
+    await message_store.rename_sender(payload["userId"], payload["name"])
+
+@job_runner.handler("media.thumbnail")
+async def generate_thumbnail(payload: dict):
+    if not LOCAL_THUMBNAILS:
+        await media_storage.warm_thumbnail(payload["publicId"], payload["resourceType"])
+        return
+    
+    asset = await media_assets.get(payload["publicId"])
+    if asset is None:
+        return  # already collected
+    data = await media_storage.read(asset["publicId"], asset["url"])
+    variants = await thumbnail_generator.render(data, asset["type"])
+    if not variants:
+        return  # Pillow without WebP/AVIF support; galleries keep the original URL
+    for variant in variants:
+        stored = await media_storage.put(
+            f"{os.path.splitext(asset['publicId'])[0]}_{variant['width']}w_{variant['format']}",
+            variant.pop("data"),
+            CONTENT_TYPES[variant["format"]]
+        )
+        variant.update(url=stored["url"], key=stored["key"])
+    
+    variant_map = srcset(variants)
+    thumbnail_url = thumbnail_variant(variants)["url"]
+    await media_assets.set_variants(asset["publicId"], variant_map, [v["key"] for v in variants], thumbnail_url)
+    
+    # Profiles saved before the variants existed
+    updated = 0
+    for collection in (db.creator_profiles, db.business_profiles):
+        result = await collection.update_many(
+            {"mediaGallery.url": asset["url"]},
+            {"$set": {
+                "mediaGallery.$[m].variants": variant_map,
+                "mediaGallery.$[m].thumbnailUrl": thumbnail_url,
+                "updatedAt": storage.now()
+            }},
+            array_filters=[{"m.url": asset["url"]}]
+        )
+        updated += result.modified_count
+    if updated:
+        profile_cache.clear()
+
+@job_runner.handler("media.delete")
+async def delete_stored_media(payload: dict):
+    await media_storage.delete(payload["publicId"], payload["resourceType"])
+
+@job_runner.handler("media.collect_garbage")
+async def collect_media_garbage(payload: dict):
+    unused_since = datetime.now(timezone.utc) - timedelta(hours=payload["graceHours"])
+    while True:
+        batch = await media_assets.claim_garbage(unused_since, MEDIA_GC_BATCH_SIZE)
+        if not batch:
+            break
+        removed, failed = [], []
+        for asset in batch:
+            # A profile may have started using it since the claim
+            if not await media_assets.still_garbage(asset["id"]):
+                continue
+            try:
+                await media_storage.delete(asset["publicId"], asset["type"])
+                for key in asset.get("variantKeys", []):
+                    await media_storage.delete(key, "image")
+                removed.append(asset["id"])
+            except Exception as e:
+                logging.warning(f"Could not delete media {asset['publicId']}: {e}")
+                failed.append(asset["id"])
+        await media_assets.remove(removed)
+        if failed:
+            # Leave them for the next run rather than retrying in a loop
+            await media_assets.release(failed)
+            break
+
+# ============== REQUEST LISTS ==============
+# Lists are newest-first and cursor-paginated on (createdAt, id). The next
+# cursor and the total are returned in the X-Next-Cursor / X-Total-Count
+# headers so the response body stays a plain list.
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([as_iso(doc["createdAt"]), doc["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, request_id = json.loads(raw)
+        return storage.from_iso(created_at), request_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def request_count_key(owner_field: str, owner_id: str) -> tuple:
+    return ("requests", owner_field, owner_id)
+
+def invalidate_request_counts(*requests: dict):
+    for req in requests:
+        request_counts.delete(
+            request_count_key("creatorId", req["creatorId"]),
+            request_count_key("businessId", req["businessId"])
+        )
+
+async def count_requests(owner_field: str, owner_id: str, status: Optional[str]) -> int:
+    key = request_count_key(owner_field, owner_id)
+    counts = request_counts.get(key)
+    if counts is None:
+        # One grouped count per owner serves every status filter until invalidated
+        rows = await db.collaboration_requests.aggregate([
+            {"$match": {owner_field: owner_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        counts = {row["_id"]: row["count"] for row in rows}
+        request_counts.set(key, counts)
+    return counts.get(status, 0) if status else sum(counts.values())
+
+async def list_requests_page(owner_field: str, owner_id: str, status: Optional[str], limit: int, cursor: Optional[str], response: Response) -> List[dict]:
+    if status and status not in REQUEST_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of {', '.join(REQUEST_STATUSES)}")
+    
+    # An explicit $in over all statuses lets the (owner, status, createdAt, id)
+    # index serve the sort by merging per-status ranges
+    query = {owner_field: owner_id, "status": status if status else {"$in": REQUEST_STATUSES}}
+    if cursor:
+        created_at, request_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "id": {"$lt": request_id}}
+        ]
+    
+    requests = await db.collaboration_requests.find(query, {"_id": 0}).sort(
+        [("createdAt", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(requests) > limit:
+        requests = requests[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(requests[-1])
+    response.headers["X-Total-Count"] = str(await count_requests(owner_field, owner_id, status))
+    return requests
+
+async def enrich_requests(requests: List[dict], creators: Optional[dict] = None, database=None):
+    database = db if database is None else database
+    creators = dict(creators or {})
+    missing_creators = list({r["creatorId"] for r in requests} - set(creators))
+    if missing_creators:
+        for c in await database.creator_profiles.find(
+            {"id": {"$in": missing_creators}}, {"_id": 0, "id": 1, "name": 1, "profilePhotoUrl": 1}
+        ).to_list(len(missing_creators)):
+            creators[c["id"]] = c
+    
+    business_user_ids = list({r["businessId"] for r in requests})
+    businesses = {}
+    if business_user_ids:
+        for b in await database.business_profiles.find(
+            {"userId": {"$in": business_user_ids}}, {"_id": 0, "userId": 1, "brandName": 1, "profilePhotoUrl": 1}
+        ).to_list(len(business_user_ids)):
+            businesses[b["userId"]] = b
+    
+    for req in requests:
+        creator = creators.get(req["creatorId"])
+        business = businesses.get(req["businessId"])
+        if creator:
+            req["creatorName"] = creator.get("name", "")
+            req["creatorPhoto"] = creator.get("profilePhotoUrl", "")
+        if business:
+            req["businessName"] = business.get("brandName", "")
+            req["businessPhoto"] = business.get("profilePhotoUrl", "")
+
+# ============== REQUEST ARCHIVING ==============
+# Finished requests and their messages are moved to cold collections so the
+# hot collaboration_requests / messages working set stays small.
+
+ARCHIVABLE_STATUSES = ["declined", "completed"]
+ARCHIVE_BATCH_SIZE = 500
+
+async def archive_requests(request_filter: dict) -> List[str]:
+    """Move matching requests and their chats to the archive; returns the archived ids."""
+    request_ids = [
+        r["id"] for r in await db.collaboration_requests.find(request_filter, {"_id": 0, "id": 1}).to_list(None)
+    ]
+    if not request_ids:
+        return []
+    
+    archived_at = storage.now()
+    # Copy first, delete second: a crash in between leaves duplicates that the
+    # next run merges away instead of losing data
+    for source, key in (("collaboration_requests", "id"), ("messages", "requestId"), ("message_buckets", "requestId")):
+        await db[source].aggregate([
+            {"$match": {key: {"$in": request_ids}}},
+            {"$set": {"archivedAt": archived_at}},
+            {"$merge": {"into": f"{source}_archive", "on": "_id", "whenMatched": "keepExisting", "whenNotMatched": "insert"}}
+        ]).to_list(None)
+    await db.messages.delete_many({"requestId": {"$in": request_ids}})
+    await db.message_buckets.delete_many({"requestId": {"$in": request_ids}})
+    await db.collaboration_requests.delete_many({"id": {"$in": request_ids}})
+    return request_ids
+
+@job_runner.handler("requests.archive_stale")
+async def archive_stale_requests(payload: dict):
+    cutoff = storage.timestamp(datetime.now(timezone.utc) - timedelta(days=payload["olderThanDays"]))
+    while True:
+        batch = await db.collaboration_requests.find(
+            {"status": {"$in": ARCHIVABLE_STATUSES}, "updatedAt": {"$lt": cutoff}},
+            {"_id": 0, "id": 1}
+        ).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+        await archive_requests({"id": {"$in": [r["id"] for r in batch]}, "status": {"$in": ARCHIVABLE_STATUSES}})
+    request_counts.clear()
+    participants_cache.clear()
+
+# ============== CACHE INVALIDATION ==============
+
+# Handlers get the changed document's id/creatorId/businessId, or None when
+# the change can't be attributed and the whole cache must go
+
+def invalidate_user(doc: Optional[dict]):
+    if doc is None:
+        user_cache.clear()
+    else:
+        user_cache.delete(doc["id"])
+
+def invalidate_creator_profile(doc: Optional[dict]):
+    if doc is None:
+        profile_cache.clear()
+    else:
+        profile_cache.delete(("creator", doc["id"]))
+    # Participants carry the creator's user id and name
+    participants_cache.clear()
+
+def invalidate_business_profile(doc: Optional[dict]):
+    if doc is None:
+        profile_cache.clear()
+    else:
+        profile_cache.delete(("business", doc["id"]))
+
+def invalidate_request(doc: Optional[dict]):
+    if doc is None:
+        participants_cache.clear()
+        request_counts.clear()
+    else:
+        participants_cache.delete(doc["id"])
+        invalidate_request_counts(doc)
+
+invalidation_listener = InvalidationListener(
+    db,
+    handlers={
+        "users": invalidate_user,
+        "creator_profiles": invalidate_creator_profile,
+        "business_profiles": invalidate_business_profile,
+        "collaboration_requests": invalidate_request,
+        # Archiving deletes requests, which polling can't see; the archived copy can
+        "collaboration_requests_archive": invalidate_request,
+        "revocations": denylist.apply,
+    },
+    fields=["creatorId", "businessId", "userId", "notBefore", "expiresAt"],
+    mode=settings.cache_invalidation_mode,
+    poll_interval=settings.cache_poll_interval_seconds,
+    clock=storage.now,
+    poll_fields={"collaboration_requests_archive": "archivedAt"},
+)
+
 # ============== CREATOR ROUTES ==============
 
 @creator_router.post("/profile", response_model=CreatorProfileResponse)
@@ -352,8 +986,8 @@ async def create_creator_profile(profile: CreatorProfileCreate, current_user: di
     # Check if profile exists
     existing = await db.creator_profiles.find_one({"userId": current_user["id"]})
     
-    now = datetime.now(timezone.utc).isoformat()
-    profile_id = existing["id"] if existing else str(uuid.uuid4())
+    now = storage.now()
+    profile_id = existing["id"] if existing else storage.new_id()
     
     profile_doc = {
         "id": profile_id,
@@ -372,14 +1006,21 @@ async def create_creator_profile(profile: CreatorProfileCreate, current_user: di
         "createdAt": existing["createdAt"] if existing else now,
         "updatedAt": now
     }
+    await media_assets.attach_variants(profile_doc["mediaGallery"])
     
-    if existing:
-        await db.creator_profiles.update_one({"id": profile_id}, {"$set": profile_doc})
-    else:
-        await db.creator_profiles.insert_one(profile_doc)
+    async def save_profile(session):
+        if existing:
+            await db.creator_profiles.update_one({"id": profile_id}, {"$set": profile_doc}, session=session)
+        else:
+            await db.creator_profiles.insert_one(profile_doc, session=session)
+        await media_assets.update_refs(media_urls(existing), media_urls(profile_doc), session=session)
+        await complete_onboarding(current_user, session)
     
-    # Mark onboarding complete
-    await db.users.update_one({"id": current_user["id"]}, {"$set": {"hasCompletedOnboarding": True}})
+    await outbox.write(save_profile, profile_side_effects(current_user, existing.get("name") if existing else None, profile.name))
+    job_runner.notify()
+    user_cache.delete(current_user["id"])
+    profile_cache.delete(("creator", profile_id))
+    participants_cache.clear()
     
     return CreatorProfileResponse(**profile_doc)
 
@@ -391,22 +1032,19 @@ async def get_my_creator_profile(current_user: dict = Depends(get_current_user))
     return CreatorProfileResponse(**profile)
 
 @creator_router.get("/requests", response_model=List[CollaborationRequestResponse])
-async def get_creator_requests(current_user: dict = Depends(get_current_user)):
+async def get_creator_requests(
+    response: Response,
+    status: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
     profile = await db.creator_profiles.find_one({"userId": current_user["id"]}, {"_id": 0})
     if not profile:
         raise HTTPException(status_code=404, detail="Creator profile not found")
     
-    requests = await db.collaboration_requests.find({"creatorId": profile["id"]}, {"_id": 0}).to_list(100)
-    
-    # Enrich with business info
-    for req in requests:
-        business = await db.business_profiles.find_one({"userId": req["businessId"]}, {"_id": 0})
-        if business:
-            req["businessName"] = business.get("brandName", "")
-            req["businessPhoto"] = business.get("profilePhotoUrl", "")
-        req["creatorName"] = profile.get("name", "")
-        req["creatorPhoto"] = profile.get("profilePhotoUrl", "")
-    
+    requests = await list_requests_page("creatorId", profile["id"], status, limit, cursor, response)
+    await enrich_requests(requests, creators={profile["id"]: profile})
     return [CollaborationRequestResponse(**req) for req in requests]
 
 # ============== BUSINESS ROUTES ==============
@@ -418,8 +1056,8 @@ async def create_business_profile(profile: BusinessProfileCreate, current_user:
     
     existing = await db.business_profiles.find_one({"userId": current_user["id"]})
     
-    now = datetime.now(timezone.utc).isoformat()
-    profile_id = existing["id"] if existing else str(uuid.uuid4())
+    now = storage.now()
+    profile_id = existing["id"] if existing else storage.new_id()
     
     profile_doc = {
         "id": profile_id,
@@ -436,13 +1074,20 @@ async def create_business_profile(profile: BusinessProfileCreate, current_user:
         "createdAt": existing["createdAt"] if existing else now,
         "updatedAt": now
     }
+    await media_assets.attach_variants(profile_doc["mediaGallery"])
     
-    if existing:
-        await db.business_profiles.update_one({"id": profile_id}, {"$set": profile_doc})
-    else:
-        await db.business_profiles.insert_one(profile_doc)
+    async def save_profile(session):
+        if existing:
+            await db.business_profiles.update_one({"id": profile_id}, {"$set": profile_doc}, session=session)
+        else:
+            await db.business_profiles.insert_one(profile_doc, session=session)
+        await media_assets.update_refs(media_urls(existing), media_urls(profile_doc), session=session)
+        await complete_onboarding(current_user, session)
     
-    await db.users.update_one({"id": current_user["id"]}, {"$set": {"hasCompletedOnboarding": True}})
+    await outbox.write(save_profile, profile_side_effects(current_user, existing.get("brandName") if existing else None, profile.brandName))
+    job_runner.notify()
+    user_cache.delete(current_user["id"])
+    profile_cache.delete(("business", profile_id))
     
     return BusinessProfileResponse(**profile_doc)
 
@@ -481,23 +1126,178 @@ async def get_creators(
     if openToBarter is not None:
         query["isOpenToBarter"] = openToBarter
     
-    creators = await db.creator_profiles.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
+    creators = await read_db.creator_profiles.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
     return [CreatorProfileResponse(**c) for c in creators]
 
+PROFILE_COLLECTIONS = {"creator": "creator_profiles", "business": "business_profiles"}
+
+async def load_profiles(kind: str, profile_ids: List[str]) -> dict:
+    # Single and batch reads share profile_cache; misses are fetched in one $in.
+    # Misses read the primary: a lagging secondary could refill the cache with
+    # a profile an edit has just evicted, and it would stay stale for the TTL
+    found = {}
+    missing = []
+    for profile_id in profile_ids:
+        profile = profile_cache.get((kind, profile_id))
+        if profile is None:
+            missing.append(profile_id)
+        else:
+            found[profile_id] = profile
+    if missing:
+        for profile in await db[PROFILE_COLLECTIONS[kind]].find(
+            {"id": {"$in": missing}}, {"_id": 0}
+        ).to_list(len(missing)):
+            profile_cache.set((kind, profile["id"]), profile)
+            found[profile["id"]] = profile
+    return found
+
+def parse_profile_ids(ids: str) -> List[str]:
+    profile_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not profile_ids:
+        raise HTTPException(status_code=400, detail="ids must list at least one profile id")
+    if len(profile_ids) > PROFILE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PROFILE_BATCH_MAX} ids per request")
+    return profile_ids
+
+@api_router.get("/creators/batch", response_model=CreatorProfileBatchResponse)
+async def get_creators_by_ids(ids: str = Query(..., description="Comma-separated creator profile ids")):
+    profile_ids = parse_profile_ids(ids)
+    found = await load_profiles("creator", profile_ids)
+    return CreatorProfileBatchResponse(
+        profiles=[CreatorProfileResponse(**found[i]) for i in profile_ids if i in found],
+        missing=[i for i in profile_ids if i not in found]
+    )
+
+@api_router.get("/businesses/batch", response_model=BusinessProfileBatchResponse)
+async def get_businesses_by_ids(ids: str = Query(..., description="Comma-separated business profile ids")):
+    profile_ids = parse_profile_ids(ids)
+    found = await load_profiles("business", profile_ids)
+    return BusinessProfileBatchResponse(
+        profiles=[BusinessProfileResponse(**found[i]) for i in profile_ids if i in found],
+        missing=[i for i in profile_ids if i not in found]
+    )
+
 @api_router.get("/creators/{creator_id}", response_model=CreatorProfileResponse)
 async def get_creator_by_id(creator_id: str):
-    creator = await db.creator_profiles.find_one({"id": creator_id}, {"_id": 0})
+    creator = (await load_profiles("creator", [creator_id])).get(creator_id)
     if not creator:
         raise HTTPException(status_code=404, detail="Creator not found")
     return CreatorProfileResponse(**creator)
 
 @api_router.get("/businesses/{business_id}", response_model=BusinessProfileResponse)
 async def get_business_by_id(business_id: str):
-    business = await db.business_profiles.find_one({"id": business_id}, {"_id": 0})
+    business = (await load_profiles("business", [business_id])).get(business_id)
     if not business:
         raise HTTPException(status_code=404, detail="Business not found")
     return BusinessProfileResponse(**business)
 
+# ============== EXPORTS ==============
+# Exports stream from secondaries when available, one fixed-size batch at a
+# time, so memory stays flat however long the history is
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+REQUEST_EXPORT_FIELDS = [
+    "id", "title", "brief", "status", "offerAmount", "deliverables", "timeline",
+    "creatorId", "creatorName", "businessId", "businessName", "createdAt", "updatedAt"
+]
+MESSAGE_EXPORT_FIELDS = ["requestId", "requestTitle", "id", "senderUserId", "senderName", "text", "createdAt"]
+
+async def export_owner(current_user: dict) -> tuple:
+    if current_user["role"] == "business":
+        return "businessId", current_user["id"]
+    profile = await db.creator_profiles.find_one({"userId": current_user["id"]}, {"_id": 0, "id": 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Creator profile not found")
+    return "creatorId", profile["id"]
+
+async def export_request_batches(owner_field: str, owner_id: str, status: Optional[str]):
+    # $in over statuses lets the (owner, status, createdAt) index serve the sort
+    query = {owner_field: owner_id, "status": status if status else {"$in": REQUEST_STATUSES}}
+    cursor = read_db.collaboration_requests.find(query, {"_id": 0}).sort("createdAt", -1).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for req in cursor:
+        batch.append(req)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            await enrich_requests(batch, database=read_db)
+            yield batch
+            batch = []
+    if batch:
+        await enrich_requests(batch, database=read_db)
+        yield batch
+
+def export_cell(value):
+    value = as_iso(value)
+    # Keep spreadsheet apps from evaluating user text as a formula
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+def export_lines(rows: List[dict], fields: List[str], format: str, header: bool) -> str:
+    if format == "ndjson":
+        return "".join(json.dumps({f: as_iso(row.get(f)) for f in fields}) + "\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    writer.writerows([export_cell(row.get(f, "")) for f in fields] for row in rows)
+    return buffer.getvalue()
+
+def export_response(lines, name: str, format: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    return StreamingResponse(
+        lines,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@request_router.get("/export")
+async def export_requests(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    if status and status not in REQUEST_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of {', '.join(REQUEST_STATUSES)}")
+    owner_field, owner_id = await export_owner(current_user)
+    
+    async def lines():
+        header = True
+        async for batch in export_request_batches(owner_field, owner_id, status):
+            yield export_lines(batch, REQUEST_EXPORT_FIELDS, format, header)
+            header = False
+        if header and format == "csv":
+            yield export_lines([], REQUEST_EXPORT_FIELDS, format, header)
+    
+    return export_response(lines(), "requests", format)
+
+@request_router.get("/export/messages")
+async def export_conversations(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    if status and status not in REQUEST_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of {', '.join(REQUEST_STATUSES)}")
+    owner_field, owner_id = await export_owner(current_user)
+    
+    async def lines():
+        header = format == "csv"
+        if header:
+            yield export_lines([], MESSAGE_EXPORT_FIELDS, format, header)
+        async for batch in export_request_batches(owner_field, owner_id, status):
+            titles = {req["id"]: req["title"] for req in batch}
+            rows = []
+            async for message in message_store.stream(list(titles), EXPORT_BATCH_SIZE):
+                rows.append({**message, "requestTitle": titles.get(message["requestId"], "")})
+                if len(rows) == EXPORT_BATCH_SIZE:
+                    yield export_lines(rows, MESSAGE_EXPORT_FIELDS, format, False)
+                    rows = []
+            if rows:
+                yield export_lines(rows, MESSAGE_EXPORT_FIELDS, format, False)
+    
+    return export_response(lines(), "conversations", format)
+
 # ============== COLLABORATION REQUEST ROUTES ==============
 
 @request_router.post("/", response_model=CollaborationRequestResponse, status_code=status.HTTP_201_CREATED)
@@ -514,8 +1314,8 @@ async def create_request(req_data: CollaborationRequestCreate, current_user: dic
     if not business:
         raise HTTPException(status_code=404, detail="Please complete your business profile first")
     
-    now = datetime.now(timezone.utc).isoformat()
-    request_id = str(uuid.uuid4())
+    now = storage.now()
+    request_id = storage.new_id()
     
     request_doc = {
         "id": request_id,
@@ -532,6 +1332,11 @@ async def create_request(req_data: CollaborationRequestCreate, current_user: dic
     }
     
     await db.collaboration_requests.insert_one(request_doc)
+    invalidate_request_counts(request_doc)
+    await notifier.record(notification_event(
+        creator["userId"], "request.created", request_id,
+        f"{business.get('brandName', '')} sent you a collaboration request: {req_data.title}"
+    ))
     
     return CollaborationRequestResponse(
         **request_doc,
@@ -541,20 +1346,170 @@ async def create_request(req_data: CollaborationRequestCreate, current_user: dic
         businessPhoto=business.get("profilePhotoUrl", "")
     )
 
-@request_router.get("/sent", response_model=List[CollaborationRequestResponse])
-async def get_sent_requests(current_user: dict = Depends(get_current_user)):
-    requests = await db.collaboration_requests.find({"businessId": current_user["id"]}, {"_id": 0}).to_list(100)
+@request_router.post("/bulk", response_model=BulkCollaborationRequestResponse, status_code=status.HTTP_201_CREATED)
+async def create_bulk_requests(req_data: BulkCollaborationRequestCreate, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "business":
+        raise HTTPException(status_code=403, detail="Only businesses can send collaboration requests")
+    if not req_data.creatorIds:
+        raise HTTPException(status_code=400, detail="creatorIds must not be empty")
+    if len(req_data.creatorIds) > BULK_REQUEST_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_REQUEST_MAX} creators per bulk request")
     
-    for req in requests:
-        creator = await db.creator_profiles.find_one({"id": req["creatorId"]}, {"_id": 0})
-        business = await db.business_profiles.find_one({"userId": req["businessId"]}, {"_id": 0})
-        if creator:
-            req["creatorName"] = creator.get("name", "")
-            req["creatorPhoto"] = creator.get("profilePhotoUrl", "")
-        if business:
-            req["businessName"] = business.get("brandName", "")
-            req["businessPhoto"] = business.get("profilePhotoUrl", "")
+    business = await db.business_profiles.find_one({"userId": current_user["id"]}, {"_id": 0})
+    if not business:
+        raise HTTPException(status_code=404, detail="Please complete your business profile first")
+    
+    failed = []
+    creator_ids = []
+    for creator_id in req_data.creatorIds:
+        if creator_id in creator_ids:
+            failed.append(BulkRequestFailure(creatorId=creator_id, reason="Duplicate creator id"))
+        else:
+            creator_ids.append(creator_id)
+    
+    creators = await db.creator_profiles.find(
+        {"id": {"$in": creator_ids}},
+        {"_id": 0, "id": 1, "userId": 1, "name": 1, "profilePhotoUrl": 1}
+    ).to_list(len(creator_ids))
+    creators_by_id = {c["id"]: c for c in creators}
+    
+    now = storage.now()
+    request_docs = []
+    for creator_id in creator_ids:
+        if creator_id not in creators_by_id:
+            failed.append(BulkRequestFailure(creatorId=creator_id, reason="Creator not found"))
+            continue
+        request_docs.append({
+            "id": storage.new_id(),
+            "creatorId": creator_id,
+            "businessId": current_user["id"],
+            "title": req_data.title,
+            "brief": req_data.brief,
+            "offerAmount": req_data.offerAmount or 0,
+            "deliverables": req_data.deliverables or "",
+            "status": "pending",
+            "timeline": req_data.timeline or "",
+            "createdAt": now,
+            "updatedAt": now
+        })
+    
+    inserted = request_docs
+    if request_docs:
+        try:
+            await db.collaboration_requests.insert_many(request_docs, ordered=False)
+        except BulkWriteError as e:
+            failed_indexes = {err["index"] for err in e.details.get("writeErrors", [])}
+            for index in sorted(failed_indexes):
+                failed.append(BulkRequestFailure(creatorId=request_docs[index]["creatorId"], reason="Could not create request"))
+            inserted = [doc for i, doc in enumerate(request_docs) if i not in failed_indexes]
+        invalidate_request_counts(*request_docs)
+        await notifier.record(*[
+            notification_event(
+                creators_by_id[doc["creatorId"]]["userId"], "request.created", doc["id"],
+                f"{business.get('brandName', '')} sent you a collaboration request: {req_data.title}"
+            )
+            for doc in inserted
+        ])
     
+    created = []
+    for doc in inserted:
+        doc.pop("_id", None)
+        creator = creators_by_id[doc["creatorId"]]
+        created.append(CollaborationRequestResponse(
+            **doc,
+            creatorName=creator.get("name", ""),
+            businessName=business.get("brandName", ""),
+            creatorPhoto=creator.get("profilePhotoUrl", ""),
+            businessPhoto=business.get("profilePhotoUrl", "")
+        ))
+    
+    return BulkCollaborationRequestResponse(created=created, failed=failed)
+
+@request_router.patch("/bulk/status", response_model=BulkStatusUpdateResponse)
+async def bulk_update_request_status(update: BulkStatusUpdate, current_user: dict = Depends(get_current_user)):
+    if update.status not in BULK_STATUS_TRANSITIONS:
+        raise HTTPException(status_code=400, detail="Status must be 'accepted', 'declined' or 'archived'")
+    if not update.requestIds:
+        raise HTTPException(status_code=400, detail="requestIds must not be empty")
+    if len(update.requestIds) > BULK_STATUS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_STATUS_MAX} requests per bulk update")
+    
+    # Only the creator can update request status; verify ownership once
+    profile = await db.creator_profiles.find_one({"userId": current_user["id"]}, {"_id": 0, "id": 1, "name": 1})
+    if not profile:
+        raise HTTPException(status_code=403, detail="Only the creator can update request status")
+    
+    request_ids = list(dict.fromkeys(update.requestIds))
+    allowed_from = BULK_STATUS_TRANSITIONS[update.status]
+    owned = await db.collaboration_requests.find(
+        {"id": {"$in": request_ids}, "creatorId": profile["id"]},
+        {"_id": 0, "id": 1, "status": 1, "businessId": 1, "title": 1}
+    ).to_list(len(request_ids))
+    current_status = {r["id"]: r["status"] for r in owned}
+    
+    failed = []
+    eligible = []
+    for request_id in request_ids:
+        if request_id not in current_status:
+            failed.append(BulkStatusFailure(requestId=request_id, reason="Request not found"))
+        elif current_status[request_id] not in allowed_from:
+            failed.append(BulkStatusFailure(
+                requestId=request_id,
+                reason=f"Cannot change status from '{current_status[request_id]}' to '{update.status}'"
+            ))
+        else:
+            eligible.append(request_id)
+    
+    updated = []
+    if eligible:
+        # The status guard is repeated in the filter so concurrent updates can't skip a transition
+        guard = {"id": {"$in": eligible}, "creatorId": profile["id"], "status": {"$in": allowed_from}}
+        if update.status == "archived":
+            updated = await archive_requests(guard)
+        else:
+            updated_at = storage.now()
+            await db.collaboration_requests.update_many(
+                guard,
+                {"$set": {"status": update.status, "updatedAt": updated_at}}
+            )
+            # Only the requests this write changed carry its timestamp
+            updated = [
+                r["id"] for r in await db.collaboration_requests.find(
+                    {"id": {"$in": eligible}, "status": update.status, "updatedAt": updated_at}, {"_id": 0, "id": 1}
+                ).to_list(len(eligible))
+            ]
+        request_counts.delete(request_count_key("creatorId", profile["id"]))
+        for business_id in {r["businessId"] for r in owned if r["id"] in eligible}:
+            request_counts.delete(request_count_key("businessId", business_id))
+        participants_cache.delete(*eligible)
+    
+    updated_ids = set(updated)
+    for request_id in eligible:
+        if request_id not in updated_ids:
+            failed.append(BulkStatusFailure(requestId=request_id, reason="Request changed during the update"))
+    
+    # Same notification as a single status change; archiving is the creator's own housekeeping
+    if update.status != "archived":
+        await notifier.record(*[
+            notification_event(
+                r["businessId"], "request.status", r["id"],
+                f"{profile.get('name', '')} {update.status} your collaboration request: {r['title']}"
+            )
+            for r in owned if r["id"] in updated_ids
+        ])
+    
+    return BulkStatusUpdateResponse(updated=[r for r in request_ids if r in updated_ids], failed=failed)
+
+@request_router.get("/sent", response_model=List[CollaborationRequestResponse])
+async def get_sent_requests(
+    response: Response,
+    status: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    requests = await list_requests_page("businessId", current_user["id"], status, limit, cursor, response)
+    await enrich_requests(requests)
     return [CollaborationRequestResponse(**req) for req in requests]
 
 @request_router.get("/{request_id}", response_model=CollaborationRequestResponse)
@@ -594,60 +1549,100 @@ async def update_request_status(request_id: str, status: str = Query(...), curre
     
     await db.collaboration_requests.update_one(
         {"id": request_id},
-        {"$set": {"status": status, "updatedAt": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": status, "updatedAt": storage.now()}}
     )
+    invalidate_request_counts(req)
+    participants_cache.delete(request_id)
+    await notifier.record(notification_event(
+        req["businessId"], "request.status", request_id,
+        f"{creator.get('name', '')} {status} your collaboration request: {req['title']}"
+    ))
     
     return {"message": f"Request {status} successfully"}
 
 # ============== MESSAGE ROUTES ==============
 
-@message_router.get("/{request_id}", response_model=List[MessageResponse])
-async def get_messages(request_id: str, current_user: dict = Depends(get_current_user)):
-    req = await db.collaboration_requests.find_one({"id": request_id}, {"_id": 0})
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
+async def request_participants(request_id: str, current_user: dict) -> dict:
+    # Every chat read and write checks access, so who is on a request is cached
+    participants = participants_cache.get(request_id)
+    if participants is None:
+        req = await db.collaboration_requests.find_one({"id": request_id}, {"_id": 0, "creatorId": 1, "businessId": 1})
+        if not req:
+            raise HTTPException(status_code=404, detail="Request not found")
+        creator = await db.creator_profiles.find_one({"id": req["creatorId"]}, {"_id": 0, "userId": 1, "name": 1})
+        participants = {
+            "creatorId": req["creatorId"],
+            "businessId": req["businessId"],
+            "creatorUserId": creator["userId"] if creator else None,
+            "creatorName": creator.get("name", "") if creator else "",
+        }
+        participants_cache.set(request_id, participants)
     
-    # Check access
-    creator = await db.creator_profiles.find_one({"id": req["creatorId"]}, {"_id": 0})
-    if req["businessId"] != current_user["id"] and (not creator or creator["userId"] != current_user["id"]):
+    if current_user["id"] not in (participants["businessId"], participants["creatorUserId"]):
         raise HTTPException(status_code=403, detail="Access denied")
+    return participants
+
+
+@message_router.get("/{request_id}", response_model=List[MessageResponse])
+async def get_messages(request_id: str, current_user: dict = Depends(get_current_user)):
+    await request_participants(request_id, current_user)
     
-    messages = await db.messages.find({"requestId": request_id}, {"_id": 0}).sort("createdAt", 1).to_list(500)
+    messages = await message_store.latest(request_id, MESSAGE_PAGE_SIZE)
     return [MessageResponse(**msg) for msg in messages]
 
 @message_router.post("/{request_id}", response_model=MessageResponse)
 async def send_message(request_id: str, msg_data: MessageCreate, current_user: dict = Depends(get_current_user)):
-    req = await db.collaboration_requests.find_one({"id": request_id}, {"_id": 0})
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
-    
-    # Check access
-    creator = await db.creator_profiles.find_one({"id": req["creatorId"]}, {"_id": 0})
-    if req["businessId"] != current_user["id"] and (not creator or creator["userId"] != current_user["id"]):
-        raise HTTPException(status_code=403, detail="Access denied")
+    participants = await request_participants(request_id, current_user)
     
     # Get sender name
     sender_name = current_user["email"]
-    if current_user["role"] == "creator" and creator:
-        sender_name = creator.get("name", current_user["email"])
+    if current_user["role"] == "creator" and participants["creatorUserId"]:
+        sender_name = participants["creatorName"] or current_user["email"]
     elif current_user["role"] == "business":
         business = await db.business_profiles.find_one({"userId": current_user["id"]}, {"_id": 0})
         if business:
             sender_name = business.get("brandName", current_user["email"])
     
     message_doc = {
-        "id": str(uuid.uuid4()),
+        "id": storage.new_id(),
         "requestId": request_id,
         "senderUserId": current_user["id"],
         "senderName": sender_name,
         "text": msg_data.text,
-        "createdAt": datetime.now(timezone.utc).isoformat()
+        "createdAt": storage.now()
     }
     
-    await db.messages.insert_one(message_doc)
+    await message_store.append(message_doc)
+    # Whoever writes has read everything before it
+    read_receipts.mark(request_id, current_user["id"], message_doc["createdAt"])
+    
+    # No email for someone who has the chat open right now
+    recipient = participants["creatorUserId"] if current_user["id"] == participants["businessId"] else participants["businessId"]
+    if recipient and recipient not in (await presence.members(request_id))["online"]:
+        await notifier.record(notification_event(
+            recipient, "message", request_id, f"New message from {sender_name}: {msg_data.text[:140]}"
+        ))
     
     return MessageResponse(**message_doc)
 
+@message_router.post("/{request_id}/presence", response_model=PresenceResponse)
+async def update_presence(request_id: str, update: PresenceUpdate, current_user: dict = Depends(get_current_user)):
+    # Heartbeat from an open chat: no database access beyond the cached auth checks
+    await request_participants(request_id, current_user)
+    await presence.beat(request_id, current_user["id"], typing=update.typing)
+    if update.lastReadAt:
+        try:
+            last_read = as_datetime(update.lastReadAt)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid lastReadAt")
+        # Markers only move forward, so a future mark would hide receipts for
+        # every later message; normalised so markers compare correctly
+        last_read = storage.timestamp(min(last_read, datetime.now(timezone.utc)))
+        read_receipts.mark(request_id, current_user["id"], last_read)
+    
+    members = await presence.members(request_id)
+    return PresenceResponse(**members, lastRead=await read_receipts.markers(request_id))
+
 # ============== SEED DATA ==============
 
 @api_router.post("/seed")
@@ -658,8 +1653,13 @@ async def seed_data():
     await db.business_profiles.delete_many({})
     await db.collaboration_requests.delete_many({})
     await db.messages.delete_many({})
+    await db.message_buckets.delete_many({})
+    # Stored media survives a reseed; unreferenced assets get collected later
+    await media_assets.reset_refs()
+    for cache in (request_counts, user_cache, profile_cache, participants_cache):
+        cache.clear()
     
-    now = datetime.now(timezone.utc).isoformat()
+    now = storage.now()
     
     # Create sample creators
     creators_data = [
@@ -727,8 +1727,8 @@ async def seed_data():
     
     creator_profiles = []
     for i, creator in enumerate(creators_data):
-        user_id = str(uuid.uuid4())
-        profile_id = str(uuid.uuid4())
+        user_id = storage.new_id()
+        profile_id = storage.new_id()
         
         # Create user
         user_doc = {
@@ -779,8 +1779,8 @@ async def seed_data():
     
     business_profiles = []
     for i, business in enumerate(businesses_data):
-        user_id = str(uuid.uuid4())
-        profile_id = str(uuid.uuid4())
+        user_id = storage.new_id()
+        profile_id = storage.new_id()
         
         user_doc = {
             "id": user_id,
@@ -805,7 +1805,7 @@ async def seed_data():
     
     # Create sample collaboration request
     request_doc = {
-        "id": str(uuid.uuid4()),
+        "id": storage.new_id(),
         "creatorId": creator_profiles[0]["id"],
         "businessId": business_profiles[0]["userId"],
         "title": "Summer Collection Campaign",
@@ -831,22 +1831,136 @@ async def root():
 async def health():
     return {"status": "healthy", "service": "orange-marketplace"}
 
+@ops_router.get("/jobs", dependencies=[Depends(require_ops_key)])
+async def job_metrics():
+    return await job_runner.stats()
+
+@ops_router.post("/archive-requests", dependencies=[Depends(require_ops_key)])
+async def schedule_request_archiving(olderThanDays: int = Query(30, ge=1)):
+    job = await outbox.enqueue("requests.archive_stale", {"olderThanDays": olderThanDays})
+    job_runner.notify()
+    return {"jobId": job["id"]}
+
+@ops_router.post("/media-gc", dependencies=[Depends(require_ops_key)])
+async def schedule_media_gc(graceHours: float = Query(settings.media_gc_grace_hours, ge=1)):
+    job = await outbox.enqueue("media.collect_garbage", {"graceHours": graceHours})
+    job_runner.notify()
+    return {"jobId": job["id"]}
+
+@ops_router.get("/notifications", dependencies=[Depends(require_ops_key)])
+async def notification_metrics():
+    return await notifier.stats()
+
+def profile_response(format: str, route: Optional[str]) -> Response:
+    if format == "folded":
+        return Response(
+            profiler.folded(route),
+            media_type="text/plain",
+            headers={"Content-Disposition": 'attachment; filename="profile.folded"'}
+        )
+    if format == "speedscope":
+        return Response(
+            json.dumps(profiler.speedscope(route)),
+            media_type="application/json",
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'}
+        )
+    return Response(json.dumps(profiler.summary()), media_type="application/json")
+
+@ops_router.get("/profile", dependencies=[Depends(require_ops_key)])
+async def get_profile(
+    format: str = Query("summary", pattern="^(summary|folded|speedscope)$"),
+    route: Optional[str] = Query(None, description='e.g. "POST /api/auth/login"')
+):
+    # Whatever this worker has collected so far (continuous sampling or past windows)
+    return profile_response(format, route)
+
+@ops_router.post("/profile", dependencies=[Depends(require_ops_key)])
+async def run_profile(
+    seconds: float = Query(10, gt=0, le=300),
+    rate: float = Query(1.0, gt=0, le=1),
+    intervalMs: float = Query(settings.profile_interval_ms, ge=1, le=100),
+    format: str = Query("speedscope", pattern="^(summary|folded|speedscope)$"),
+    route: Optional[str] = None
+):
+    # Profile a fraction of this worker's requests for a while, then return what was collected
+    profiler.reset()
+    profiler.start_window(seconds, rate=rate, interval=intervalMs / 1000)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop_window()
+    return profile_response(format, route)
+
+@ops_router.delete("/profile", dependencies=[Depends(require_ops_key)])
+async def reset_profile():
+    profiler.reset()
+    return {"message": "Profile reset"}
+
+@ops_router.get("/storage", dependencies=[Depends(require_ops_key)])
+async def storage_metrics():
+    return {"backend": settings.media_storage, **media_storage.stats()}
+
+@ops_router.get("/db-pool", dependencies=[Depends(require_ops_key)])
+async def db_pool_metrics():
+    return mongo.pool_metrics.snapshot()
+
+@ops_router.get("/caches", dependencies=[Depends(require_ops_key)])
+async def cache_metrics():
+    return {
+        "invalidation": invalidation_listener.stats(),
+        "users": user_cache.stats(),
+        "profiles": profile_cache.stats(),
+        "participants": participants_cache.stats(),
+        "requestCounts": request_counts.stats(),
+        "revocations": denylist.stats(),
+        "idempotency": idempotency_store.stats(),
+        "presence": presence.stats(),
+        "readReceipts": read_receipts.stats(),
+    }
+
 # Include all routers
 api_router.include_router(auth_router)
 api_router.include_router(creator_router)
 api_router.include_router(business_router)
 api_router.include_router(request_router)
 api_router.include_router(message_router)
+api_router.include_router(ops_router)
 app.include_router(api_router)
 
+if settings.media_storage in ("local", "stub"):
+    app.mount("/api/media", StaticFiles(directory=settings.media_local_dir, check_dir=False), name="media")
+
+# Inside rate limiting, so retries still spend the caller's budget
+app.add_middleware(
+    IdempotencyMiddleware,
+    store=idempotency_store,
+    routes=IDEMPOTENT_ROUTES,
+    resolve_user=rate_limit_user_id,
+)
+
+# Added before CORS so throttled responses still carry CORS headers
+app.add_middleware(
+    RateLimitMiddleware,
+    limits=RATE_LIMITS,
+    backend=RedisBackend(settings.rate_limit_redis_url) if settings.rate_limit_redis_url else InMemoryBackend(),
+    resolve_user=rate_limit_user_id,
+    trust_forwarded_for=settings.trust_forwarded_for,
+    proxy_hops=settings.forwarded_proxy_hops,
+    enabled=settings.rate_limit_enabled,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=settings.cors_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Retry-After", "Idempotent-Replayed"],
 )
 
+# Outermost, so profiles include time spent in the other middleware
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -854,6 +1968,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def ensure_indexes():
+    await db.collaboration_requests.create_index("id", unique=True)
+    # Keyset pages sort on (createdAt, id); both must be in the index to avoid an in-memory sort
+    for owner_field in ("creatorId", "businessId"):
+        await db.collaboration_requests.create_index([(owner_field, 1), ("status", 1), ("createdAt", -1), ("id", -1)])
+        # Superseded by the index above, which serves the same prefix queries
+        superseded = f"{owner_field}_1_status_1_createdAt_-1"
+        if superseded in await db.collaboration_requests.index_information():
+            await db.collaboration_requests.drop_index(superseded)
+    await db.collaboration_requests_archive.create_index("id")
+    await db.collaboration_requests_archive.create_index("creatorId")
+    await db.messages_archive.create_index("requestId")
+    await db.message_buckets_archive.create_index("requestId")
+    await message_store.ensure_indexes()
+    await media_assets.ensure_indexes()
+    await refresh_tokens.ensure_indexes()
+    await denylist.ensure_indexes()
+    await idempotency_store.ensure_indexes()
+    await read_receipts.ensure_indexes()
+    await notifier.ensure_indexes()
+
+
@@ -0,0 +1,226 @@
+"""Refresh tokens and access-token revocation.
+
+Access tokens are short-lived JWTs carrying a session id (``sid``). A session
+is extended with opaque refresh tokens, which are stored hashed in
+``refresh_tokens`` and rotated on every use; presenting a rotated token
+again outside a short grace window is treated as theft and ends the
+session.
+
+Revoking a session (logout) or all of a user's sessions writes to
+``revocations``. Every worker mirrors the live entries in a ``Denylist``:
+a hash set of session ids plus a per-user "not before" time, kept current by
+the cache invalidation listener. Checking a token is then two dictionary
+lookups. Without a listener (invalidation "off") the mirror is reloaded on
+a timer instead. Entries only have to outlive the access tokens they revoke,
+so they expire (TTL index) after one access-token lifetime; the mirror drops
+them at the same time and stays small.
+"""
+import asyncio
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+REFRESH_COLLECTION = "refresh_tokens"
+REVOCATIONS_COLLECTION = "revocations"
+# Tabs refreshing at the same moment all present the same token
+REUSE_GRACE = timedelta(seconds=10)
+# How often the denylist mirror sweeps out expired entries
+PRUNE_INTERVAL_SECONDS = 60
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RefreshTokenReused(Exception):
+    """A rotated refresh token was presented again; the caller should end its session."""
+
+    def __init__(self, session_id: str, user_id: str):
+        super().__init__(f"refresh token reused in session {session_id}")
+        self.session_id = session_id
+        self.user_id = user_id
+
+
+class Denylist:
+    def __init__(self, db, token_ttl: timedelta, clock: Callable):
+        self.db = db
+        self.token_ttl = token_ttl
+        self.clock = clock  # timestamps in the configured storage format
+        # Values carry the entry's expiry (epoch seconds)
+        self._sessions: dict = {}  # sessionId -> expires
+        self._users: dict = {}  # userId -> (tokens issued before this epoch time are revoked, expires)
+        self._pruned_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.loads = 0
+
+    async def ensure_indexes(self):
+        await self.db[REVOCATIONS_COLLECTION].create_index("id", unique=True)
+        await self.db[REVOCATIONS_COLLECTION].create_index("expiresAt", expireAfterSeconds=0)
+
+    async def load(self):
+        """Replace the mirror with every live entry."""
+        now = datetime.now(timezone.utc)
+        sessions, users = {}, {}
+        async for doc in self.db[REVOCATIONS_COLLECTION].find({"expiresAt": {"$gt": now}}, {"_id": 0}):
+            self._add(doc, sessions, users)
+        self._sessions, self._users = sessions, users
+        self._pruned_at = now.timestamp()
+        self.loads += 1
+
+    def start(self, reload_interval: float):
+        """Reload the mirror every ``reload_interval`` seconds, for workers without a listener."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(reload_interval), name="denylist-reload")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, reload_interval: float):
+        while True:
+            await asyncio.sleep(reload_interval)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Denylist reload failed; retrying in %.0fs", reload_interval)
+
+    def _expires(self, doc: dict) -> float:
+        expires_at = doc.get("expiresAt")
+        if expires_at is None:
+            # Change events that predate the field; the entry lives one token lifetime
+            return datetime.now(timezone.utc).timestamp() + self.token_ttl.total_seconds()
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at.timestamp()
+
+    def _add(self, doc: dict, sessions: dict, users: dict):
+        kind, _, key = doc["id"].partition(":")
+        expires = self._expires(doc)
+        if kind == "session":
+            sessions[key] = max(sessions.get(key, 0), expires)
+        elif kind == "user":
+            not_before, previous_expires = users.get(key, (0, 0))
+            users[key] = (max(not_before, doc["notBefore"]), max(previous_expires, expires))
+        self._prune()
+
+    def _prune(self, force: bool = False):
+        """Drop entries whose revoked tokens have all expired."""
+        now = datetime.now(timezone.utc).timestamp()
+        if not force and now - self._pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        for sid in [sid for sid, expires in self._sessions.items() if expires <= now]:
+            del self._sessions[sid]
+        for uid in [uid for uid, (_, expires) in self._users.items() if expires <= now]:
+            del self._users[uid]
+
+    def apply(self, doc: Optional[dict]):
+        """Invalidation handler: add one entry, or reload everything when history is unknown."""
+        if doc is None:
+            asyncio.get_running_loop().create_task(self.load())
+        else:
+            self._add(doc, self._sessions, self._users)
+
+    def is_revoked(self, session_id: Optional[str], user_id: str, issued_at: float) -> bool:
+        if session_id is not None and session_id in self._sessions:
+            return True
+        entry = self._users.get(user_id)
+        return entry is not None and issued_at < entry[0]
+
+    async def _write(self, doc: dict):
+        doc = {
+            **doc,
+            "updatedAt": self.clock(),
+            "expiresAt": datetime.now(timezone.utc) + self.token_ttl,
+        }
+        await self.db[REVOCATIONS_COLLECTION].update_one({"id": doc["id"]}, {"$set": doc}, upsert=True)
+        # Other workers learn about it through the listener; this one right away
+        self._add(doc, self._sessions, self._users)
+
+    async def revoke_session(self, session_id: str, user_id: str):
+        await self._write({"id": f"session:{session_id}", "userId": user_id})
+
+    async def revoke_user(self, user_id: str):
+        # Access tokens carry a fractional ``iat``, so a login right after this isn't caught
+        not_before = datetime.now(timezone.utc).timestamp()
+        await self._write({"id": f"user:{user_id}", "userId": user_id, "notBefore": not_before})
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "users": len(self._users), "loads": self.loads}
+
+
+class RefreshTokens:
+    def __init__(self, db, ttl: timedelta):
+        self.db = db
+        self.ttl = ttl
+
+    @property
+    def collection(self):
+        return self.db[REFRESH_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        await self.collection.create_index("sessionId")
+        await self.collection.create_index("userId")
+        await self.collection.create_index("expiresAt", expireAfterSeconds=0)
+
+    async def issue(self, user_id: str, session_id: str, expires_at: Optional[datetime] = None) -> str:
+        token = secrets.token_urlsafe(32)
+        await self.collection.insert_one({
+            "id": hash_token(token),
+            "userId": user_id,
+            "sessionId": session_id,
+            "usedAt": None,
+            "createdAt": datetime.now(timezone.utc),
+            # Rotation doesn't extend the session past its original lifetime
+            "expiresAt": expires_at or datetime.now(timezone.utc) + self.ttl,
+        })
+        return token
+
+    async def rotate(self, token: str) -> Optional[dict]:
+        """Spend ``token`` and issue its successor.
+
+        Returns ``{"userId", "sessionId", "token"}``, ``None`` for unknown or
+        expired tokens, and raises ``RefreshTokenReused`` on replay.
+        """
+        now = datetime.now(timezone.utc)
+        token_hash = hash_token(token)
+        spent = await self.collection.find_one_and_update(
+            {"id": token_hash, "usedAt": None, "expiresAt": {"$gt": now}},
+            {"$set": {"usedAt": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if spent is None:
+            spent = await self.collection.find_one({"id": token_hash, "expiresAt": {"$gt": now}})
+            if spent is None:
+                return None
+            used_at = spent["usedAt"]
+            if used_at.tzinfo is None:
+                used_at = used_at.replace(tzinfo=timezone.utc)
+            if now - used_at > REUSE_GRACE:
+                raise RefreshTokenReused(spent["sessionId"], spent["userId"])
+        expires_at = spent["expiresAt"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        successor = await self.issue(spent["userId"], spent["sessionId"], expires_at)
+        return {"userId": spent["userId"], "sessionId": spent["sessionId"], "token": successor}
+
+    async def find_session(self, token: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": hash_token(token)}, {"_id": 0, "userId": 1, "sessionId": 1})
+
+    async def revoke_session(self, session_id: str):
+        await self.collection.delete_many({"sessionId": session_id})
+
+    async def revoke_user(self, user_id: str):
+        await self.collection.delete_many({"userId": user_id})
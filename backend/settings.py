@@ -0,0 +1,218 @@
+"""Typed application settings, parsed from the environment once per process."""
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+ROOT_DIR = Path(__file__).parent
+
+
+def _bool(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.environ.get(name, default).split(",") if item.strip()]
+
+
+@dataclass(frozen=True)
+class Settings:
+    # MongoDB
+    mongo_url: str = ""
+    db_name: str = ""
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_wait_queue_timeout_ms: int = 5000
+    mongo_max_idle_time_ms: int = 300000
+    mongo_connect_timeout_ms: int = 10000
+    mongo_server_selection_timeout_ms: int = 10000
+    mongo_compressors: str = ""  # e.g. "zstd,zlib"
+
+    # Auth
+    jwt_secret: str = "orange-marketplace-secret-key-2024"
+    access_token_ttl_minutes: float = 15
+    refresh_token_ttl_days: float = 30
+
+    # HTTP
+    cors_origins: List[str] = field(default_factory=lambda: ["*"])
+    trust_forwarded_for: bool = False
+    forwarded_proxy_hops: int = 1  # trusted proxies appending to X-Forwarded-For
+
+    # Cloudinary
+    cloudinary_cloud_name: str = ""
+    cloudinary_api_key: str = ""
+    cloudinary_api_secret: str = ""
+
+    # Background jobs
+    job_runner_mode: str = "inprocess"  # "inprocess" or "external"
+    job_workers: int = 4
+    job_lease_seconds: float = 60
+    job_max_attempts: int = 5
+
+    # Ops endpoints are disabled unless a key is set
+    ops_api_key: str = ""
+
+    # Rate limiting
+    rate_limit_enabled: bool = True
+    rate_limit_redis_url: str = ""  # share buckets across workers
+
+    # Chat presence (heartbeats) and batched read receipts
+    presence_ttl_seconds: float = 15
+    typing_ttl_seconds: float = 5
+    presence_redis_url: str = ""  # share presence across workers
+    read_receipt_flush_seconds: float = 5
+
+    # Notification digests: "log", "smtp" or "off"
+    notification_transport: str = "log"
+    notification_sender: str = "Orange <notifications@orange.local>"
+    notification_window_minutes: float = 15
+    notification_batch_size: int = 100
+    notification_high_water: int = 1000  # due digests before windows stretch
+    app_url: str = ""  # frontend base URL for links in digests
+    smtp_host: str = "localhost"
+    smtp_port: int = 25
+    smtp_username: str = ""
+    smtp_password: str = ""
+    smtp_starttls: bool = False
+
+    # Sampling profiler (ops endpoints can also profile a time window)
+    profile_sample_rate: float = 0.0  # fraction of requests profiled continuously
+    profile_interval_ms: float = 5
+
+    # Idempotency-Key support for retried writes
+    idempotency_ttl_hours: float = 24
+    idempotency_lease_seconds: float = 120  # a crashed request frees its key after this
+
+    # Collaboration requests
+    bulk_request_max: int = 50
+    bulk_status_max: int = 200
+    request_count_ttl_seconds: float = 30
+
+    # Profile multi-get
+    profile_batch_max: int = 100
+
+    # Ids and timestamps: "legacy" (uuid4 + ISO strings) or "native" (UUIDv7 + BSON dates)
+    storage_format: str = "legacy"
+
+    # Chat message storage: "documents", "dual" (while migrating) or "buckets"
+    message_storage: str = "documents"
+    message_bucket_size: int = 200
+    message_bucket_span_hours: float = 24
+
+    # Per-worker caches and how other workers' writes evict them:
+    # "auto" (change streams on replica sets, else polling), "changestream",
+    # "poll" or "off" (caches then rely on their TTL alone)
+    cache_ttl_seconds: float = 60
+    cache_invalidation_mode: str = "auto"
+    cache_poll_interval_seconds: float = 2
+    # With invalidation "off", how often each worker reloads the revocation denylist
+    revocation_reload_seconds: float = 10
+
+    # Uploaded media: "cloudinary", "local" files served under /api/media, or
+    # "stub" (local files behind injected faults, for tests and drills)
+    media_storage: str = "cloudinary"
+    media_local_dir: str = str(ROOT_DIR / "media")
+    media_base_url: str = "/api/media"
+    # Thumbnails: "cloudinary" URL transformations, or "local" responsive
+    # variants rendered in a process pool (always local with local storage)
+    thumbnail_mode: str = "cloudinary"
+    thumbnail_workers: int = 2
+    # Guard around storage calls: per-attempt timeout, concurrent calls,
+    # retries, and the failure rate that opens the circuit breaker
+    storage_timeout_seconds: float = 60
+    storage_max_concurrency: int = 8
+    storage_retries: int = 2
+    storage_breaker_failure_rate: float = 0.5
+    storage_breaker_min_calls: int = 10
+    storage_breaker_open_seconds: float = 30
+    media_stub_failure_rate: float = 0.0
+    media_stub_latency_ms: float = 0.0
+    # Uploaded media nobody references is deleted after this long
+    media_gc_grace_hours: float = 24
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            mongo_url=os.environ.get("MONGO_URL", ""),
+            db_name=os.environ.get("DB_NAME", ""),
+            mongo_max_pool_size=int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+            mongo_min_pool_size=int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+            mongo_wait_queue_timeout_ms=int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+            mongo_max_idle_time_ms=int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "300000")),
+            mongo_connect_timeout_ms=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+            mongo_server_selection_timeout_ms=int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")),
+            mongo_compressors=os.environ.get("MONGO_COMPRESSORS", ""),
+            jwt_secret=os.environ.get("JWT_SECRET", cls.jwt_secret),
+            access_token_ttl_minutes=float(os.environ.get("ACCESS_TOKEN_TTL_MINUTES", "15")),
+            refresh_token_ttl_days=float(os.environ.get("REFRESH_TOKEN_TTL_DAYS", "30")),
+            cors_origins=_list("CORS_ORIGINS", "*"),
+            trust_forwarded_for=_bool("TRUST_FORWARDED_FOR", False),
+            forwarded_proxy_hops=int(os.environ.get("FORWARDED_PROXY_HOPS", "1")),
+            cloudinary_cloud_name=os.environ.get("CLOUDINARY_CLOUD_NAME", ""),
+            cloudinary_api_key=os.environ.get("CLOUDINARY_API_KEY", ""),
+            cloudinary_api_secret=os.environ.get("CLOUDINARY_API_SECRET", ""),
+            job_runner_mode=os.environ.get("JOB_RUNNER_MODE", "inprocess"),
+            job_workers=int(os.environ.get("JOB_WORKERS", "4")),
+            job_lease_seconds=float(os.environ.get("JOB_LEASE_SECONDS", "60")),
+            job_max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", "5")),
+            ops_api_key=os.environ.get("OPS_API_KEY", ""),
+            rate_limit_enabled=_bool("RATE_LIMIT_ENABLED", True),
+            rate_limit_redis_url=os.environ.get("RATE_LIMIT_REDIS_URL", ""),
+            presence_ttl_seconds=float(os.environ.get("PRESENCE_TTL_SECONDS", "15")),
+            typing_ttl_seconds=float(os.environ.get("TYPING_TTL_SECONDS", "5")),
+            presence_redis_url=os.environ.get("PRESENCE_REDIS_URL", ""),
+            read_receipt_flush_seconds=float(os.environ.get("READ_RECEIPT_FLUSH_SECONDS", "5")),
+            notification_transport=os.environ.get("NOTIFICATION_TRANSPORT", "log"),
+            notification_sender=os.environ.get("NOTIFICATION_SENDER", cls.notification_sender),
+            notification_window_minutes=float(os.environ.get("NOTIFICATION_WINDOW_MINUTES", "15")),
+            notification_batch_size=int(os.environ.get("NOTIFICATION_BATCH_SIZE", "100")),
+            notification_high_water=int(os.environ.get("NOTIFICATION_HIGH_WATER", "1000")),
+            app_url=os.environ.get("APP_URL", ""),
+            smtp_host=os.environ.get("SMTP_HOST", "localhost"),
+            smtp_port=int(os.environ.get("SMTP_PORT", "25")),
+            smtp_username=os.environ.get("SMTP_USERNAME", ""),
+            smtp_password=os.environ.get("SMTP_PASSWORD", ""),
+            smtp_starttls=_bool("SMTP_STARTTLS", False),
+            profile_sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+            profile_interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS", "5")),
+            idempotency_ttl_hours=float(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24")),
+            idempotency_lease_seconds=float(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "120")),
+            bulk_request_max=int(os.environ.get("BULK_REQUEST_MAX", "50")),
+            bulk_status_max=int(os.environ.get("BULK_STATUS_MAX", "200")),
+            request_count_ttl_seconds=float(os.environ.get("REQUEST_COUNT_TTL_SECONDS", "30")),
+            profile_batch_max=int(os.environ.get("PROFILE_BATCH_MAX", "100")),
+            storage_format=os.environ.get("STORAGE_FORMAT", "legacy"),
+            message_storage=os.environ.get("MESSAGE_STORAGE", "documents"),
+            message_bucket_size=int(os.environ.get("MESSAGE_BUCKET_SIZE", "200")),
+            message_bucket_span_hours=float(os.environ.get("MESSAGE_BUCKET_SPAN_HOURS", "24")),
+            cache_ttl_seconds=float(os.environ.get("CACHE_TTL_SECONDS", "60")),
+            cache_invalidation_mode=os.environ.get("CACHE_INVALIDATION_MODE", "auto"),
+            cache_poll_interval_seconds=float(os.environ.get("CACHE_POLL_INTERVAL_SECONDS", "2")),
+            revocation_reload_seconds=float(os.environ.get("REVOCATION_RELOAD_SECONDS", "10")),
+            media_storage=os.environ.get("MEDIA_STORAGE", "cloudinary"),
+            media_local_dir=os.environ.get("MEDIA_LOCAL_DIR", cls.media_local_dir),
+            media_base_url=os.environ.get("MEDIA_BASE_URL", "/api/media"),
+            thumbnail_mode=os.environ.get("THUMBNAIL_MODE", "cloudinary"),
+            thumbnail_workers=int(os.environ.get("THUMBNAIL_WORKERS", "2")),
+            storage_timeout_seconds=float(os.environ.get("STORAGE_TIMEOUT_SECONDS", "60")),
+            storage_max_concurrency=int(os.environ.get("STORAGE_MAX_CONCURRENCY", "8")),
+            storage_retries=int(os.environ.get("STORAGE_RETRIES", "2")),
+            storage_breaker_failure_rate=float(os.environ.get("STORAGE_BREAKER_FAILURE_RATE", "0.5")),
+            storage_breaker_min_calls=int(os.environ.get("STORAGE_BREAKER_MIN_CALLS", "10")),
+            storage_breaker_open_seconds=float(os.environ.get("STORAGE_BREAKER_OPEN_SECONDS", "30")),
+            media_stub_failure_rate=float(os.environ.get("MEDIA_STUB_FAILURE_RATE", "0")),
+            media_stub_latency_ms=float(os.environ.get("MEDIA_STUB_LATENCY_MS", "0")),
+            media_gc_grace_hours=float(os.environ.get("MEDIA_GC_GRACE_HOURS", "24")),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load ``backend/.env`` (if present) and parse the environment once."""
+    env_file = ROOT_DIR / ".env"
+    if env_file.exists():
+        from dotenv import load_dotenv
+
+        load_dotenv(env_file)
+    return Settings.from_env()
@@ -0,0 +1,145 @@
+"""How ids and timestamps are stored in MongoDB.
+
+``legacy`` keeps the original format: random uuid4 ids and ISO-8601 strings.
+``native`` stores BSON dates (8 bytes, compared natively) and generates
+time-ordered UUIDv7 ids, so new index entries land at the right-hand edge of
+the B-tree instead of at random pages. Ids keep the canonical 36-character
+UUID string form in both modes, so URLs and clients are unaffected, and API
+responses always serialize timestamps as ISO strings (``IsoDateTime``).
+
+Run ``python storage_format.py`` after switching to ``native`` to convert
+existing string timestamps; existing ids are left as they are.
+"""
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Annotated, Union
+
+from pydantic import BeforeValidator
+from pymongo import UpdateOne
+
+STORAGE_FORMATS = ("legacy", "native")
+
+# Top-level timestamp fields per collection converted by the backfill
+TIME_FIELDS = {
+    "users": ["createdAt", "updatedAt"],
+    "creator_profiles": ["createdAt", "updatedAt"],
+    "business_profiles": ["createdAt", "updatedAt"],
+    "collaboration_requests": ["createdAt", "updatedAt"],
+    "messages": ["createdAt"],
+    "read_markers": ["lastReadAt", "updatedAt"],
+}
+
+
+def uuid7() -> str:
+    """RFC 9562 UUIDv7: 48-bit millisecond timestamp followed by random bits."""
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76  # version
+    value |= (rand >> 68 & 0xFFF) << 64  # rand_a
+    value |= 0b10 << 62  # variant
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF  # rand_b
+    return str(uuid.UUID(int=value))
+
+
+def as_datetime(value: Union[str, datetime]) -> datetime:
+    """Parse either storage format into an aware UTC datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # pymongo returns naive datetimes that are UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def as_iso(value):
+    if isinstance(value, datetime):
+        return as_datetime(value).isoformat()
+    return value
+
+
+# Response models keep emitting ISO strings whichever format is stored
+IsoDateTime = Annotated[str, BeforeValidator(as_iso)]
+
+
+class StorageFormat:
+    def __init__(self, mode: str = "legacy"):
+        if mode not in STORAGE_FORMATS:
+            raise ValueError(f"Unknown storage format {mode!r}; expected one of {', '.join(STORAGE_FORMATS)}")
+        self.mode = mode
+        self.native = mode == "native"
+
+    def new_id(self) -> str:
+        return uuid7() if self.native else str(uuid.uuid4())
+
+    def timestamp(self, value: datetime):
+        return value if self.native else value.isoformat()
+
+    def now(self):
+        return self.timestamp(datetime.now(timezone.utc))
+
+    def from_iso(self, value: str):
+        """Turn an ISO string from a client (e.g. a cursor) into a query value."""
+        return as_datetime(value) if self.native else value
+
+
+async def backfill_native_dates(db, batch_size: int = 1000) -> dict:
+    """Convert string timestamps to BSON dates in place; safe to re-run."""
+    converted = {}
+    for collection, fields in TIME_FIELDS.items():
+        converted[collection] = 0
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        while True:
+            docs = await db[collection].find(query, {field: 1 for field in fields}).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            await db[collection].bulk_write([
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {field: as_datetime(doc[field]) for field in fields if isinstance(doc.get(field), str)}},
+                )
+                for doc in docs
+            ], ordered=False)
+            converted[collection] += len(docs)
+
+    # Bucketed messages embed their timestamps
+    converted["message_buckets"] = 0
+    query = {"$or": [{"firstAt": {"$type": "string"}}, {"messages.createdAt": {"$type": "string"}}]}
+    while True:
+        buckets = await db.message_buckets.find(query, {"firstAt": 1, "lastAt": 1, "messages": 1}).limit(batch_size).to_list(batch_size)
+        if not buckets:
+            break
+        await db.message_buckets.bulk_write([
+            UpdateOne(
+                {"_id": bucket["_id"]},
+                {"$set": {
+                    "firstAt": as_datetime(bucket["firstAt"]),
+                    "lastAt": as_datetime(bucket["lastAt"]),
+                    "messages": [{**m, "createdAt": as_datetime(m["createdAt"])} for m in bucket["messages"]],
+                }},
+            )
+            for bucket in buckets
+        ], ordered=False)
+        converted["message_buckets"] += len(buckets)
+    return converted
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from database import Mongo
+    from settings import get_settings
+
+    async def main():
+        settings = get_settings()
+        mongo = Mongo(settings.mongo_url, settings.db_name)
+        mongo.connect()
+        try:
+            for collection, count in (await backfill_native_dates(mongo.database())).items():
+                print(f"{collection}: {count} documents converted")
+        finally:
+            mongo.close()
+
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Responsive thumbnail variants, generated locally.
+
+Images are resized to a few widths and encoded as WebP (and AVIF when the
+installed Pillow supports it); videos get a poster frame extracted with
+ffmpeg, which is then treated like an image. The CPU-heavy work runs in a
+process pool so it never blocks the event loop.
+
+``srcset`` turns the stored variants into the map kept on ``MediaItem``:
+``{"image/webp": "<url> 160w, <url> 400w, ...", ...}``, ready for a
+``<picture><source type=... srcset=...>``.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (160, 400, 1080)
+# Width used for the single thumbnailUrl older clients read
+THUMBNAIL_WIDTH = 400
+POSTER_OFFSET_SECONDS = 2
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+
+
+def available_formats() -> List[str]:
+    from PIL import features
+
+    return [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+
+
+def render_image_variants(data: bytes, widths=VARIANT_WIDTHS) -> List[dict]:
+    """Resize one image to each width (never upscaling) in every available format."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    # Widths past the original collapse into one variant at the original width
+    targets = sorted({min(width, image.width) for width in widths})
+    variants = []
+    for width in targets:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for fmt in available_formats():
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=75 if fmt == "webp" else 60)
+            variants.append({"format": fmt, "width": width, "data": buffer.getvalue()})
+    return variants
+
+
+def extract_poster(data: bytes, offset: float = POSTER_OFFSET_SECONDS) -> bytes:
+    """First frame at ``offset`` seconds (or the very first frame) as PNG."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is not installed")
+    # Containers like MP4 may need seeking, so give ffmpeg a real file
+    with tempfile.NamedTemporaryFile(suffix=".video") as source:
+        source.write(data)
+        source.flush()
+        for seek in (offset, 0):
+            result = subprocess.run(
+                [ffmpeg, "-v", "error", "-ss", str(seek), "-i", source.name,
+                 "-frames:v", "1", "-f", "image2pipe", "-vcodec", "png", "-"],
+                capture_output=True,
+                timeout=60,
+            )
+            if result.returncode == 0 and result.stdout:
+                return result.stdout
+    raise RuntimeError(f"ffmpeg could not extract a frame: {result.stderr.decode(errors='replace')[-200:]}")
+
+
+def render_variants(data: bytes, media_type: str) -> List[dict]:
+    if media_type == "video":
+        data = extract_poster(data)
+    return render_image_variants(data)
+
+
+def srcset(variants: List[dict]) -> Dict[str, str]:
+    by_type: Dict[str, List[dict]] = {}
+    for variant in sorted(variants, key=lambda v: v["width"]):
+        by_type.setdefault(CONTENT_TYPES[variant["format"]], []).append(variant)
+    return {
+        content_type: ", ".join(f"{v['url']} {v['width']}w" for v in entries)
+        for content_type, entries in by_type.items()
+    }
+
+
+def thumbnail_variant(variants: List[dict]) -> Optional[dict]:
+    """The WebP variant closest to ``THUMBNAIL_WIDTH``, for ``thumbnailUrl``."""
+    webp = [v for v in variants if v["format"] == "webp"] or variants
+    if not webp:
+        return None
+    return min(webp, key=lambda v: abs(v["width"] - THUMBNAIL_WIDTH))
+
+
+class ThumbnailGenerator:
+    """Runs ``render_variants`` in a lazily started process pool."""
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def render(self, data: bytes, media_type: str) -> List[dict]:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and driver threads is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, render_variants, data, media_type)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,28 @@
+"""Run the outbox job runner as a standalone process.
+
+Start the API with JOB_RUNNER_MODE=external and run `python worker.py` next to
+it (as many copies as needed; jobs are claimed with leases).
+"""
+import asyncio
+import logging
+import signal
+
+from server import job_runner, db, mongo
+from jobs import ensure_outbox_indexes
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, job_runner.request_stop)
+    mongo.connect()
+    await ensure_outbox_indexes(db)
+    try:
+        await job_runner.run_forever()
+    finally:
+        mongo.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
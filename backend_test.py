@@ -204,6 +204,7 @@ class OrangeMarketplaceAPITester:
         
         # Get specific creator by ID (using seeded data)
         self.run_test("Get Creator by ID", "GET", "creators/test-creator-id", 404)  # Should fail for non-existent ID
+        self.run_test("Get Creators by IDs", "GET", "creators/batch?ids=test-creator-id", 200)  # Misses are reported, not fatal
 
     def test_collaboration_requests(self):
         """Test collaboration request endpoints"""
@@ -227,6 +228,11 @@ class OrangeMarketplaceAPITester:
             self.collaboration_request_id = response['id']
             print(f"   Collaboration request ID: {self.collaboration_request_id}")
 
+        # Send the same brief to several creators at once (unknown ids are reported, not fatal)
+        bulk_data = {key: value for key, value in request_data.items() if key != "creatorId"}
+        bulk_data["creatorIds"] = [self.creator_profile_id, "non-existent-creator-id"]
+        self.run_test("Create Bulk Collaboration Requests", "POST", "requests/bulk", 201, bulk_data, self.business_token)
+
         # Get sent requests
         self.run_test("Get Sent Requests", "GET", "requests/sent", 200, token=self.business_token)
 
@@ -268,6 +274,10 @@ class OrangeMarketplaceAPITester:
             message_data = {"text": "Great! Looking forward to working together."}
             self.run_test("Send Message (Business)", "POST", f"messages/{self.collaboration_request_id}", 200, message_data, self.business_token)
 
+        # Presence heartbeat with typing and a read marker
+        presence_data = {"typing": True}
+        self.run_test("Update Presence", "POST", f"messages/{self.collaboration_request_id}/presence", 200, presence_data, self.creator_token)
+
     def test_seed_data(self):
         """Test seed data endpoint"""
         print("\n=== SEED DATA TESTS ===")
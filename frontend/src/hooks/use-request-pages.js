@@ -0,0 +1,66 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+
+const PAGE_SIZE = 20;
+
+/**
+ * Pages through a cursor-paginated request list, newest first.
+ *
+ * `fetchPage` is an API call such as `creatorAPI.getRequests`; the server
+ * answers with the next cursor and the total in the X-Next-Cursor /
+ * X-Total-Count headers. Changing `status` starts over from the first page.
+ */
+export function useRequestPages(fetchPage, status) {
+  const [items, setItems] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [cursor, setCursor] = useState(null);
+  const [loading, setLoading] = useState(true);
+  // Bumped on every reset, so a page that arrives for an old filter is dropped
+  const generation = useRef(0);
+
+  const fetchInto = useCallback(async (after) => {
+    const run = generation.current;
+    setLoading(true);
+    try {
+      const params = { limit: PAGE_SIZE };
+      if (status) params.status = status;
+      if (after) params.cursor = after;
+      const response = await fetchPage(params);
+      if (run !== generation.current) return;
+      setItems(prev => {
+        const seen = new Set(prev.map(r => r.id));
+        return [...prev, ...response.data.filter(r => !seen.has(r.id))];
+      });
+      setCursor(response.headers['x-next-cursor'] || null);
+      setTotal(Number(response.headers['x-total-count'] ?? response.data.length));
+    } catch (error) {
+      if (run === generation.current) console.error("Failed to load requests");
+    } finally {
+      if (run === generation.current) setLoading(false);
+    }
+  }, [fetchPage, status]);
+
+  useEffect(() => {
+    generation.current += 1;
+    setItems([]);
+    setCursor(null);
+    setTotal(0);
+    fetchInto(null);
+  }, [fetchInto]);
+
+  const loadMore = () => {
+    if (cursor && !loading) fetchInto(cursor);
+  };
+
+  // Local moves between lists after a status change, without refetching
+  const remove = (id) => {
+    setItems(prev => prev.filter(r => r.id !== id));
+    setTotal(prev => Math.max(0, prev - 1));
+  };
+
+  const prepend = (request) => {
+    setItems(prev => [request, ...prev.filter(r => r.id !== request.id)]);
+    setTotal(prev => prev + 1);
+  };
+
+  return { items, total, hasMore: Boolean(cursor), loading, loadMore, remove, prepend };
+}
@@ -20,13 +20,55 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+export const clearSession = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+  localStorage.removeItem('user');
+};
+
+// Access tokens are short-lived: renew once with the refresh token, shared by
+// every request that fails while the refresh is in flight
+let refreshing = null;
+
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    refreshing = (refreshToken
+      ? axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken })
+      : Promise.reject(new Error('No refresh token'))
+    )
+      .then((response) => {
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refreshToken', response.data.refresh_token);
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+// Credential exchanges; a 401 from these means the credentials themselves are bad
+const NO_REFRESH_URLS = ['/auth/login', '/auth/signup', '/auth/refresh', '/auth/logout'];
+
 // Handle auth errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const original = error.config;
     if (error.response?.status === 401) {
-      localStorage.removeItem('token');
-      localStorage.removeItem('user');
+      if (original && !original._retried && !NO_REFRESH_URLS.includes(original.url)) {
+        original._retried = true;
+        try {
+          const token = await refreshAccessToken();
+          original.headers.Authorization = `Bearer ${token}`;
+          return api(original);
+        } catch (refreshError) {
+          // Fall through to signing out
+        }
+      }
+      clearSession();
       window.location.href = '/login';
     }
     return Promise.reject(error);
@@ -39,10 +81,11 @@ export const authAPI = {
   login: (data) => api.post('/auth/login', data),
   getMe: () => api.get('/auth/me'),
   logout: () => {
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
-    return api.post('/auth/logout');
+    const refreshToken = localStorage.getItem('refreshToken');
+    clearSession();
+    return api.post('/auth/logout', { refresh_token: refreshToken });
   },
+  logoutAll: () => api.post('/auth/logout-all'),
 };
 
 // Upload API
@@ -60,7 +103,7 @@ export const uploadAPI = {
 export const creatorAPI = {
   createProfile: (data) => api.post('/creator/profile', data),
   getProfile: () => api.get('/creator/profile'),
-  getRequests: () => api.get('/creator/requests'),
+  getRequests: (params = {}) => api.get('/creator/requests', { params }),
 };
 
 // Business API
@@ -82,20 +125,25 @@ export const marketplaceAPI = {
   },
   getCreatorById: (id) => api.get(`/creators/${id}`),
   getBusinessById: (id) => api.get(`/businesses/${id}`),
+  getCreatorsByIds: (ids) => api.get('/creators/batch', { params: { ids: ids.join(',') } }),
+  getBusinessesByIds: (ids) => api.get('/businesses/batch', { params: { ids: ids.join(',') } }),
 };
 
 // Requests API
 export const requestsAPI = {
   create: (data) => api.post('/requests/', data),
-  getSent: () => api.get('/requests/sent'),
+  getSent: (params = {}) => api.get('/requests/sent', { params }),
   getById: (id) => api.get(`/requests/${id}`),
   updateStatus: (id, status) => api.patch(`/requests/${id}/status?status=${status}`),
+  exportRequests: (format = 'csv') => api.get('/requests/export', { params: { format }, responseType: 'blob' }),
+  exportMessages: (format = 'csv') => api.get('/requests/export/messages', { params: { format }, responseType: 'blob' }),
 };
 
 // Messages API
 export const messagesAPI = {
   getMessages: (requestId) => api.get(`/messages/${requestId}`),
   sendMessage: (requestId, text) => api.post(`/messages/${requestId}`, { text }),
+  updatePresence: (requestId, data) => api.post(`/messages/${requestId}/presence`, data),
 };
 
 // Seed API
@@ -1,5 +1,5 @@
 import { createContext, useContext, useState, useEffect } from 'react';
-import { authAPI } from './api';
+import { authAPI, clearSession } from './api';
 
 const AuthContext = createContext(null);
 
@@ -18,8 +18,7 @@ export const AuthProvider = ({ children }) => {
           setUser(response.data);
           localStorage.setItem('user', JSON.stringify(response.data));
         } catch (error) {
-          localStorage.removeItem('token');
-          localStorage.removeItem('user');
+          clearSession();
         }
       }
       setLoading(false);
@@ -30,8 +29,9 @@ export const AuthProvider = ({ children }) => {
 
   const login = async (email, password) => {
     const response = await authAPI.login({ email, password });
-    const { access_token, user: userData } = response.data;
+    const { access_token, refresh_token, user: userData } = response.data;
     localStorage.setItem('token', access_token);
+    localStorage.setItem('refreshToken', refresh_token);
     localStorage.setItem('user', JSON.stringify(userData));
     setUser(userData);
     return userData;
@@ -39,8 +39,9 @@ export const AuthProvider = ({ children }) => {
 
   const signup = async (email, password, role) => {
     const response = await authAPI.signup({ email, password, role });
-    const { access_token, user: userData } = response.data;
+    const { access_token, refresh_token, user: userData } = response.data;
     localStorage.setItem('token', access_token);
+    localStorage.setItem('refreshToken', refresh_token);
     localStorage.setItem('user', JSON.stringify(userData));
     setUser(userData);
     return userData;
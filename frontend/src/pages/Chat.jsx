@@ -19,18 +19,48 @@ const Chat = () => {
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(true);
   const [sending, setSending] = useState(false);
+  const [presence, setPresence] = useState({ online: [], typing: [], lastRead: {} });
   const messagesEndRef = useRef(null);
+  const messagesRef = useRef([]);
+  const lastTypingSentRef = useRef(0);
 
   useEffect(() => {
     loadData();
     const interval = setInterval(loadMessages, 5000); // Poll for new messages
-    return () => clearInterval(interval);
+    const heartbeat = setInterval(() => sendPresence(), 5000);
+    return () => {
+      clearInterval(interval);
+      clearInterval(heartbeat);
+    };
   }, [requestId]);
 
   useEffect(() => {
+    messagesRef.current = messages;
     scrollToBottom();
   }, [messages]);
 
+  const sendPresence = async (typing = false) => {
+    const latest = messagesRef.current[messagesRef.current.length - 1];
+    try {
+      const response = await messagesAPI.updatePresence(requestId, {
+        typing,
+        lastReadAt: latest?.createdAt,
+      });
+      setPresence(response.data);
+    } catch (error) {
+      // Presence is best effort
+    }
+  };
+
+  const handleTyping = (e) => {
+    setNewMessage(e.target.value);
+    // Typing expires on the server after a few seconds; refresh it while typing
+    if (Date.now() - lastTypingSentRef.current > 3000) {
+      lastTypingSentRef.current = Date.now();
+      sendPresence(true);
+    }
+  };
+
   const loadData = async () => {
     try {
       const [requestRes, messagesRes] = await Promise.all([
@@ -69,6 +99,7 @@ const Chat = () => {
       const response = await messagesAPI.sendMessage(requestId, newMessage);
       setMessages(prev => [...prev, response.data]);
       setNewMessage('');
+      lastTypingSentRef.current = 0;
     } catch (error) {
       toast.error("Failed to send message");
     } finally {
@@ -110,6 +141,14 @@ const Chat = () => {
     );
   }
 
+  const otherOnline = presence.online.some(id => id !== user?.id);
+  const otherTyping = presence.typing.some(id => id !== user?.id);
+  const otherLastRead = Object.entries(presence.lastRead)
+    .filter(([id]) => id !== user?.id)
+    .map(([, readAt]) => new Date(readAt))
+    .sort((a, b) => b - a)[0];
+  const lastOwnMessage = [...messages].reverse().find(m => m.senderUserId === user?.id);
+
   const isCreator = user?.role === 'creator';
   const otherParty = isCreator 
     ? { name: request?.businessName, photo: request?.businessPhoto }
@@ -133,7 +172,9 @@ const Chat = () => {
           
           <div className="flex-1">
             <h2 className="font-semibold">{otherParty.name}</h2>
-            <p className="text-xs text-muted-foreground">{request?.title}</p>
+            <p className="text-xs text-muted-foreground" data-testid="presence-status">
+              {otherTyping ? 'typing…' : otherOnline ? 'Online' : request?.title}
+            </p>
           </div>
           
           <Badge className={
@@ -223,6 +264,7 @@ const Chat = () => {
                         </div>
                         <p className={`text-xs text-muted-foreground mt-1 ${isOwnMessage ? 'text-right' : ''}`}>
                           {formatTime(message.createdAt)}
+                          {message.id === lastOwnMessage?.id && otherLastRead >= new Date(message.createdAt) && ' · Seen'}
                         </p>
                       </div>
                     </div>
@@ -240,7 +282,7 @@ const Chat = () => {
         <form onSubmit={handleSend} className="max-w-4xl mx-auto flex gap-3">
           <Input
             value={newMessage}
-            onChange={(e) => setNewMessage(e.target.value)}
+            onChange={handleTyping}
             placeholder="Type your message..."
             className="flex-1 input-orange"
             disabled={sending}
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { 
   Instagram, Globe, MapPin, Edit, LogOut, MessageSquare, Send,
-  ExternalLink, Search, Filter, X, Users, DollarSign, Loader2
+  ExternalLink, Search, Filter, X, Users, DollarSign, Loader2, Download
 } from 'lucide-react';
 import { Button } from '../../components/ui/button';
 import { Badge } from '../../components/ui/badge';
@@ -17,6 +17,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '../../components/ui/ta
 import { Sheet, SheetContent, SheetHeader, SheetTitle, SheetTrigger } from '../../components/ui/sheet';
 import { businessAPI, marketplaceAPI, requestsAPI } from '../../lib/api';
 import { useAuth } from '../../lib/auth';
+import { useRequestPages } from '../../hooks/use-request-pages';
 import { toast } from 'sonner';
 
 const NICHES = [
@@ -25,12 +26,15 @@ const NICHES = [
   'Sports', 'Health', 'Finance'
 ];
 
+const REQUEST_STATUSES = ['all', 'pending', 'accepted', 'declined', 'completed'];
+
 const BusinessDashboard = () => {
   const navigate = useNavigate();
   const { logout } = useAuth();
   const [profile, setProfile] = useState(null);
   const [creators, setCreators] = useState([]);
-  const [sentRequests, setSentRequests] = useState([]);
+  const [requestStatus, setRequestStatus] = useState('all');
+  const sentRequests = useRequestPages(requestsAPI.getSent, requestStatus === 'all' ? null : requestStatus);
   const [loading, setLoading] = useState(true);
   const [creatorsLoading, setCreatorsLoading] = useState(false);
   
@@ -47,7 +51,6 @@ const BusinessDashboard = () => {
   useEffect(() => {
     loadProfile();
     loadCreators();
-    loadSentRequests();
   }, []);
 
   const loadProfile = async () => {
@@ -81,12 +84,19 @@ const BusinessDashboard = () => {
     }
   };
 
-  const loadSentRequests = async () => {
+  const handleExport = async (kind) => {
     try {
-      const response = await requestsAPI.getSent();
-      setSentRequests(response.data);
+      const response = kind === 'messages'
+        ? await requestsAPI.exportMessages('csv')
+        : await requestsAPI.exportRequests('csv');
+      const url = URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `${kind === 'messages' ? 'conversations' : 'requests'}.csv`;
+      link.click();
+      URL.revokeObjectURL(url);
     } catch (error) {
-      console.error("Failed to load sent requests");
+      toast.error("Export failed, please try again");
     }
   };
 
@@ -229,7 +239,7 @@ const BusinessDashboard = () => {
               🍊 Creator Marketplace
             </TabsTrigger>
             <TabsTrigger value="requests" className="rounded-full data-[state=active]:bg-white px-6">
-              📤 Sent Requests ({sentRequests.length})
+              📤 Sent Requests ({sentRequests.total})
             </TabsTrigger>
           </TabsList>
 
@@ -361,20 +371,46 @@ const BusinessDashboard = () => {
           </TabsContent>
 
           <TabsContent value="requests">
-            <div className="mb-6">
-              <h2 className="font-heading text-2xl font-bold">Your Sent Requests</h2>
-              <p className="text-muted-foreground">Track your collaboration requests</p>
+            <div className="mb-6 flex items-start justify-between gap-4">
+              <div>
+                <h2 className="font-heading text-2xl font-bold">Your Sent Requests</h2>
+                <p className="text-muted-foreground">Track your collaboration requests</p>
+              </div>
+              <div className="flex gap-2">
+                <Select value={requestStatus} onValueChange={setRequestStatus}>
+                  <SelectTrigger className="w-36 h-9 rounded-full" data-testid="sent-requests-status-select">
+                    <SelectValue />
+                  </SelectTrigger>
+                  <SelectContent>
+                    {REQUEST_STATUSES.map(status => (
+                      <SelectItem key={status} value={status} className="capitalize">{status}</SelectItem>
+                    ))}
+                  </SelectContent>
+                </Select>
+                <Button variant="outline" size="sm" onClick={() => handleExport('requests')}>
+                  <Download className="w-4 h-4 mr-2" />
+                  Requests CSV
+                </Button>
+                <Button variant="outline" size="sm" onClick={() => handleExport('messages')}>
+                  <Download className="w-4 h-4 mr-2" />
+                  Chats CSV
+                </Button>
+              </div>
             </div>
 
-            {sentRequests.length === 0 ? (
-              <div className="card-orange p-12 text-center">
-                <span className="text-5xl block mb-4">📤</span>
-                <h3 className="font-heading text-xl font-bold mb-2">No requests sent yet</h3>
-                <p className="text-muted-foreground">Browse the marketplace and send your first collab request!</p>
-              </div>
+            {sentRequests.items.length === 0 && !sentRequests.loading ? (
+              requestStatus === 'all' ? (
+                <div className="card-orange p-12 text-center">
+                  <span className="text-5xl block mb-4">📤</span>
+                  <h3 className="font-heading text-xl font-bold mb-2">No requests sent yet</h3>
+                  <p className="text-muted-foreground">Browse the marketplace and send your first collab request!</p>
+                </div>
+              ) : (
+                <p className="text-center text-muted-foreground py-8">No {requestStatus} requests</p>
+              )
             ) : (
               <div className="space-y-4">
-                {sentRequests.map(request => (
+                {sentRequests.items.map(request => (
                   <SentRequestCard 
                     key={request.id} 
                     request={request}
@@ -382,6 +418,14 @@ const BusinessDashboard = () => {
                     onViewCreator={() => navigate(`/profile/creator/${request.creatorId}`)}
                   />
                 ))}
+                {sentRequests.hasMore && (
+                  <div className="text-center">
+                    <Button variant="outline" className="rounded-full" onClick={sentRequests.loadMore} disabled={sentRequests.loading}>
+                      {sentRequests.loading && <Loader2 className="w-4 h-4 mr-2 animate-spin" />}
+                      Load more ({sentRequests.items.length} of {sentRequests.total})
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </TabsContent>
@@ -11,15 +11,19 @@ import { Avatar, AvatarFallback, AvatarImage } from '../../components/ui/avatar'
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '../../components/ui/tabs';
 import { creatorAPI, requestsAPI } from '../../lib/api';
 import { useAuth } from '../../lib/auth';
+import { useRequestPages } from '../../hooks/use-request-pages';
 import { toast } from 'sonner';
 
 const CreatorDashboard = () => {
   const navigate = useNavigate();
   const { user, logout } = useAuth();
   const [profile, setProfile] = useState(null);
-  const [requests, setRequests] = useState([]);
   const [loading, setLoading] = useState(true);
   const [actionLoading, setActionLoading] = useState(null);
+  // One paged list per tab, filtered by the server
+  const pendingRequests = useRequestPages(creatorAPI.getRequests, 'pending');
+  const acceptedRequests = useRequestPages(creatorAPI.getRequests, 'accepted');
+  const declinedRequests = useRequestPages(creatorAPI.getRequests, 'declined');
 
   useEffect(() => {
     loadData();
@@ -27,12 +31,8 @@ const CreatorDashboard = () => {
 
   const loadData = async () => {
     try {
-      const [profileRes, requestsRes] = await Promise.all([
-        creatorAPI.getProfile(),
-        creatorAPI.getRequests()
-      ]);
+      const profileRes = await creatorAPI.getProfile();
       setProfile(profileRes.data);
-      setRequests(requestsRes.data);
     } catch (error) {
       if (error.response?.status === 404) {
         navigate('/onboarding/creator');
@@ -48,10 +48,13 @@ const CreatorDashboard = () => {
     setActionLoading(requestId);
     try {
       await requestsAPI.updateStatus(requestId, newStatus);
-      // Force UI update with new status
-      setRequests(prev => prev.map(r => 
-        r.id === requestId ? { ...r, status: newStatus } : r
-      ));
+      // Move the request to its new tab
+      const request = pendingRequests.items.find(r => r.id === requestId);
+      pendingRequests.remove(requestId);
+      if (request) {
+        const target = newStatus === 'accepted' ? acceptedRequests : declinedRequests;
+        target.prepend({ ...request, status: newStatus });
+      }
       toast.success(newStatus === 'accepted' ? "Request accepted! Time to make magic ✨" : "Request declined");
     } catch (error) {
       toast.error("Failed to update request");
@@ -86,9 +89,8 @@ const CreatorDashboard = () => {
     );
   }
 
-  const pendingRequests = requests.filter(r => r.status === 'pending');
-  const acceptedRequests = requests.filter(r => r.status === 'accepted');
-  const declinedRequests = requests.filter(r => r.status === 'declined');
+  const listsLoading = pendingRequests.loading || acceptedRequests.loading || declinedRequests.loading;
+  const noRequests = !listsLoading && pendingRequests.total + acceptedRequests.total + declinedRequests.total === 0;
 
   return (
     <div className="min-h-screen bg-background">
@@ -231,11 +233,11 @@ const CreatorDashboard = () => {
               <div className="flex items-center justify-between mb-6">
                 <h2 className="font-heading text-2xl font-bold">Collab Requests 🍊</h2>
                 <Badge variant="secondary" className="text-lg px-4 py-1">
-                  {pendingRequests.length} new
+                  {pendingRequests.total} new
                 </Badge>
               </div>
 
-              {requests.length === 0 ? (
+              {noRequests ? (
                 <div className="card-orange p-12 text-center">
                   <span className="text-5xl block mb-4">🍊</span>
                   <h3 className="font-heading text-xl font-bold mb-2">No collabs yet…</h3>
@@ -247,21 +249,21 @@ const CreatorDashboard = () => {
                 <Tabs defaultValue="pending" className="w-full">
                   <TabsList className="mb-6 bg-muted/50 p-1 rounded-full">
                     <TabsTrigger value="pending" className="rounded-full data-[state=active]:bg-white">
-                      Pending ({pendingRequests.length})
+                      Pending ({pendingRequests.total})
                     </TabsTrigger>
                     <TabsTrigger value="accepted" className="rounded-full data-[state=active]:bg-white">
-                      Accepted ({acceptedRequests.length})
+                      Accepted ({acceptedRequests.total})
                     </TabsTrigger>
                     <TabsTrigger value="declined" className="rounded-full data-[state=active]:bg-white">
-                      Declined ({declinedRequests.length})
+                      Declined ({declinedRequests.total})
                     </TabsTrigger>
                   </TabsList>
 
                   <TabsContent value="pending" className="space-y-4">
-                    {pendingRequests.length === 0 ? (
+                    {pendingRequests.items.length === 0 && !pendingRequests.loading ? (
                       <p className="text-center text-muted-foreground py-8">No pending requests</p>
                     ) : (
-                      pendingRequests.map(request => (
+                      pendingRequests.items.map(request => (
                         <RequestCard 
                           key={request.id}
                           request={request}
@@ -273,13 +275,14 @@ const CreatorDashboard = () => {
                         />
                       ))
                     )}
+                    <LoadMore list={pendingRequests} />
                   </TabsContent>
 
                   <TabsContent value="accepted" className="space-y-4">
-                    {acceptedRequests.length === 0 ? (
+                    {acceptedRequests.items.length === 0 && !acceptedRequests.loading ? (
                       <p className="text-center text-muted-foreground py-8">No accepted requests yet</p>
                     ) : (
-                      acceptedRequests.map(request => (
+                      acceptedRequests.items.map(request => (
                         <RequestCard 
                           key={request.id}
                           request={request}
@@ -287,19 +290,21 @@ const CreatorDashboard = () => {
                         />
                       ))
                     )}
+                    <LoadMore list={acceptedRequests} />
                   </TabsContent>
 
                   <TabsContent value="declined" className="space-y-4">
-                    {declinedRequests.length === 0 ? (
+                    {declinedRequests.items.length === 0 && !declinedRequests.loading ? (
                       <p className="text-center text-muted-foreground py-8">No declined requests</p>
                     ) : (
-                      declinedRequests.map(request => (
+                      declinedRequests.items.map(request => (
                         <RequestCard 
                           key={request.id}
                           request={request}
                         />
                       ))
                     )}
+                    <LoadMore list={declinedRequests} />
                   </TabsContent>
                 </Tabs>
               )}
@@ -337,6 +342,18 @@ const CreatorDashboard = () => {
   );
 };
 
+const LoadMore = ({ list }) => {
+  if (!list.hasMore) return null;
+  return (
+    <div className="text-center">
+      <Button variant="outline" className="rounded-full" onClick={list.loadMore} disabled={list.loading}>
+        {list.loading && <Loader2 className="w-4 h-4 mr-2 animate-spin" />}
+        Load more ({list.items.length} of {list.total})
+      </Button>
+    </div>
+  );
+};
+
 const RequestCard = ({ request, onAccept, onDecline, onChat, loading, showActions }) => {
   const formatPrice = (price) => {
     return new Intl.NumberFormat('en-IN', { style: 'currency', currency: 'INR', maximumFractionDigits: 0 }).format(price);
@@ -81,7 +81,8 @@ const BusinessOnboarding = () => {
         id: Math.random().toString(36).substr(2, 9),
         type: res.data.type,
         url: res.data.url,
-        thumbnailUrl: res.data.thumbnailUrl
+        thumbnailUrl: res.data.thumbnailUrl,
+        variants: res.data.variants
       }));
 
       setFormData(prev => ({
@@ -107,7 +107,8 @@ const CreatorOnboarding = () => {
         id: Math.random().toString(36).substr(2, 9),
         type: res.data.type,
         url: res.data.url,
-        thumbnailUrl: res.data.thumbnailUrl
+        thumbnailUrl: res.data.thumbnailUrl,
+        variants: res.data.variants
       }));
 
       setFormData(prev => ({
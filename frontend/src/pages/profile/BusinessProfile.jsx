@@ -168,6 +168,8 @@ const BusinessProfile = () => {
                     <>
                       <img 
                         src={media.thumbnailUrl || media.url} 
+                        srcSet={media.variants?.['image/webp']}
+                        sizes="(min-width: 768px) 33vw, 50vw"
                         alt="" 
                         className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300" 
                       />
@@ -180,6 +182,8 @@ const BusinessProfile = () => {
                   ) : (
                     <img 
                       src={media.thumbnailUrl || media.url} 
+                      srcSet={media.variants?.['image/webp']}
+                      sizes="(min-width: 768px) 33vw, 50vw"
                       alt="" 
                       className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300" 
                     />
@@ -337,6 +337,8 @@ const CreatorProfile = () => {
                         <>
                           <img 
                             src={media.thumbnailUrl || media.url} 
+                            srcSet={media.variants?.['image/webp']}
+                            sizes="(min-width: 768px) 33vw, 50vw"
                             alt="" 
                             className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300" 
                           />
@@ -349,6 +351,8 @@ const CreatorProfile = () => {
                       ) : (
                         <img 
                           src={media.thumbnailUrl || media.url} 
+                          srcSet={media.variants?.['image/webp']}
+                          sizes="(min-width: 768px) 33vw, 50vw"
                           alt="" 
                           className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300" 
                         />
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare the per-document and bucketed chat message layouts.
+
+Needs a running MongoDB (MONGO_URL, default mongodb://localhost:27017); a
+throwaway database is created and dropped. Run from the repository root:
+
+    python -m tests.bench_message_storage [threads] [messages_per_thread]
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from message_store import BUCKETS_COLLECTION, create_message_store  # noqa: E402
+
+READ_LIMIT = 500
+
+
+def make_messages(request_id: str, count: int) -> list:
+    start = datetime.now(timezone.utc) - timedelta(minutes=count)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "requestId": request_id,
+            "senderUserId": "user-a" if i % 2 else "user-b",
+            "senderName": "Bench Sender",
+            "text": f"message {i} " + "x" * 60,
+            "createdAt": (start + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+async def bench(db, mode: str, collection: str, threads: list) -> dict:
+    store = create_message_store(db, mode)
+    await store.ensure_indexes()
+
+    total = sum(len(messages) for _, messages in threads)
+    start = time.perf_counter()
+    for _, messages in threads:
+        for message in messages:
+            await store.append(message)
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for request_id, _ in threads:
+        await store.latest(request_id, READ_LIMIT)
+    read_seconds = time.perf_counter() - start
+
+    stats = await db.command("collStats", collection)
+    return {
+        "mode": mode,
+        "writes/s": total / write_seconds,
+        "read ms": read_seconds / len(threads) * 1000,
+        "documents": stats["count"],
+        "data MB": stats["size"] / 1e6,
+        "storage MB": stats["storageSize"] / 1e6,
+        "index MB": stats["totalIndexSize"] / 1e6,
+    }
+
+
+async def main():
+    thread_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = f"bench_messages_{os.getpid()}"
+    db = client[db_name]
+    threads = [(str(uuid.uuid4()), None) for _ in range(thread_count)]
+    threads = [(request_id, make_messages(request_id, per_thread)) for request_id, _ in threads]
+    try:
+        rows = [
+            await bench(db, "documents", "messages", threads),
+            await bench(db, "buckets", BUCKETS_COLLECTION, threads),
+        ]
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+    print(f"{thread_count} threads x {per_thread} messages, reading the latest {READ_LIMIT}")
+    headers = list(rows[0])
+    print("  ".join(f"{h:>12}" for h in headers))
+    for row in rows:
+        print("  ".join(f"{v:>12.2f}" if isinstance(v, float) else f"{v:>12}" for v in row.values()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
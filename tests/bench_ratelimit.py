@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Measure the per-request overhead of the rate-limit middleware.
+
+Run from the repository root: python -m tests.bench_ratelimit
+Exits non-zero when any scenario costs more than BUDGET_US per request.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ratelimit import RateLimitMiddleware, RouteLimit  # noqa: E402
+
+BUDGET_US = 50.0
+ITERATIONS = 200_000
+
+LIMITS = [
+    RouteLimit("POST", "/api/auth/login", per_minute=10, burst=5),
+    RouteLimit("POST", "/api/upload", per_minute=30, burst=10, scope="user"),
+    RouteLimit("POST", "/api/messages/{request_id}", per_minute=60, burst=20, scope="user"),
+    RouteLimit("GET", "/api/creators", per_minute=120, burst=60),
+]
+
+SCENARIOS = {
+    "unmatched route": ("GET", "/api/health", []),
+    "exact route, per-IP": ("GET", "/api/creators", []),
+    "param route, per-user": ("POST", "/api/messages/abc-123", [(b"authorization", b"Bearer token-1")]),
+}
+
+
+async def noop_app(scope, receive, send):
+    return None
+
+
+async def noop(*args):
+    return None
+
+
+async def measure(app, scope) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await app(scope, noop, noop)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+async def main() -> int:
+    # Huge budgets so every request is admitted and we time the full happy path
+    limits = [RouteLimit(l.method, l.path, per_minute=1e12, burst=10**12, scope=l.scope) for l in LIMITS]
+    middleware = RateLimitMiddleware(noop_app, limits, resolve_user=lambda token: "user-1")
+    failed = False
+    for name, (method, path, headers) in SCENARIOS.items():
+        scope = {"type": "http", "method": method, "path": path, "headers": headers, "client": ("10.0.0.1", 1234)}
+        baseline = await measure(noop_app, scope)
+        wrapped = await measure(middleware, scope)
+        overhead = wrapped - baseline
+        failed |= overhead > BUDGET_US
+        print(f"{name:<24} {overhead:7.2f} us/request")
+    print(f"budget: {BUDGET_US:.0f} us/request -> {'FAIL' if failed else 'OK'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Compare legacy (uuid4 + ISO strings) and native (UUIDv7 + BSON dates) storage.
+
+Inserts the same collaboration-request shaped documents in both formats into
+a throwaway database on a running MongoDB (MONGO_URL, default
+mongodb://localhost:27017) and reports insert throughput and index sizes.
+Run from the repository root:
+
+    python -m tests.bench_storage_format [documents]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from storage_format import StorageFormat  # noqa: E402
+
+BATCH_SIZE = 1000
+
+
+def make_request(fmt: StorageFormat, created: datetime, i: int) -> dict:
+    return {
+        "id": fmt.new_id(),
+        "creatorId": f"creator-{i % 500}",
+        "businessId": f"business-{i % 50}",
+        "title": "Summer Collection Campaign",
+        "brief": "Looking for 3 reels and 5 stories showcasing our products.",
+        "offerAmount": 30000,
+        "deliverables": "3 Reels, 5 Stories",
+        "status": "pending",
+        "timeline": "2 weeks",
+        "createdAt": fmt.timestamp(created),
+        "updatedAt": fmt.timestamp(created),
+    }
+
+
+async def bench(db, mode: str, total: int) -> dict:
+    fmt = StorageFormat(mode)
+    collection = db[f"requests_{mode}"]
+    await collection.create_index("id", unique=True)
+    await collection.create_index([("creatorId", 1), ("status", 1), ("createdAt", -1), ("id", -1)])
+
+    start_time = datetime.now(timezone.utc)
+    elapsed = 0.0
+    for offset in range(0, total, BATCH_SIZE):
+        docs = [
+            make_request(fmt, start_time + timedelta(milliseconds=i), i)
+            for i in range(offset, min(total, offset + BATCH_SIZE))
+        ]
+        start = time.perf_counter()
+        await collection.insert_many(docs, ordered=False)
+        elapsed += time.perf_counter() - start
+
+    stats = await db.command("collStats", collection.name)
+    return {
+        "format": mode,
+        "inserts/s": total / elapsed,
+        "avg doc B": stats["avgObjSize"],
+        "id index MB": stats["indexSizes"]["id_1"] / 1e6,
+        "list index MB": stats["indexSizes"]["creatorId_1_status_1_createdAt_-1_id_-1"] / 1e6,
+        "total index MB": stats["totalIndexSize"] / 1e6,
+    }
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = f"bench_storage_{os.getpid()}"
+    try:
+        rows = [await bench(client[db_name], mode, total) for mode in ("legacy", "native")]
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+    print(f"{total} documents")
+    print("  ".join(f"{h:>14}" for h in rows[0]))
+    for row in rows:
+        print("  ".join(f"{v:>14.2f}" if isinstance(v, float) else f"{v:>14}" for v in row.values()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""The whole API in-process, for route tests.
+
+``api`` imports ``server`` once against the in-memory mongomock-motor
+stand-in (tests using it are skipped without it), gives every test an empty
+database and fresh caches, and drives the app over raw ASGI like the other
+tests. No lifespan runs: jobs stay queued in the outbox.
+"""
+import asyncio
+import json
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+class Api:
+    def __init__(self, server):
+        self.server = server
+        self.db = server.db
+        self.chunks: list = []  # body messages of the last response
+
+    def request(self, method: str, path: str, token: Optional[str] = None, body=None, headers=None) -> tuple:
+        """Returns ``(status, headers, body bytes)``; streamed bodies are joined, see ``chunks``."""
+        return asyncio.run(self.call(method, path, token, body, headers))
+
+    async def call(self, method: str, path: str, token: Optional[str] = None, body=None, headers=None) -> tuple:
+        path, _, query = path.partition("?")
+        raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        if token:
+            raw_headers.append((b"authorization", f"Bearer {token}".encode()))
+        data = b""
+        if body is not None:
+            data = json.dumps(body).encode()
+            raw_headers.append((b"content-type", b"application/json"))
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+                 "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+                 "query_string": query.encode(), "headers": raw_headers, "client": ("127.0.0.1", 5000),
+                 "server": ("test", 80)}
+        sent = []
+        pending = [{"type": "http.request", "body": data, "more_body": False}]
+        finished = asyncio.Event()
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Streaming responses listen for a disconnect while they send
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished.set()
+
+        await self.server.app(scope, receive, send)
+        start = sent[0]
+        response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+        self.chunks = [m.get("body", b"") for m in sent[1:]]
+        return start["status"], response_headers, b"".join(self.chunks)
+
+    def json(self, method: str, path: str, token: Optional[str] = None, body=None) -> tuple:
+        status, _, data = self.request(method, path, token, body)
+        return status, json.loads(data)
+
+    def user(self, role: str, name: str) -> dict:
+        """Insert a user with a completed profile; returns it with an access ``token``."""
+        server = self.server
+        now = server.storage.now()
+        user = {"id": server.storage.new_id(), "email": f"{name.lower()}@example.com", "passwordHash": "",
+                "role": role, "hasCompletedOnboarding": True, "createdAt": now}
+        profile = {"id": server.storage.new_id(), "userId": user["id"], "bio": "", "location": "",
+                   "profilePhotoUrl": "", "instagramHandle": "", "instagramUrl": "", "mediaGallery": [],
+                   "createdAt": now, "updatedAt": now}
+        if role == "creator":
+            profile.update(name=name, followersCount=0, niches=[], isOpenToBarter=False, rates={})
+            collection = self.db.creator_profiles
+        else:
+            profile.update(brandName=name, category="", websiteUrl="")
+            collection = self.db.business_profiles
+
+        async def insert():
+            await self.db.users.insert_one(dict(user))
+            await collection.insert_one(dict(profile))
+
+        asyncio.run(insert())
+        token = server.create_access_token({"sub": user["id"], "email": user["email"], "role": role}, "test")
+        return {**user, "profile": profile, "token": token}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    # Read once, at the first import of server
+    for name, value in {"MONGO_URL": "mongodb://stand-in", "DB_NAME": "api_tests", "RATE_LIMIT_ENABLED": "false",
+                        "NOTIFICATION_TRANSPORT": "log", "CACHE_INVALIDATION_MODE": "off"}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.syspath_prepend(str(BACKEND_DIR))
+    import server
+
+    monkeypatch.setattr(server.mongo, "client", mongomock_motor.AsyncMongoMockClient())
+    # No replica set in the stand-in
+    monkeypatch.setattr(server.outbox, "_transactions_supported", False)
+    for cache in (server.request_counts, server.user_cache, server.profile_cache, server.participants_cache):
+        cache.clear()
+    return Api(server)
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""Soak test: one API worker under mixed traffic for hours, watched for leaks.
+
+The worker runs in a child process (uvicorn, lifespan and job runner
+included) against a local MongoDB stand-in: an in-memory mongomock-motor
+database by default, or a real mongod with --mongo-url. Media storage is
+stubbed (MEDIA_STORAGE=stub). Every --sample-seconds the worker records its
+own RSS, open file descriptors, event-loop lag and tracemalloc growth by
+line.
+
+This process replays the traffic profile over HTTP: marketplace browsing,
+chat polling with presence heartbeats and the odd message, request lists,
+and uploads. Once --warmup has passed it tells the worker (SIGUSR1) to take
+its tracemalloc baseline. The samples after that are checked against the
+thresholds at the end; the exit status is non-zero when any is exceeded.
+
+Run from the repository root:
+
+    python -m tests.soak --duration 4h --users 20
+    python -m tests.soak --duration 5m --sample-seconds 10   # smoke run
+
+The RSS slope check needs an hour or more; short runs are dominated by
+start-up growth and will fail it.
+
+The in-memory stand-in needs ``pip install mongomock-motor``. It has no TTL
+monitor, so the worker expires TTL-indexed documents itself, and old chat
+messages are trimmed so the dataset stays flat and growth means a leak.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+PASSWORD = "password123"
+SEED_CREATORS = 5
+SEED_BUSINESSES = 2
+
+# Weighted actions of one virtual user; think time between actions is random
+TRAFFIC_PROFILE = {
+    "browse": 35,
+    "profile": 15,
+    "chat_poll": 30,
+    "send_message": 5,
+    "request_list": 10,
+    "upload": 5,
+}
+
+
+def parse_duration(value: str) -> float:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", value.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration {value!r}; use e.g. 90s, 30m, 4h")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("1h"))
+    parser.add_argument("--warmup", type=parse_duration, default=None, help="default: 10%% of the duration")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--think-ms", type=float, default=200, help="mean pause between a user's actions")
+    parser.add_argument("--sample-seconds", type=float, default=30)
+    parser.add_argument("--mongo-url", default="", help="use a real mongod instead of the in-memory stand-in")
+    parser.add_argument("--port", type=int, default=0, help="default: a free port")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip allocation tracking (less overhead)")
+    parser.add_argument("--message-retention-minutes", type=float, default=10)
+    parser.add_argument("--samples", default="", help="where to keep the worker's samples (JSON lines)")
+    # Thresholds, measured from the first sample after warm-up
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64)
+    parser.add_argument("--max-rss-slope-mb-per-hour", type=float, default=16, help="over the last half of the run")
+    parser.add_argument("--max-traced-growth-mb", type=float, default=32)
+    parser.add_argument("--max-fd-growth", type=int, default=16)
+    parser.add_argument("--max-lag-p99-ms", type=float, default=250)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    # Internal: run as the worker under test
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.warmup is None:
+        args.warmup = args.duration * 0.1
+    return args
+
+
+# ============== WORKER (child process) ==============
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+
+        # Peak rather than current outside Linux; still shows steady growth
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def open_fds() -> int:
+    for path in ("/proc/self/fd", "/dev/fd"):
+        if os.path.isdir(path):
+            return len(os.listdir(path))
+    return -1
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def measure_lag(lags: list, interval: float = 0.1):
+    """Record how late each wake-up is; a blocked loop shows up as lag."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def expire_ttl_documents(db):
+    """What mongod's TTL monitor would do; the in-memory stand-in has none."""
+    now = datetime.now(timezone.utc)
+    for name in await db.list_collection_names():
+        for index in (await db[name].index_information()).values():
+            if "expireAfterSeconds" in index:
+                field = index["key"][0][0]
+                cutoff = now - timedelta(seconds=index["expireAfterSeconds"])
+                await db[name].delete_many({field: {"$lt": cutoff}})
+
+
+async def trim_messages(server, retention: timedelta):
+    cutoff = server.storage.timestamp(datetime.now(timezone.utc) - retention)
+    await server.db.messages.delete_many({"createdAt": {"$lt": cutoff}})
+    await server.db.message_buckets.delete_many({"lastAt": {"$lt": cutoff}})
+
+
+async def monitor(args, server, lags: list, in_memory: bool, warmed_up: asyncio.Event):
+    import tracemalloc
+
+    with open(args.samples, "a", buffering=1) as out:
+        started = time.monotonic()
+        baseline = None
+        while True:
+            await asyncio.sleep(args.sample_seconds)
+            if in_memory:
+                await expire_ttl_documents(server.db)
+                await trim_messages(server, timedelta(minutes=args.message_retention_minutes))
+            sample = {
+                "t": round(time.monotonic() - started, 1),
+                "steady": warmed_up.is_set(),
+                "rssMb": round(rss_mb(), 2),
+                "fds": open_fds(),
+                "tasks": len(asyncio.all_tasks()),
+                "lagP50Ms": round(percentile(lags, 0.5), 2),
+                "lagP99Ms": round(percentile(lags, 0.99), 2),
+                "lagMaxMs": round(max(lags, default=0.0), 2),
+            }
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ])
+                sample["tracedMb"] = round(tracemalloc.get_traced_memory()[0] / 2**20, 2)
+                if baseline is None and warmed_up.is_set():
+                    baseline = snapshot
+                if baseline is not None:
+                    sample["topGrowth"] = [
+                        f"{stat.size_diff / 1024:+.1f} KiB {stat.count_diff:+d} blocks {stat.traceback[0]}"
+                        for stat in snapshot.compare_to(baseline, "lineno")[:10]
+                    ]
+                # The snapshot blocks the loop; keep that stall out of the next window's lag
+                await asyncio.sleep(0.2)
+            lags.clear()
+            out.write(json.dumps(sample) + "\n")
+
+
+async def serve(args):
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+
+    import uvicorn
+
+    if not args.no_tracemalloc:
+        import tracemalloc
+
+        tracemalloc.start(1)
+
+    import server
+
+    logging.getLogger().setLevel(logging.WARNING)
+    in_memory = not args.mongo_url
+    if in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.mongo.client = AsyncMongoMockClient()
+        # No replica set: plain writes for the outbox, polling for invalidation
+        server.outbox._transactions_supported = False
+
+    # The load generator signals the end of its warm-up; later samples are judged
+    warmed_up = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, warmed_up.set)
+    lags: list = []
+    background = [
+        asyncio.create_task(measure_lag(lags)),
+        asyncio.create_task(monitor(args, server, lags, in_memory, warmed_up)),
+    ]
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="on")
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        for task in background:
+            task.cancel()
+        # Let the monitor unwind so the samples file is closed before exit
+        await asyncio.gather(*background, return_exceptions=True)
+
+
+def worker_environment(args, media_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "MONGO_URL": args.mongo_url or "mongodb://stand-in",
+        "DB_NAME": env.get("DB_NAME") if args.mongo_url and env.get("DB_NAME") else f"soak_{os.getpid()}",
+        "MEDIA_STORAGE": "stub",
+        "MEDIA_LOCAL_DIR": media_dir,
+        "RATE_LIMIT_ENABLED": "false",
+        "NOTIFICATION_WINDOW_MINUTES": "1",
+        "CACHE_INVALIDATION_MODE": "poll",
+    })
+    return env
+
+
+# ============== LOAD (this process) ==============
+
+def make_png(seed: int, size: int = 64) -> bytes:
+    """A small valid RGB PNG; a handful of distinct ones keeps uploads deduplicated."""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + bytes(rng.randrange(256) for _ in range(size * 3)) for _ in range(size))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class VirtualUser:
+    def __init__(self, client, email: str, stats: Counter, errors: Counter, images: list):
+        self.client = client
+        self.email = email
+        self.stats = stats
+        self.errors = errors
+        self.images = images
+        self.access_token = ""
+        self.refresh_token = ""
+        self.creator_ids: list = []
+        self.request_ids: list = []
+
+    @property
+    def is_business(self) -> bool:
+        return self.email.startswith("business")
+
+    async def login(self):
+        response = await self.client.post("/api/auth/login", json={"email": self.email, "password": PASSWORD})
+        response.raise_for_status()
+        self.access_token = response.json()["access_token"]
+        self.refresh_token = response.json()["refresh_token"]
+
+    async def call(self, action: str, method: str, url: str, expected=(200, 201), **kwargs):
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {self.access_token}", **kwargs.pop("headers", {})}
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            if response.status_code == 401 and attempt == 0:
+                # Access tokens are short-lived; a soak outlives several
+                refreshed = await self.client.post("/api/auth/refresh", json={"refresh_token": self.refresh_token})
+                if refreshed.status_code == 200:
+                    self.access_token = refreshed.json()["access_token"]
+                    self.refresh_token = refreshed.json()["refresh_token"]
+                else:
+                    await self.login()
+                continue
+            break
+        self.stats[action] += 1
+        if response.status_code not in expected:
+            self.errors[f"{action} {response.status_code}"] += 1
+        return response
+
+    async def setup(self):
+        await self.login()
+        creators = (await self.call("browse", "GET", "/api/creators")).json()
+        self.creator_ids = [c["id"] for c in creators]
+        url = "/api/requests/sent" if self.is_business else "/api/creator/requests"
+        self.request_ids = [r["id"] for r in (await self.call("request_list", "GET", url)).json()]
+
+    async def run(self, deadline: float, think: float):
+        actions, weights = zip(*TRAFFIC_PROFILE.items())
+        while time.monotonic() < deadline:
+            action = random.choices(actions, weights)[0]
+            try:
+                await getattr(self, action)()
+            except Exception as e:
+                # Connection-level failures count as errors and the user carries on
+                self.errors[f"{action} {type(e).__name__}"] += 1
+                self.stats[action] += 1
+            await asyncio.sleep(random.expovariate(1 / think))
+
+    async def browse(self):
+        params = random.choice([{}, {"niche": "Fashion"}, {"minFollowers": 100000}, {"openToBarter": "true"}])
+        await self.call("browse", "GET", "/api/creators", params=params)
+
+    async def profile(self):
+        ids = random.sample(self.creator_ids, min(3, len(self.creator_ids)))
+        await self.call("profile", "GET", f"/api/creators/{ids[0]}")
+        await self.call("profile", "GET", "/api/creators/batch", params={"ids": ",".join(ids)})
+
+    async def chat_poll(self):
+        if not self.request_ids:
+            return await self.request_list()
+        request_id = random.choice(self.request_ids)
+        messages = (await self.call("chat_poll", "GET", f"/api/messages/{request_id}")).json()
+        last_read = messages[-1]["createdAt"] if messages else None
+        await self.call("chat_poll", "POST", f"/api/messages/{request_id}/presence",
+                        json={"typing": random.random() < 0.2, "lastReadAt": last_read})
+
+    async def send_message(self):
+        if not self.request_ids:
+            return
+        request_id = random.choice(self.request_ids)
+        await self.call("send_message", "POST", f"/api/messages/{request_id}",
+                        json={"text": f"soak message {random.randrange(10**6)}"},
+                        headers={"Idempotency-Key": os.urandom(8).hex()})
+
+    async def request_list(self):
+        url = "/api/requests/sent" if self.is_business else "/api/creator/requests"
+        response = await self.call("request_list", "GET", url, params={"limit": 20})
+        if response.status_code == 200:
+            self.request_ids = [r["id"] for r in response.json()] or self.request_ids
+
+    async def upload(self):
+        image = random.choice(self.images)
+        await self.call("upload", "POST", "/api/upload", files={"file": ("soak.png", image, "image/png")})
+
+
+async def prepare(client):
+    """Seed, and give every creator a request from every business so there are chats."""
+    (await client.post("/api/seed")).raise_for_status()
+    creators = (await client.get("/api/creators")).json()
+    for b in range(SEED_BUSINESSES):
+        login = await client.post("/api/auth/login", json={"email": f"business{b + 1}@orange.com", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        response = await client.post("/api/requests/bulk", headers=headers, json={
+            "creatorIds": [c["id"] for c in creators], "title": "Soak campaign", "brief": "Long-running test",
+        })
+        response.raise_for_status()
+
+
+async def wait_until_up(client, process, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"worker exited with status {process.returncode}")
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("worker did not come up")
+
+
+async def generate_load(args, base_url: str, process) -> tuple:
+    import httpx
+
+    stats, errors = Counter(), Counter()
+    images = [make_png(seed) for seed in range(5)]
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        await wait_until_up(client, process)
+        await prepare(client)
+        emails = [f"creator{i + 1}@orange.com" for i in range(SEED_CREATORS)]
+        emails += [f"business{i + 1}@orange.com" for i in range(SEED_BUSINESSES)]
+        users = [VirtualUser(client, emails[i % len(emails)], stats, errors, images) for i in range(args.users)]
+        for user in users:
+            await user.setup()
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        runners = [asyncio.create_task(user.run(deadline, args.think_ms / 1000)) for user in users]
+        asyncio.get_running_loop().call_later(args.warmup, process.send_signal, signal.SIGUSR1)
+        while not all(r.done() for r in runners):
+            await asyncio.sleep(min(60, args.sample_seconds))
+            if process.poll() is not None:
+                raise RuntimeError(f"worker exited with status {process.returncode}")
+            elapsed = time.monotonic() - started
+            total = sum(stats.values())
+            print(f"[{elapsed / 60:6.1f} min] {total} calls, {total / max(elapsed, 1):.1f}/s, "
+                  f"{sum(errors.values())} errors", flush=True)
+        await asyncio.gather(*runners)
+    return stats, errors
+
+
+def slope_per_hour(points) -> float:
+    """Least-squares slope of (seconds, value) points, per hour."""
+    if len(points) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var * 3600 if var else 0.0
+
+
+def evaluate(args, samples: list, stats: Counter, errors: Counter) -> list:
+    """Print the report; return the thresholds that were exceeded."""
+    steady = [s for s in samples if s["steady"]] or samples[-1:]
+    if not steady:
+        return ["no samples were recorded"]
+    first, last = steady[0], steady[-1]
+
+    print("\n     t   rss MB   fds  tasks  lag p99 ms  traced MB")
+    step = max(1, len(samples) // 20)
+    for s in samples[::step] + ([samples[-1]] if (len(samples) - 1) % step else []):
+        print(f"{s['t']:6.0f}  {s['rssMb']:7.1f}  {s['fds']:4d}  {s['tasks']:5d}  {s['lagP99Ms']:10.1f}  "
+              f"{s.get('tracedMb', float('nan')):9.1f}")
+
+    total = sum(stats.values())
+    error_rate = sum(errors.values()) / total if total else 1.0
+    measurements = {
+        "rss growth MB": (last["rssMb"] - first["rssMb"], args.max_rss_growth_mb),
+        # Fitted over the second half: allocator arenas and bounded caches fill up first
+        "rss slope MB/h": (slope_per_hour([(s["t"], s["rssMb"]) for s in steady[len(steady) // 2:]]),
+                           args.max_rss_slope_mb_per_hour),
+        "fd growth": (last["fds"] - first["fds"], args.max_fd_growth),
+        "lag p99 ms (worst)": (max(s["lagP99Ms"] for s in steady), args.max_lag_p99_ms),
+        "error rate": (error_rate, args.max_error_rate),
+    }
+    if "tracedMb" in last:
+        measurements["traced growth MB"] = (last["tracedMb"] - first["tracedMb"], args.max_traced_growth_mb)
+
+    print(f"\n{total} calls: " + ", ".join(f"{k} {v}" for k, v in sorted(stats.items())))
+    if errors:
+        print("errors: " + ", ".join(f"{k} x{v}" for k, v in errors.most_common(10)))
+    if last.get("topGrowth"):
+        print("\nlargest allocation growth since warm-up:")
+        for line in last["topGrowth"]:
+            print(f"  {line}")
+
+    failures = []
+    print()
+    for name, (value, limit) in measurements.items():
+        ok = value <= limit
+        print(f"{'ok  ' if ok else 'FAIL'}  {name:20} {value:10.3f}  (limit {limit})")
+        if not ok:
+            failures.append(name)
+    return failures
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.serve:
+        asyncio.run(serve(args))
+        return 0
+
+    if args.port == 0:
+        import socket
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            args.port = s.getsockname()[1]
+    work_dir = tempfile.mkdtemp(prefix="soak-")
+    samples_path = args.samples or os.path.join(work_dir, "samples.jsonl")
+    command = [
+        sys.executable, "-m", "tests.soak", "--serve",
+        "--port", str(args.port),
+        "--samples", samples_path,
+        "--sample-seconds", str(args.sample_seconds),
+        "--message-retention-minutes", str(args.message_retention_minutes),
+    ]
+    if args.mongo_url:
+        command += ["--mongo-url", args.mongo_url]
+    if args.no_tracemalloc:
+        command.append("--no-tracemalloc")
+
+    print(f"Soaking for {args.duration / 60:.1f} min with {args.users} users; samples in {samples_path}", flush=True)
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=worker_environment(args, os.path.join(work_dir, "media")))
+    try:
+        stats, errors = asyncio.run(generate_load(args, f"http://127.0.0.1:{args.port}", process))
+        # One more sample so the tail of the run is covered
+        time.sleep(args.sample_seconds + 1)
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    with open(samples_path) as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    failures = evaluate(args, samples, stats, errors)
+    if failures:
+        print(f"\nSoak test failed: {', '.join(failures)}")
+        return 1
+    print("\nSoak test passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Bulk collaboration requests: bulk create, bulk status changes and archiving.
+
+Uses the ``api`` fixture. The stand-in has no ``$merge``; archiving gets a
+minimal one (insert documents the target lacks) patched into mongomock.
+"""
+import asyncio
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def digests(api) -> dict:
+    """Event kinds and request ids per recipient, from the open notification digests."""
+    docs = asyncio.run(api.db.notification_digests.find({}, {"_id": 0}).to_list(None))
+    return {d["recipientUserId"]: sorted((e["kind"], e["requestId"]) for e in d["events"]) for d in docs}
+
+
+def bulk_create(api, business, creator_ids) -> dict:
+    status, body = api.json("POST", "/api/requests/bulk", business["token"], {
+        "creatorIds": creator_ids, "title": "Launch", "brief": "Two reels",
+    })
+    assert status == 201
+    return body
+
+
+def test_bulk_create_reports_partial_failures_and_notifies_each_creator(api):
+    business = api.user("business", "Glow")
+    asha, ravi = api.user("creator", "Asha"), api.user("creator", "Ravi")
+    asha_id, ravi_id = asha["profile"]["id"], ravi["profile"]["id"]
+
+    body = bulk_create(api, business, [asha_id, "missing", ravi_id, asha_id])
+    assert [r["creatorId"] for r in body["created"]] == [asha_id, ravi_id]
+    assert sorted((f["creatorId"], f["reason"]) for f in body["failed"]) == [
+        (asha_id, "Duplicate creator id"), ("missing", "Creator not found"),
+    ]
+    assert all(r["businessName"] == "Glow" and r["status"] == "pending" for r in body["created"])
+    created = {r["creatorId"]: r["id"] for r in body["created"]}
+    assert digests(api) == {
+        asha["id"]: [("request.created", created[asha_id])],
+        ravi["id"]: [("request.created", created[ravi_id])],
+    }
+
+
+def test_bulk_create_is_for_businesses_only(api):
+    creator = api.user("creator", "Asha")
+    status, _ = api.json("POST", "/api/requests/bulk", creator["token"], {
+        "creatorIds": [creator["profile"]["id"]], "title": "Launch", "brief": "Two reels",
+    })
+    assert status == 403
+
+
+def test_bulk_status_updates_eligible_requests_and_notifies_their_businesses(api):
+    glow, fit = api.user("business", "Glow"), api.user("business", "Fit")
+    asha, ravi = api.user("creator", "Asha"), api.user("creator", "Ravi")
+    mine = [bulk_create(api, business, [asha["profile"]["id"]])["created"][0]["id"] for business in (glow, fit)]
+    theirs = bulk_create(api, glow, [ravi["profile"]["id"]])["created"][0]["id"]
+    asyncio.run(api.db.notification_digests.delete_many({}))
+
+    status, body = api.json("PATCH", "/api/requests/bulk/status", asha["token"],
+                            {"requestIds": mine + [theirs, "missing"], "status": "accepted"})
+    assert status == 200
+    assert body["updated"] == mine
+    # Another creator's request looks the same as one that doesn't exist
+    assert sorted((f["requestId"], f["reason"]) for f in body["failed"]) == sorted([
+        (theirs, "Request not found"), ("missing", "Request not found"),
+    ])
+    assert digests(api) == {glow["id"]: [("request.status", mine[0])], fit["id"]: [("request.status", mine[1])]}
+
+    # Accepted requests can't be declined any more
+    _, body = api.json("PATCH", "/api/requests/bulk/status", asha["token"], {"requestIds": mine, "status": "declined"})
+    assert body["updated"] == []
+    assert {f["reason"] for f in body["failed"]} == {"Cannot change status from 'accepted' to 'declined'"}
+
+
+def test_request_changed_between_the_check_and_the_update_is_reported(api, monkeypatch):
+    business = api.user("business", "Glow")
+    asha = api.user("creator", "Asha")
+    first, second = [bulk_create(api, business, [asha["profile"]["id"]])["created"][0]["id"] for _ in range(2)]
+    asyncio.run(api.db.notification_digests.delete_many({}))
+
+    update_many = mongomock.collection.Collection.update_many
+
+    def racing_update_many(self, filter, update, *args, **kwargs):
+        # Another tab declines the second request just before this write
+        if self.name == "collaboration_requests":
+            update_many(self, {"id": second}, {"$set": {"status": "declined"}})
+        return update_many(self, filter, update, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "update_many", racing_update_many)
+    _, body = api.json("PATCH", "/api/requests/bulk/status", asha["token"],
+                       {"requestIds": [first, second], "status": "accepted"})
+    assert body["updated"] == [first]
+    assert body["failed"] == [{"requestId": second, "reason": "Request changed during the update"}]
+    # Only the request that actually changed is announced
+    assert digests(api) == {business["id"]: [("request.status", first)]}
+
+
+@pytest.fixture
+def merge_stage(monkeypatch):
+    aggregate = mongomock.collection.Collection.aggregate
+
+    def aggregate_with_merge(self, pipeline, *args, **kwargs):
+        if not pipeline or "$merge" not in pipeline[-1]:
+            return aggregate(self, pipeline, *args, **kwargs)
+        target = self.database[pipeline[-1]["$merge"]["into"]]
+        for doc in aggregate(self, pipeline[:-1], *args, **kwargs):
+            if target.find_one({"_id": doc["_id"]}) is None:
+                target.insert_one(doc)
+        return aggregate(self, [{"$match": {"_id": None}}])
+
+    monkeypatch.setattr(mongomock.collection.Collection, "aggregate", aggregate_with_merge)
+
+
+def test_archiving_moves_requests_and_their_chats(api, merge_stage):
+    business = api.user("business", "Glow")
+    asha = api.user("creator", "Asha")
+    ids = [bulk_create(api, business, [asha["profile"]["id"]])["created"][0]["id"] for _ in range(3)]
+    declined, completed, pending = ids
+
+    async def prepare():
+        await api.db.collaboration_requests.update_one({"id": declined}, {"$set": {"status": "declined"}})
+        await api.db.collaboration_requests.update_one({"id": completed}, {"$set": {"status": "completed"}})
+        await api.db.messages.insert_one({"id": "m1", "requestId": declined, "text": "thanks anyway"})
+
+    asyncio.run(prepare())
+    status, body = api.json("PATCH", "/api/requests/bulk/status", asha["token"],
+                            {"requestIds": ids, "status": "archived"})
+    assert status == 200
+    assert body["updated"] == [declined, completed]
+    assert body["failed"] == [{"requestId": pending, "reason": "Cannot change status from 'pending' to 'archived'"}]
+
+    async def collections():
+        db = api.db
+        return (
+            sorted(r["id"] for r in await db.collaboration_requests.find({}, {"id": 1}).to_list(None)),
+            sorted(r["id"] for r in await db.collaboration_requests_archive.find({}, {"id": 1}).to_list(None)),
+            await db.messages.count_documents({}),
+            [m["id"] for m in await db.messages_archive.find({}, {"id": 1}).to_list(None)],
+        )
+
+    assert asyncio.run(collections()) == ([pending], sorted([declined, completed]), 0, ["m1"])
+    # Archiving is the creator's own housekeeping; nobody is notified
+    assert digests(api) == {asha["id"]: [("request.created", r) for r in sorted(ids)]}
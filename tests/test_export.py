@@ -0,0 +1,105 @@
+"""Request and conversation exports: streaming, CSV escaping and owner scoping.
+
+Uses the ``api`` fixture with a small export batch, so a handful of requests
+already spans several streamed chunks.
+"""
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def accounts(api, monkeypatch):
+    monkeypatch.setattr(api.server, "EXPORT_BATCH_SIZE", 2)
+    glow, fit = api.user("business", "Glow"), api.user("business", "Fit")
+    asha, ravi = api.user("creator", "Asha"), api.user("creator", "Ravi")
+    titles = {
+        (glow["id"], asha["profile"]["id"]): ["Launch", "=HYPERLINK(\"http://evil\")", "Reels", "Stories", "Live"],
+        (fit["id"], asha["profile"]["id"]): ["+Gym drop"],
+        (glow["id"], ravi["profile"]["id"]): ["Other creator"],
+    }
+    now = api.server.storage.now()
+    docs = [
+        {"id": f"req-{n}", "creatorId": creator_id, "businessId": business_id, "title": title,
+         "brief": "-1 for now", "offerAmount": 100, "deliverables": "@channel", "status": "pending", "timeline": "",
+         "createdAt": now, "updatedAt": now}
+        for n, (business_id, creator_id, title) in enumerate(
+            (business_id, creator_id, title) for (business_id, creator_id), names in titles.items() for title in names
+        )
+    ]
+    asyncio.run(api.db.collaboration_requests.insert_many(docs))
+    return {"glow": glow, "fit": fit, "asha": asha, "ravi": ravi, "requests": docs}
+
+
+def export(api, token, path) -> tuple:
+    status, headers, body = api.request("GET", path, token)
+    return status, headers, body.decode()
+
+
+def test_ndjson_export_streams_the_owners_requests_in_batches(api, accounts):
+    status, headers, body = export(api, accounts["asha"]["token"], "/api/requests/export")
+    assert status == 200
+    assert headers["content-type"].startswith("application/x-ndjson")
+    assert "attachment" in headers["content-disposition"]
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert sorted(r["title"] for r in rows) == sorted(["Launch", "=HYPERLINK(\"http://evil\")", "Reels", "Stories",
+                                                       "Live", "+Gym drop"])
+    assert {r["businessName"] for r in rows} == {"Glow", "Fit"} and {r["creatorName"] for r in rows} == {"Asha"}
+    # Six rows in batches of two, one chunk per batch
+    assert len([chunk for chunk in api.chunks if chunk]) == 3
+    # NDJSON is data, not a spreadsheet: values are left as they are
+    assert "=HYPERLINK(\"http://evil\")" in {r["title"] for r in rows}
+
+
+def test_csv_export_escapes_formulas(api, accounts):
+    status, headers, body = export(api, accounts["glow"]["token"], "/api/requests/export?format=csv")
+    assert status == 200 and headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(body)))
+    # One header, however many batches
+    assert body.count("id,title,brief") == 1
+    assert sorted(r["title"] for r in rows) == sorted(["Launch", "'=HYPERLINK(\"http://evil\")", "Reels", "Stories",
+                                                       "Live", "Other creator"])
+    assert {r["brief"] for r in rows} == {"'-1 for now"}
+    assert {r["deliverables"] for r in rows} == {"'@channel"}
+
+    status, _, body = export(api, accounts["fit"]["token"], "/api/requests/export?format=csv")
+    assert [r["title"] for r in csv.DictReader(io.StringIO(body))] == ["'+Gym drop"]
+
+
+def test_exports_are_scoped_to_the_caller(api, accounts):
+    _, _, body = export(api, accounts["ravi"]["token"], "/api/requests/export")
+    assert [json.loads(line)["title"] for line in body.splitlines()] == ["Other creator"]
+
+    asyncio.run(api.db.collaboration_requests.update_one({"title": "Reels"}, {"$set": {"status": "accepted"}}))
+    _, _, body = export(api, accounts["glow"]["token"], "/api/requests/export?status=accepted")
+    assert [json.loads(line)["title"] for line in body.splitlines()] == ["Reels"]
+
+    status, _, _ = export(api, accounts["glow"]["token"], "/api/requests/export?status=archived")
+    assert status == 400
+    # A creator account that never finished onboarding has nothing to export
+    asyncio.run(api.db.creator_profiles.delete_one({"userId": accounts["ravi"]["id"]}))
+    status, _, _ = export(api, accounts["ravi"]["token"], "/api/requests/export")
+    assert status == 404
+
+
+def test_conversation_export_covers_only_the_callers_threads(api, accounts):
+    requests = {r["title"]: r["id"] for r in accounts["requests"]}
+    messages = [
+        {"id": "m1", "requestId": requests["Launch"], "senderUserId": accounts["glow"]["id"], "senderName": "Glow",
+         "text": "=1+1", "createdAt": api.server.storage.now()},
+        {"id": "m2", "requestId": requests["Other creator"], "senderUserId": accounts["ravi"]["id"],
+         "senderName": "Ravi", "text": "hi", "createdAt": api.server.storage.now()},
+    ]
+    asyncio.run(api.db.messages.insert_many(messages))
+
+    status, _, body = export(api, accounts["asha"]["token"], "/api/requests/export/messages?format=csv")
+    assert status == 200
+    rows = list(csv.DictReader(io.StringIO(body)))
+    assert [(r["id"], r["requestTitle"], r["text"]) for r in rows] == [("m1", "Launch", "'=1+1")]
+
+    _, _, body = export(api, accounts["fit"]["token"], "/api/requests/export/messages?format=csv")
+    # Header only
+    assert body.splitlines() == [",".join(api.server.MESSAGE_EXPORT_FIELDS)]
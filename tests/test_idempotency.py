@@ -0,0 +1,185 @@
+"""Idempotency-Key middleware: replays, conflicts, released keys and leases.
+
+Drives ``IdempotencyMiddleware`` with a bare ASGI app over the in-memory
+mongomock-motor stand-in; skipped without it.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from idempotency import IdempotencyMiddleware, IdempotencyStore  # noqa: E402
+
+
+class Endpoint:
+    """Reads the whole body, then answers with the next scripted status (or raises)."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        outcome = self.outcomes.pop(0) if self.outcomes else 201
+        if isinstance(outcome, Exception):
+            raise outcome
+        await send({"type": "http.response.start", "status": outcome, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"call %d: %d bytes" % (self.calls, len(body))})
+
+
+def make_app(endpoint):
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    store = IdempotencyStore(db, ttl=timedelta(hours=24), lease=timedelta(minutes=2))
+    # The unique index on the key is what makes claims exclusive
+    asyncio.run(store.ensure_indexes())
+    return IdempotencyMiddleware(endpoint, store, [("POST", "/api/things")]), store
+
+
+async def call(app, chunks=(b'{"a": 1}',), key="k1", content_type="application/json") -> tuple:
+    headers = [(b"content-type", content_type.encode()), (b"idempotency-key", key.encode())]
+    scope = {"type": "http", "method": "POST", "path": "/api/things", "query_string": b"", "headers": headers,
+             "client": ("10.0.0.1", 5000)}
+    pending = list(chunks)
+    sent = []
+
+    async def receive():
+        body = pending.pop(0) if pending else b""
+        return {"type": "http.request", "body": body, "more_body": bool(pending)}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_retry_gets_the_stored_response():
+    endpoint = Endpoint()
+    app, store = make_app(endpoint)
+
+    async def scenario():
+        return await call(app), await call(app)
+
+    first, retry = asyncio.run(scenario())
+    assert endpoint.calls == 1
+    assert first[0] == retry[0] == 201 and first[2] == retry[2] == b"call 1: 8 bytes"
+    assert retry[1][b"idempotent-replayed"] == b"true"
+    assert b"idempotent-replayed" not in first[1]
+    assert store.counters["replayed"] == 1
+
+
+def test_duplicate_while_processing_gets_409():
+    endpoint = Endpoint()
+    endpoint.release = asyncio.Event()
+    app, _ = make_app(endpoint)
+
+    async def scenario():
+        first = asyncio.create_task(call(app))
+        await asyncio.sleep(0.01)
+        duplicate = await call(app)
+        endpoint.release.set()
+        return await first, duplicate
+
+    first, duplicate = asyncio.run(scenario())
+    assert first[0] == 201
+    assert duplicate[0] == 409 and duplicate[1][b"retry-after"] == b"1"
+    assert endpoint.calls == 1
+
+
+def test_key_reused_for_a_different_request_gets_422():
+    endpoint = Endpoint()
+    app, _ = make_app(endpoint)
+
+    async def scenario():
+        await call(app, [b'{"a": 1}'])
+        return await call(app, [b'{"a": 2}'])
+
+    assert asyncio.run(scenario())[0] == 422
+    assert endpoint.calls == 1
+
+
+@pytest.mark.parametrize("failure", [503, RuntimeError("handler crashed")])
+def test_failed_requests_release_the_key(failure):
+    endpoint = Endpoint(failure, 201)
+    app, store = make_app(endpoint)
+
+    async def scenario():
+        try:
+            await call(app)
+        except RuntimeError:
+            pass
+        return await call(app)
+
+    status, headers, _ = asyncio.run(scenario())
+    # The retry ran for real
+    assert status == 201 and b"idempotent-replayed" not in headers
+    assert endpoint.calls == 2
+    assert store.counters["released"] == 1
+
+
+def multipart(boundary: bytes) -> bytes:
+    return (
+        b"--" + boundary + b'\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n'
+        b"Content-Type: image/png\r\n\r\n" + b"\x89PNG" * 50 + b"\r\n--" + boundary + b"--\r\n"
+    )
+
+
+def test_retried_upload_matches_despite_a_new_boundary():
+    endpoint = Endpoint()
+    app, _ = make_app(endpoint)
+    first = multipart(b"----boundaryAAAA")
+    retry = multipart(b"----boundaryZZZZ")
+    # Split the retry mid-boundary, so the hash has to carry it across chunks
+    cut = retry.index(b"boundaryZZZZ", 10) + 4
+
+    async def scenario():
+        await call(app, [first], content_type="multipart/form-data; boundary=----boundaryAAAA")
+        replayed = await call(app, [retry[:cut], retry[cut:]], content_type="multipart/form-data; boundary=----boundaryZZZZ")
+        changed = await call(app, [retry.replace(b"\x89PNG", b"\x89GIF", 1)],
+                             content_type="multipart/form-data; boundary=----boundaryZZZZ")
+        return replayed, changed
+
+    replayed, changed = asyncio.run(scenario())
+    assert replayed[0] == 201 and replayed[1][b"idempotent-replayed"] == b"true"
+    assert changed[0] == 422
+    assert endpoint.calls == 1
+
+
+def test_key_of_a_crashed_request_is_taken_over_once_its_lease_ends():
+    endpoint = Endpoint()
+    app, store = make_app(endpoint)
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        record_key = "ip:10.0.0.1|POST /api/things|"
+        await store.collection.insert_many([
+            {"id": record_key + "live", "state": "processing", "lockedUntil": now + timedelta(minutes=1),
+             "expiresAt": now + timedelta(hours=24)},
+            {"id": record_key + "crashed", "state": "processing", "lockedUntil": now - timedelta(seconds=1),
+             "expiresAt": now + timedelta(hours=24)},
+        ])
+        live = await call(app, key="live")
+        taken_over = await call(app, key="crashed")
+        record = await store.collection.find_one({"id": record_key + "crashed"}, {"_id": 0})
+        return live, taken_over, record
+
+    live, taken_over, record = asyncio.run(scenario())
+    assert live[0] == 409
+    assert taken_over[0] == 201
+    assert record["state"] == "done" and record["response"]["status"] == 201
+    assert endpoint.calls == 1
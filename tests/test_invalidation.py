@@ -0,0 +1,182 @@
+"""Cross-worker cache invalidation: change-stream and polling listeners.
+
+Polling runs against the in-memory mongomock-motor stand-in (skipped
+without it); the stand-in has no change streams, so ``watch`` is replaced by
+a scripted stream.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pymongo.errors import OperationFailure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import invalidation  # noqa: E402
+from invalidation import InvalidationListener  # noqa: E402
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class Recorder:
+    def __init__(self, fail_on: str = None):
+        self.docs = []
+        self.fail_on = fail_on
+
+    def __call__(self, doc):
+        if doc is not None and doc["id"] == self.fail_on:
+            self.fail_on = None
+            raise KeyError("creatorId")
+        self.docs.append(doc)
+
+
+def poll(db, handlers, **options) -> InvalidationListener:
+    async def scenario():
+        listener = InvalidationListener(
+            db, handlers, fields=["creatorId"], mode="poll", poll_interval=0.01, clock=lambda: T0, **options
+        )
+        await listener.start()
+        await asyncio.sleep(0.2)
+        await listener.stop()
+        return listener
+
+    return asyncio.run(scenario())
+
+
+def fast_sleep(sleep):
+    # The restart backoff starts at a second; keep the test short
+    async def shortened(seconds):
+        await sleep(0.01 if seconds >= 1 else seconds)
+
+    return shortened
+
+
+def test_polling_reads_every_document_sharing_one_timestamp(monkeypatch):
+    monkeypatch.setattr(invalidation, "POLL_PAGE_SIZE", 3)
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    requests = Recorder()
+    asyncio.run(db.requests.insert_many(
+        [{"id": f"r{i:02d}", "creatorId": "c1", "updatedAt": T0} for i in range(10)]
+        + [{"id": "r10", "creatorId": "c1", "updatedAt": T0 + timedelta(seconds=1)}]
+    ))
+
+    poll(db, {"requests": requests})
+    assert sorted(doc["id"] for doc in requests.docs) == [f"r{i:02d}" for i in range(11)]
+
+
+def test_polling_sees_deletes_through_the_collection_that_records_them():
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    archived = Recorder()
+    asyncio.run(db.archive.insert_one(
+        {"id": "r1", "creatorId": "c1", "updatedAt": T0 - timedelta(days=30), "archivedAt": T0}
+    ))
+
+    poll(db, {"archive": archived}, poll_fields={"archive": "archivedAt"})
+    assert [doc["id"] for doc in archived.docs] == ["r1"]
+
+
+def test_polling_survives_a_failing_handler(monkeypatch):
+    monkeypatch.setattr(invalidation.asyncio, "sleep", fast_sleep(asyncio.sleep))
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    requests = Recorder(fail_on="r1")
+    asyncio.run(db.requests.insert_many([
+        {"id": "r1", "updatedAt": T0},
+        {"id": "r2", "creatorId": "c1", "updatedAt": T0 + timedelta(seconds=1)},
+    ]))
+
+    listener = poll(db, {"requests": requests})
+    stats = listener.stats()
+    assert stats["errors"] == 1 and stats["flushes"] == 1
+    # After the restart both documents are read again
+    assert [doc and doc["id"] for doc in requests.docs] == [None, "r1", "r2"]
+
+
+class ScriptedStream:
+    def __init__(self, changes, error=None):
+        self.changes = list(changes)
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def alive(self):
+        return bool(self.changes) or self.error is not None
+
+    async def try_next(self):
+        if not self.changes:
+            error, self.error = self.error, None
+            raise error
+        change = self.changes.pop(0)
+        self.resume_token = {"_data": change["_id"]}
+        return change
+
+
+class IdleStream(ScriptedStream):
+    def __init__(self):
+        super().__init__([])
+
+    @property
+    def alive(self):
+        return True
+
+    async def try_next(self):
+        await asyncio.sleep(0.01)
+        return None
+
+
+class WatchableDb:
+    def __init__(self, db, streams):
+        self.db = db
+        self.streams = streams
+        self.resumed_from = []
+
+    def __getitem__(self, name):
+        return self.db[name]
+
+    def watch(self, pipeline, resume_after=None, **options):
+        self.resumed_from.append(resume_after)
+        return self.streams.pop(0) if self.streams else IdleStream()
+
+
+def change(token, collection, operation, doc=None):
+    return {"_id": token, "ns": {"coll": collection}, "operationType": operation, "fullDocument": doc}
+
+
+def test_change_stream_dispatches_resumes_and_flushes_on_lost_history(monkeypatch):
+    monkeypatch.setattr(invalidation.asyncio, "sleep", fast_sleep(asyncio.sleep))
+    requests = Recorder()
+    db = WatchableDb(mongomock_motor.AsyncMongoMockClient()["t"], [
+        ScriptedStream(
+            [change("1", "requests", "update", {"id": "r1", "creatorId": "c1"}), change("2", "requests", "delete")],
+            # Dropped connection: resume from the saved token
+            OperationFailure("connection reset", 6),
+        ),
+        ScriptedStream([], OperationFailure("history lost", 286)),
+    ])
+
+    async def scenario():
+        listener = InvalidationListener(db, {"requests": requests}, fields=["creatorId"], mode="changestream",
+                                        persist_interval=0)
+        await listener.start()
+        await asyncio.sleep(0.1)
+        await listener.stop()
+        return listener
+
+    listener = asyncio.run(scenario())
+    assert requests.docs[:4] == [
+        {"id": "r1", "creatorId": "c1"},
+        None,  # the delete
+        None,  # flush after the connection error
+        None,  # flush after history was lost
+    ]
+    assert db.resumed_from[:2] == [None, {"_data": "2"}]
+    assert listener.stats()["errors"] == 1
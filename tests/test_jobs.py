@@ -0,0 +1,91 @@
+"""Job runner leases: renewal during slow handlers and abandoned jobs.
+
+Runs against the in-memory mongomock-motor stand-in; skipped without it.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from jobs import OUTBOX_COLLECTION, JobRunner, new_job  # noqa: E402
+
+
+def make_runner(db, **options) -> JobRunner:
+    runner = JobRunner(db, **options)
+    runs = []
+
+    @runner.handler("slow")
+    async def slow(payload):
+        runs.append(payload)
+        await asyncio.sleep(payload["seconds"])
+
+    runner.runs = runs
+    return runner
+
+
+def test_lease_is_renewed_while_a_slow_handler_runs():
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    first = make_runner(db, lease_seconds=0.3)
+    second = make_runner(db, lease_seconds=0.3)
+
+    async def scenario():
+        await db[OUTBOX_COLLECTION].insert_one(new_job("slow", {"seconds": 1.0}))
+        running = asyncio.create_task(first.run_job(await first.claim()))
+        # Well past the original lease; the job must still be held
+        await asyncio.sleep(0.7)
+        stolen = await second.claim()
+        await running
+        return stolen, await db[OUTBOX_COLLECTION].find_one({}, {"_id": 0})
+
+    stolen, job = asyncio.run(scenario())
+    assert stolen is None
+    assert job["status"] == "done"
+    assert len(first.runs) == 1 and second.runs == []
+
+
+def test_job_whose_worker_died_on_the_last_attempt_is_dead():
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    runner = make_runner(db, max_attempts=3)
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async def scenario():
+        job = new_job("slow", {"seconds": 0})
+        job.update({"status": "running", "attempts": 3, "leaseOwner": "gone", "leaseExpiresAt": expired})
+        await db[OUTBOX_COLLECTION].insert_one(job)
+        return await runner.claim(), await db[OUTBOX_COLLECTION].find_one({}, {"_id": 0})
+
+    claimed, job = asyncio.run(scenario())
+    assert claimed is None
+    assert job["status"] == "dead"
+    assert runner._counters["dead"] == 1
+
+
+def test_worker_keeps_running_after_a_job_errors_outside_its_handler():
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    runner = make_runner(db, concurrency=1, poll_interval=0.05)
+    run_job = runner.run_job
+
+    async def run_job_or_fail(job):
+        if job["payload"].get("fail"):
+            raise RuntimeError("outbox write failed")
+        await run_job(job)
+
+    runner.run_job = run_job_or_fail
+
+    async def scenario():
+        await db[OUTBOX_COLLECTION].insert_one(new_job("slow", {"seconds": 0, "fail": True}))
+        await db[OUTBOX_COLLECTION].insert_one(new_job("slow", {"seconds": 0}))
+        runner.start()
+        await asyncio.sleep(0.3)
+        alive = runner.running
+        await runner.stop()
+        return alive
+
+    assert asyncio.run(scenario())
+    assert runner.runs == [{"seconds": 0}]
@@ -0,0 +1,109 @@
+"""Chat message layouts: bucketed reads match per-message documents.
+
+Runs against the in-memory mongomock-motor stand-in; skipped without it.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from message_store import BucketMessageStore, DocumentMessageStore, migrate_to_buckets  # noqa: E402
+
+
+def message(request_id: str, i: int, at: datetime) -> dict:
+    return {"id": f"{request_id}-{i}", "requestId": request_id, "senderUserId": "u1", "text": f"m{i}",
+            "createdAt": at.isoformat()}
+
+
+def write_thread(gaps: list) -> tuple:
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    documents = DocumentMessageStore(db)
+    buckets = BucketMessageStore(db, bucket_size=4, bucket_span=timedelta(days=1))
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def write():
+        for i, gap in enumerate(gaps):
+            at_i = at + gap * i
+            await documents.append(message("r1", i, at_i))
+            await buckets.append(message("r1", i, at_i))
+
+    asyncio.run(write())
+    return documents, buckets
+
+
+@pytest.mark.parametrize("gap", [timedelta(minutes=1), timedelta(days=2), timedelta(hours=7)])
+@pytest.mark.parametrize("limit", [1, 3, 10, 50])
+def test_bucket_reads_match_documents_across_bucket_boundaries(gap, limit):
+    # Minute gaps fill buckets; two-day gaps leave one message per bucket
+    documents, buckets = write_thread([gap] * 25)
+
+    async def read(store):
+        return [m["id"] for m in await store.latest("r1", limit)]
+
+    assert asyncio.run(read(buckets)) == asyncio.run(read(documents))
+
+
+class RacingMessages:
+    """``messages`` with a writer that always appends to r2 during the rebuild."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def count_documents(self, query):
+        count = await self.collection.count_documents(query)
+        return count + 1 if query.get("requestId") == "r2" else count
+
+
+class RacingDb:
+    def __init__(self, db):
+        self.db = db
+        self.messages = RacingMessages(db.messages)
+
+    def __getitem__(self, name):
+        return self.db[name]
+
+
+def test_migration_reports_threads_that_never_settle():
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def scenario():
+        for request_id in ("r1", "r2"):
+            await db.messages.insert_many([message(request_id, i, at + timedelta(minutes=i)) for i in range(5)])
+        return await migrate_to_buckets(db, bucket_size=4), await migrate_to_buckets(RacingDb(db), bucket_size=4)
+
+    settled, racing = asyncio.run(scenario())
+    assert settled == {"threads": 2, "failed": []}
+    assert racing == {"threads": 1, "failed": ["r2"]}
+
+
+class EmptiedMessages(RacingMessages):
+    """``messages`` whose thread r1 is archived between listing threads and reading it."""
+
+    def find(self, query, *args, **kwargs):
+        return self.collection.find({**query, "requestId": "archived"}, *args, **kwargs)
+
+    async def count_documents(self, query):
+        return 0
+
+
+def test_migration_skips_threads_emptied_meanwhile():
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def scenario():
+        await db.messages.insert_many([message("r1", i, at + timedelta(minutes=i)) for i in range(3)])
+        racing = RacingDb(db)
+        racing.messages = EmptiedMessages(db.messages)
+        return await migrate_to_buckets(racing, bucket_size=4), await db.message_buckets.count_documents({})
+
+    assert asyncio.run(scenario()) == ({"threads": 1, "failed": []}, 0)
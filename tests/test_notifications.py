@@ -0,0 +1,182 @@
+"""Notification digests: rendering, back-pressure and SMTP delivery.
+
+SMTP is exercised against a minimal local stand-in server; no network.
+Delivery retries run against mongomock-motor and are skipped without it.
+"""
+import asyncio
+import socketserver
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from notifications import Notifier, SmtpTransport, notification_event, render_digest  # noqa: E402
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """Accepts mail for any recipient except those containing "refused"."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SmtpHandler)
+        self.messages = []
+        self.connections = 0
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 stand-in ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().rstrip("\r\n")
+            command = line[:4].upper()
+            if command in ("HELO", "EHLO"):
+                self.reply("250 stand-in")
+            elif command == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                if "refused" in line:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(line)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while (data := self.rfile.readline().decode()) != ".\r\n":
+                    body.append(data)
+                self.server.messages.append("".join(body))
+                self.reply("250 Queued")
+            elif command == "RSET":
+                self.reply("250 OK")
+            elif command == "QUIT" or not line:
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+@pytest.fixture
+def smtp_server():
+    server = SmtpStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def digest(count: int, kept: int = None) -> dict:
+    events = [{"kind": "message", "requestId": "r1", "text": f"New message {i}"} for i in range(count)]
+    return {"id": "d1", "recipientUserId": "u1", "eventCount": count, "events": events[:kept]}
+
+
+def test_digest_lists_kept_events_and_counts_the_rest():
+    message = render_digest(digest(25, kept=20), "a@example.com", "Orange <n@orange.local>", "https://app.example")
+    body = message.get_content()
+    assert message["Subject"] == "You have 25 new updates on Orange"
+    assert body.count("New message") == 20
+    assert "https://app.example/chat/r1" in body
+    assert "...and 5 more" in body
+
+
+def test_window_stretches_with_backlog():
+    notifier = Notifier(None, None, None, sender="x", window=timedelta(minutes=10), high_water=100)
+    assert notifier.current_window() == timedelta(minutes=10)
+    notifier.backlog = 250
+    assert notifier.current_window() == timedelta(minutes=30)
+    notifier.backlog = 10_000
+    assert notifier.current_window() == timedelta(minutes=40)
+
+
+def test_smtp_batch_uses_one_connection_and_reports_refusals(smtp_server):
+    transport = SmtpTransport("127.0.0.1", smtp_server.server_address[1], timeout=5)
+    messages = [
+        render_digest(digest(1), "a@example.com", "n@orange.local"),
+        render_digest(digest(2), "refused@example.com", "n@orange.local"),
+        render_digest(digest(3), "b@example.com", "n@orange.local"),
+    ]
+
+    results = asyncio.run(transport.send(messages))
+
+    assert results == [True, False, True]
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 2
+    assert "You have 3 new updates" in smtp_server.messages[1]
+
+
+class FlakyTransport:
+    name = "flaky"
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)  # per call: an exception, or per-message results
+
+    async def send(self, messages):
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome[:len(messages)]
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.jobs = []
+
+    async def enqueue(self, job_type, payload, delay_seconds=0):
+        self.jobs.append((job_type, delay_seconds))
+
+
+def test_unsent_digests_are_retried_a_bounded_number_of_times():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    outbox = RecordingOutbox()
+    transport = FlakyTransport([ConnectionError("smtp down"), [False], [False]])
+    notifier = Notifier(db, outbox, transport, sender="x", window=timedelta(0), max_attempts=3)
+
+    async def deliver_all_due():
+        # Make every scheduled retry due right away
+        await db.notification_digests.update_many({"status": "retry"}, {"$set": {"sendAt": datetime.now(timezone.utc)}})
+        await notifier.deliver()
+        return await db.notification_digests.find_one({}, {"_id": 0})
+
+    async def scenario():
+        await db.users.insert_one({"id": "u1", "email": "a@example.com"})
+        await notifier.record(notification_event("u1", "message", "r1", "hi"))
+        states = []
+        for _ in range(3):
+            digest = await deliver_all_due()
+            states.append((digest["status"], digest["attempts"]))
+        return states
+
+    states = asyncio.run(scenario())
+    assert states == [("retry", 1), ("retry", 2), ("failed", 3)]
+    assert notifier.counters["transportErrors"] == 1
+    assert notifier.counters["retried"] == 2
+    # A follow-up run is scheduled for every retry
+    assert [delay for job, delay in outbox.jobs[1:]] == [60, 120]
+
+
+def test_digests_left_claimed_by_a_dead_run_count_as_due():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    notifier = Notifier(db, RecordingOutbox(), FlakyTransport([]), sender="x", window=timedelta(0))
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async def scenario():
+        await db.notification_digests.insert_one(
+            {"id": "d1", "recipientUserId": "u1", "status": "sending", "attempts": 1, "claimedUntil": expired}
+        )
+        return await notifier.due_count()
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,58 @@
+"""Chat presence: heartbeats, typing and expiry on both backends.
+
+The Redis backend runs on fakeredis and is skipped when it isn't installed.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from presence import InMemoryPresence, RedisPresence  # noqa: E402
+
+
+def in_memory():
+    return InMemoryPresence(ttl=15, typing_ttl=5)
+
+
+def redis():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisPresence(ttl=15, typing_ttl=5, client=fakeredis.FakeAsyncRedis())
+
+
+@pytest.mark.parametrize("make_presence", [in_memory, redis])
+def test_heartbeats_expire_and_typing_is_shorter(make_presence):
+    presence = make_presence()
+
+    async def scenario():
+        await presence.beat("r1", "a", typing=True, now=1000)
+        await presence.beat("r1", "b", now=1004)
+        await presence.beat("r2", "c", now=1000)
+        return [
+            await presence.members("r1", now=1001),
+            # a stopped typing after 5s, and went offline after 15s
+            await presence.members("r1", now=1006),
+            await presence.members("r1", now=1016),
+            await presence.members("r2", now=1001),
+        ]
+
+    assert asyncio.run(scenario()) == [
+        {"online": ["a", "b"], "typing": ["a"]},
+        {"online": ["a", "b"], "typing": []},
+        {"online": ["b"], "typing": []},
+        {"online": ["c"], "typing": []},
+    ]
+
+
+@pytest.mark.parametrize("make_presence", [in_memory, redis])
+def test_a_beat_without_typing_clears_it(make_presence):
+    presence = make_presence()
+
+    async def scenario():
+        await presence.beat("r1", "a", typing=True, now=1000)
+        await presence.beat("r1", "a", typing=False, now=1001)
+        return await presence.members("r1", now=1002)
+
+    assert asyncio.run(scenario()) == {"online": ["a"], "typing": []}
@@ -0,0 +1,78 @@
+"""Sampling profiler: on-CPU and await stacks, child tasks, exports.
+
+Drives ``ProfilingMiddleware`` with a bare ASGI app; no server or database.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from profiler import Profiler, ProfilingMiddleware  # noqa: E402
+
+
+def burn_cpu(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def wait_on_io():
+    await asyncio.sleep(0.15)
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = SimpleNamespace(path="/slow")
+    burn_cpu(0.1)
+    await asyncio.gather(wait_on_io(), wait_on_io())
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call(app):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app({"type": "http", "method": "GET", "path": "/slow"}, receive, send)
+
+
+def test_inactive_profiler_installs_nothing():
+    profiler = Profiler()
+
+    async def scenario():
+        await call(ProfilingMiddleware(endpoint, profiler))
+        return asyncio.get_running_loop().get_task_factory()
+
+    assert asyncio.run(scenario()) is None
+    assert profiler.summary()["routes"] == {}
+
+
+def test_window_records_cpu_and_await_stacks():
+    profiler = Profiler(interval=0.002)
+
+    async def scenario():
+        profiler.start_window(5)
+        await call(ProfilingMiddleware(endpoint, profiler))
+        profiler.stop_window()
+        return asyncio.get_running_loop().get_task_factory()
+
+    assert asyncio.run(scenario()) is None
+    route = profiler.summary()["routes"]["GET /slow"]
+    assert route["requests"] == 1
+    assert route["cpuSamples"] > 0
+    assert route["awaitSamples"] > 0
+
+    folded = profiler.folded()
+    assert "endpoint;burn_cpu" in folded
+    # The gathered children are sampled too, down to what they wait on
+    assert "wait_on_io;sleep;(await Future)" in folded
+
+    document = profiler.speedscope()
+    assert [p["name"] for p in document["profiles"]] == ["GET /slow"]
+    names = {frame["name"] for frame in document["shared"]["frames"]}
+    assert {"endpoint", "burn_cpu", "wait_on_io"} <= names
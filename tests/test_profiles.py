@@ -0,0 +1,24 @@
+"""Public profile reads and the per-worker profile cache.
+
+Uses the ``api`` fixture; a second stand-in database plays a lagging
+secondary behind ``read_db``.
+"""
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def test_profile_cache_is_not_filled_from_a_lagging_secondary(api, monkeypatch):
+    creator = api.user("creator", "Asha")
+    profile_id = creator["profile"]["id"]
+    secondary = mongomock_motor.AsyncMongoMockClient()["api_tests"]
+    asyncio.run(secondary.creator_profiles.insert_one({**creator["profile"], "name": "Old name"}))
+    monkeypatch.setattr(api.server, "read_db", secondary)
+
+    # The first read fills the cache, the second is served from it
+    for _ in range(2):
+        status, body = api.json("GET", f"/api/creators/{profile_id}")
+        assert status == 200 and body["name"] == "Asha"
+    assert api.server.profile_cache.get(("creator", profile_id))["name"] == "Asha"
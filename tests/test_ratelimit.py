@@ -0,0 +1,145 @@
+"""Rate limiting: 429 responses, bucket scopes and the shared Redis backend.
+
+Drives ``RateLimitMiddleware`` with a bare ASGI app. The Redis backend runs
+its Lua script on fakeredis and is skipped when that (with lupa) is missing.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from ratelimit import RateLimitMiddleware, RedisBackend, RouteLimit  # noqa: E402
+
+LIMITS = [
+    RouteLimit("POST", "/api/auth/login", per_minute=6, burst=2),
+    RouteLimit("POST", "/api/messages/{request_id}", per_minute=6, burst=2, scope="user"),
+]
+
+TOKENS = {"token-a": "user-a", "token-b": "user-b"}
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def make_app(**options):
+    return RateLimitMiddleware(endpoint, LIMITS, resolve_user=TOKENS.get, **options)
+
+
+async def call(app, method: str, path: str, token: str = None, ip: str = "10.0.0.1", forwarded: str = None) -> tuple:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    if forwarded is not None:
+        headers.append((b"x-forwarded-for", forwarded.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers, "client": (ip, 5000)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+
+def statuses(app, *requests) -> list:
+    async def scenario():
+        return [(await call(app, *request))[0] for request in requests]
+
+    return asyncio.run(scenario())
+
+
+def test_exhausted_budget_returns_429_with_retry_after():
+    app = make_app()
+
+    async def scenario():
+        for _ in range(2):
+            assert (await call(app, "POST", "/api/auth/login"))[0] == 200
+        return await call(app, "POST", "/api/auth/login")
+
+    status, headers = asyncio.run(scenario())
+    assert status == 429
+    # One token refills in 10 seconds at 6 per minute
+    assert headers[b"retry-after"] == b"10"
+    assert statuses(app, ("GET", "/api/auth/login"), ("POST", "/api/health")) == [200, 200]
+
+
+def test_user_and_ip_buckets_are_separate():
+    app = make_app()
+    path = "/api/messages/r1"
+    assert statuses(
+        app,
+        ("POST", path, "token-a"), ("POST", path, "token-a"), ("POST", path, "token-a"),
+        # Same IP, another user: its own bucket
+        ("POST", path, "token-b"),
+        # Unknown tokens and anonymous callers share the IP's bucket
+        ("POST", path, "bogus"), ("POST", path), ("POST", path),
+        ("POST", path, None, "10.0.0.2"),
+    ) == [200, 200, 429, 200, 200, 200, 429, 200]
+
+
+def test_spoofed_forwarded_for_does_not_get_a_fresh_bucket():
+    # The proxy at 10.0.0.1 appends the address it saw; the client made up the rest
+    path = "/api/auth/login"
+    app = make_app(trust_forwarded_for=True)
+    assert statuses(
+        app,
+        ("POST", path, None, "10.0.0.1", "203.0.113.7"),
+        ("POST", path, None, "10.0.0.1", "1.1.1.1, 203.0.113.7"),
+        ("POST", path, None, "10.0.0.1", "2.2.2.2, 203.0.113.7"),
+        ("POST", path, None, "10.0.0.1", "198.51.100.9"),
+    ) == [200, 200, 429, 200]
+
+    # Behind two proxies the client is the second entry from the right
+    app = make_app(trust_forwarded_for=True, proxy_hops=2)
+    assert statuses(
+        app,
+        ("POST", path, None, "10.0.0.1", "1.1.1.1, 203.0.113.7, 10.0.0.2"),
+        ("POST", path, None, "10.0.0.1", "2.2.2.2, 203.0.113.7, 10.0.0.2"),
+        ("POST", path, None, "10.0.0.1", "203.0.113.7, 10.0.0.3"),
+    ) == [200, 200, 429]
+
+
+def test_disabled_middleware_passes_everything():
+    app = make_app(enabled=False)
+    assert statuses(app, *[("POST", "/api/auth/login")] * 5) == [200] * 5
+
+
+@pytest.fixture
+def redis_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return fakeredis.FakeAsyncRedis()
+
+
+def test_redis_script_refills_and_takes_tokens(redis_client):
+    backend = RedisBackend(client=redis_client)
+
+    async def scenario():
+        waits = [await backend.consume("k", rate=1.0, burst=2, now=1000.0) for _ in range(3)]
+        waits.append(await backend.consume("k", rate=1.0, burst=2, now=1000.5))
+        waits.append(await backend.consume("k", rate=1.0, burst=2, now=1001.0))
+        return waits, await redis_client.ttl("rl:k")
+
+    waits, ttl = asyncio.run(scenario())
+    assert waits == [0.0, 0.0, 1.0, 0.5, 0.0]
+    assert 0 < ttl <= 3
+
+
+def test_workers_sharing_redis_share_budgets(redis_client):
+    first = make_app(backend=RedisBackend(client=redis_client))
+    second = make_app(backend=RedisBackend(client=redis_client))
+
+    async def scenario():
+        return [
+            (await call(app, "POST", "/api/auth/login"))[0]
+            for app in (first, second, first)
+        ]
+
+    assert asyncio.run(scenario()) == [200, 200, 429]
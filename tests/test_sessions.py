@@ -0,0 +1,52 @@
+"""Revocation denylist mirror: lookups, expiry of old entries and reloads.
+
+Entries are fed in as the invalidation listener would; the reload test uses
+the in-memory mongomock-motor stand-in and is skipped without it.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import sessions  # noqa: E402
+from sessions import Denylist  # noqa: E402
+
+
+def test_entries_are_dropped_once_their_tokens_have_expired(monkeypatch):
+    denylist = Denylist(None, token_ttl=timedelta(minutes=15), clock=None)
+    now = datetime.now(timezone.utc)
+    denylist.apply({"id": "session:old", "userId": "u1", "expiresAt": now - timedelta(seconds=1)})
+    denylist.apply({"id": "user:u1", "userId": "u1", "notBefore": now.timestamp(), "expiresAt": now - timedelta(seconds=1)})
+    denylist.apply({"id": "session:live", "userId": "u2", "expiresAt": now + timedelta(minutes=15)})
+    denylist.apply({"id": "user:u2", "userId": "u2", "notBefore": now.timestamp(), "expiresAt": now + timedelta(minutes=15)})
+    assert denylist.is_revoked("live", "u2", now.timestamp() + 1)
+    assert denylist.is_revoked(None, "u2", now.timestamp() - 1)
+    assert not denylist.is_revoked(None, "u2", now.timestamp() + 1)
+
+    # The next entry after the prune interval sweeps out the expired ones
+    monkeypatch.setattr(sessions, "PRUNE_INTERVAL_SECONDS", 0)
+    denylist.apply({"id": "session:new", "userId": "u3"})
+    assert denylist.stats() == {"sessions": 2, "users": 1, "loads": 0}
+    assert not denylist.is_revoked("old", "u1", now.timestamp() - 1)
+
+
+def test_workers_without_a_listener_pick_up_revocations_on_reload():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["t"]
+    revoking = Denylist(db, token_ttl=timedelta(minutes=15), clock=lambda: datetime.now(timezone.utc))
+    other = Denylist(db, token_ttl=timedelta(minutes=15), clock=lambda: datetime.now(timezone.utc))
+
+    async def scenario():
+        await other.load()
+        other.start(0.05)
+        await revoking.revoke_session("s1", "u1")
+        before = other.is_revoked("s1", "u1", 0)
+        await asyncio.sleep(0.2)
+        await other.stop()
+        return before, other.is_revoked("s1", "u1", 0)
+
+    assert asyncio.run(scenario()) == (False, True)
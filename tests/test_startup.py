@@ -0,0 +1,109 @@
+"""Startup benchmark: import, lifespan startup and first response of one worker.
+
+Each measurement runs in a fresh interpreter so module caches don't hide
+regressions. The probe runs the app lifespan before its first request, as a
+server would, against the in-memory mongomock-motor stand-in when that is
+installed and against MONGO_URL otherwise. Budgets can be relaxed on slow CI
+machines through STARTUP_IMPORT_BUDGET / STARTUP_LIFESPAN_BUDGET /
+STARTUP_FIRST_RESPONSE_BUDGET (seconds).
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+IMPORT_BUDGET = float(os.environ.get("STARTUP_IMPORT_BUDGET", "2.0"))
+LIFESPAN_BUDGET = float(os.environ.get("STARTUP_LIFESPAN_BUDGET", "3.0"))
+FIRST_RESPONSE_BUDGET = float(os.environ.get("STARTUP_FIRST_RESPONSE_BUDGET", "0.5"))
+
+# Heavy optional subsystems that must only load when first used
+LAZY_MODULES = ["cloudinary", "passlib", "bcrypt", "motor", "PIL"]
+
+PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+# Startup connects to Mongo, so only the import itself is judged
+loaded = [m for m in %r if m in sys.modules]
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+    server.mongo.client = AsyncMongoMockClient()
+except ImportError:
+    pass
+
+async def main():
+    lifespan = asyncio.Queue()
+    events = []
+    ready = asyncio.Event()
+    async def lifespan_send(message):
+        events.append(message["type"])
+        ready.set()
+
+    began = time.perf_counter()
+    await lifespan.put({"type": "lifespan.startup"})
+    running = asyncio.create_task(server.app({"type": "lifespan", "asgi": {"version": "3.0"}}, lifespan.get, lifespan_send))
+    await ready.wait()
+    started = time.perf_counter()
+    assert events == ["lifespan.startup.complete"], events
+
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/api/health", "raw_path": b"/api/health", "root_path": "",
+             "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80)}
+    await server.app(scope, receive, send)
+    responded = time.perf_counter()
+
+    await lifespan.put({"type": "lifespan.shutdown"})
+    await running
+    return messages[0]["status"], started - began, responded - started
+
+status, startup_seconds, response_seconds = asyncio.run(main())
+print(json.dumps({
+    "importSeconds": imported - start,
+    "lifespanSeconds": startup_seconds,
+    "firstResponseSeconds": response_seconds,
+    "status": status,
+    "loaded": loaded,
+}))
+""" % (LAZY_MODULES,)
+
+
+def run_probe() -> tuple:
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("MONGO_", "CLOUDINARY_"))}
+    env.update({"MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "startup_probe"})
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.strip().splitlines()
+    return lines, json.loads(lines[-1])
+
+
+def test_import_has_no_side_effects():
+    lines, report = run_probe()
+    # Nothing but the probe's own report may be printed (no config or secrets)
+    assert len(lines) == 1, lines
+    assert report["status"] == 200
+
+
+def test_optional_subsystems_load_lazily():
+    _, report = run_probe()
+    assert report["loaded"] == []
+
+
+def test_startup_within_budget():
+    _, report = run_probe()
+    print(f"\nimport: {report['importSeconds'] * 1000:.0f} ms, "
+          f"lifespan: {report['lifespanSeconds'] * 1000:.0f} ms, "
+          f"first response: {report['firstResponseSeconds'] * 1000:.0f} ms")
+    assert report["importSeconds"] < IMPORT_BUDGET
+    assert report["lifespanSeconds"] < LIFESPAN_BUDGET
+    assert report["firstResponseSeconds"] < FIRST_RESPONSE_BUDGET
@@ -0,0 +1,170 @@
+"""Media storage guard: retries, timeouts, concurrency limits and the circuit breaker.
+
+Runs against local files behind ``FaultyStorage``; no network or database.
+"""
+import asyncio
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from media_storage import FaultyStorage, LocalStorage, ResilientStorage  # noqa: E402
+from resilience import CircuitBreaker, Guard, Unavailable  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_storage(tmp_path, clock=None, **faults):
+    guard_options = {
+        key: faults.pop(key)
+        for key in ("timeout", "max_concurrency", "queue_timeout", "retries")
+        if key in faults
+    }
+    faulty = FaultyStorage(LocalStorage(str(tmp_path), "/media"), seed=1, **faults)
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, open_seconds=30, clock=clock or FakeClock())
+    guard = Guard("test storage", backoff_base=0.001, backoff_max=0.001, breaker=breaker, **guard_options)
+    return faulty, ResilientStorage(faulty, guard)
+
+
+def test_transient_failures_are_retried(tmp_path):
+    faulty, storage = make_storage(tmp_path, retries=2)
+    faulty.fail_next = 1
+
+    stored = asyncio.run(storage.upload(io.BytesIO(b"data"), "a", "image/jpeg"))
+    # The retry re-read the file from the start
+    assert (tmp_path / stored["key"]).read_bytes() == b"data"
+    stats = storage.stats()
+    assert stats["retries"] == 1
+    assert stats["succeeded"] == 1
+
+
+def test_breaker_opens_and_fast_fails(tmp_path):
+    clock = FakeClock()
+    faulty, storage = make_storage(tmp_path, clock=clock, failure_rate=1.0, retries=0)
+
+    async def scenario():
+        for _ in range(4):
+            with pytest.raises(Unavailable):
+                await storage.put("k", b"x", "image/webp")
+        calls_before = faulty.calls
+        with pytest.raises(Unavailable) as rejected:
+            await storage.put("k", b"x", "image/webp")
+        # Rejected without touching the backend
+        assert faulty.calls == calls_before
+        assert 0 < rejected.value.retry_after <= 30
+
+        # After the open period one probe goes through; its success closes the breaker
+        clock.now += 30
+        faulty.failure_rate = 0.0
+        await storage.put("k", b"x", "image/webp")
+
+    asyncio.run(scenario())
+    stats = storage.stats()
+    assert stats["breaker"] == "closed"
+    assert stats["breakerOpened"] == 1
+    assert stats["rejectedOpen"] == 1
+
+
+def test_timeouts_hold_the_slot_until_the_call_ends(tmp_path):
+    _, storage = make_storage(tmp_path, hang_rate=1.0, hang_seconds=0.3, timeout=0.05, retries=0)
+
+    async def scenario():
+        with pytest.raises(Unavailable):
+            await storage.read("missing", "/media/missing")
+        assert storage.stats()["inFlight"] == 1
+        await asyncio.sleep(0.4)
+        assert storage.stats()["inFlight"] == 0
+
+    asyncio.run(scenario())
+    assert storage.stats()["timeouts"] == 1
+
+
+def test_concurrency_is_bounded(tmp_path):
+    _, storage = make_storage(tmp_path, latency=0.2, max_concurrency=1, queue_timeout=0.01, retries=0)
+
+    async def scenario():
+        return await asyncio.gather(
+            storage.put("a", b"x", "image/webp"),
+            storage.put("b", b"x", "image/webp"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert sum(isinstance(r, Unavailable) for r in results) == 1
+    assert storage.stats()["rejectedBusy"] == 1
+
+
+def test_permanent_errors_are_not_retried_or_counted(tmp_path):
+    _, storage = make_storage(tmp_path, retries=2)
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(storage.read("missing", "/media/missing"))
+    stats = storage.stats()
+    assert stats["retries"] == 0
+    assert stats["failed"] == 0
+    assert stats["breaker"] == "closed"
+
+
+def test_cancelled_probe_lets_the_next_one_through(tmp_path):
+    clock = FakeClock()
+    faulty, storage = make_storage(tmp_path, clock=clock, failure_rate=1.0, retries=0)
+
+    async def scenario():
+        for _ in range(4):
+            with pytest.raises(Unavailable):
+                await storage.put("k", b"x", "image/webp")
+
+        # The probe's caller goes away (client disconnect) before a verdict
+        clock.now += 30
+        faulty.failure_rate = 0.0
+        faulty.latency = 0.2
+        probe = asyncio.create_task(storage.put("k", b"x", "image/webp"))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        faulty.latency = 0.0
+        await storage.put("k", b"x", "image/webp")
+
+    asyncio.run(scenario())
+    assert storage.stats()["breaker"] == "closed"
+
+
+def test_calls_finishing_after_the_breaker_opened_do_not_decide_it():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, open_seconds=30, clock=clock)
+    guard = Guard("test storage", retries=0, breaker=breaker)
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+
+    async def failing():
+        raise ConnectionError("down")
+
+    async def scenario():
+        # Admitted while closed, still running when the breaker opens
+        late = asyncio.create_task(guard.call(slow))
+        await asyncio.sleep(0)
+        for _ in range(4):
+            with pytest.raises(Unavailable):
+                await guard.call(failing)
+        assert breaker.state == "open"
+        clock.now += 30
+        release.set()
+        await late
+        # The late success neither closed the breaker nor used up the probe
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+
+    asyncio.run(scenario())
@@ -0,0 +1,29 @@
+"""The media.thumbnail job: variants are recorded on the asset and galleries.
+
+Runs the job from ``server`` through the ``api`` fixture with rendering
+stubbed out.
+"""
+import asyncio
+
+
+def test_thumbnail_job_without_variants_leaves_the_asset_alone(api, monkeypatch):
+    server = api.server
+    monkeypatch.setattr(server, "LOCAL_THUMBNAILS", True)
+
+    async def read(public_id, url):
+        return b"image"
+
+    async def render(data, media_type):
+        # What Pillow built without WebP or AVIF support produces
+        return []
+
+    monkeypatch.setattr(server.media_storage, "read", read)
+    monkeypatch.setattr(server.thumbnail_generator, "render", render)
+
+    async def scenario():
+        await server.media_assets.register("h1", {"url": "/media/a.png", "publicId": "a.png", "type": "image"})
+        await server.generate_thumbnail({"publicId": "a.png", "resourceType": "image"})
+        return await server.media_assets.get("a.png")
+
+    asset = asyncio.run(scenario())
+    assert "variants" not in asset and "thumbnailUrl" not in asset